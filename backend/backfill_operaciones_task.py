@@ -0,0 +1,38 @@
+"""
+Completa operaciones.task_list_id y operaciones.task_type desde task_list
+por bloques de ids, con un commit por bloque para no mantener bloqueos
+largos sobre la tabla. Se puede interrumpir y retomar con --after-id.
+
+Uso (desde la raíz del proyecto, tras `alembic upgrade head`):
+    python -m backend.backfill_operaciones_task
+    python -m backend.backfill_operaciones_task --chunk-size 2000 --pause 0.5
+"""
+import argparse
+import asyncio
+import json
+from .database import SessionLocal
+from .crud.crud_operaciones_task import backfill_operaciones_task
+
+async def run(after_id: int, chunk_size: int, pause: float) -> None:
+    updated = 0
+    async with SessionLocal() as db:
+        while True:
+            chunk = await backfill_operaciones_task(db, after_id, chunk_size)
+            if chunk is None:
+                break
+            after_id, rows = chunk
+            updated += rows
+            if pause:
+                await asyncio.sleep(pause)
+    print(json.dumps({"last_id": after_id, "updated": updated}))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sincroniza task_list_id y task_type de operaciones con task_list")
+    parser.add_argument("--after-id", type=int, default=0, help="Empieza tras este id (para retomar)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Operaciones por bloque/transacción")
+    parser.add_argument("--pause", type=float, default=0.0, help="Segundos de espera entre bloques")
+    args = parser.parse_args()
+    asyncio.run(run(args.after_id, args.chunk_size, args.pause))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Latencia del historial de movimientos (GET /inventory/movements/) página a
+página sobre una tabla sembrada con millones de filas. Recorre el cursor
+(movement_date, id) con cada combinación de filtros indexada e imprime el
+tiempo de cada página; con paginación por cursor la página 1000 debe
+costar lo mismo que la primera. --offset-sample mide además OFFSET/LIMIT
+a las mismas profundidades como referencia.
+
+La siembra inserta por SQL (generate_series, en bloques con commit propio)
+sobre insumos y almacenes del propio benchmark, repartidos en dos
+temporadas, sin pasar por input_stock. Al terminar se borra salvo --keep.
+
+Uso (desde la raíz del proyecto):
+    BENCHMARK_DATABASE_URL=... python -m backend.benchmarks.movement_history --seed 3000000
+    BENCHMARK_DATABASE_URL=... python -m backend.benchmarks.movement_history --seed 3000000 --pages 2000 --offset-sample 100
+
+Las filas "escenario página ms" van a stderr y el resumen JSON a stdout.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+from . import create_inventory_fixture, drop_inventory_fixture, latency_summary, require_dsn, session_factory, stopwatch
+
+SEED_CHUNK_SIZE = 500_000
+SEASON = timedelta(days=365)
+
+SEED_SQL = """
+    INSERT INTO inventory_movements (movement_date, input_id, warehouse_id, movement_type, quantity, comments, created_at)
+    SELECT CAST(:start AS timestamp) + random() * CAST(:span AS interval),
+           (CAST(:input_ids AS integer[]))[1 + n % CAST(:inputs AS integer)],
+           (CAST(:warehouse_ids AS integer[]))[1 + (n / CAST(:inputs AS integer)) % CAST(:warehouses AS integer)],
+           (ARRAY['entry', 'exit', 'adjustment'])[1 + n % 3],
+           1 + n % 50,
+           'benchmark',
+           now()
+    FROM generate_series(CAST(:first AS integer), CAST(:last AS integer)) AS n
+"""
+
+async def seed_movements(Session, fixture, count: int, start: datetime) -> None:
+    from sqlalchemy import text
+
+    for first in range(1, count + 1, SEED_CHUNK_SIZE):
+        last = min(first + SEED_CHUNK_SIZE - 1, count)
+        async with Session() as db:
+            await db.execute(text(SEED_SQL), {
+                "start": start, "span": 2 * SEASON,
+                "input_ids": fixture.input_ids, "inputs": len(fixture.input_ids),
+                "warehouse_ids": fixture.warehouse_ids, "warehouses": len(fixture.warehouse_ids),
+                "first": first, "last": last,
+            })
+            await db.commit()
+        print(f"sembrados {last}/{count}", file=sys.stderr)
+    async with Session() as db:
+        await db.execute(text("ANALYZE inventory_movements"))
+        await db.commit()
+
+def scenarios(fixture, start: datetime) -> List[tuple]:
+    return [
+        ("all", {}),
+        ("input", {"input_id": fixture.input_ids[0]}),
+        ("warehouse", {"warehouse_id": fixture.warehouse_ids[0]}),
+        ("type", {"movement_type": "exit"}),
+        ("input+range", {"input_id": fixture.input_ids[0], "start_date": start, "end_date": start + SEASON}),
+    ]
+
+async def walk_cursor(Session, name: str, filters: dict, pages: int, limit: int) -> List[float]:
+    from ..crud.crud_inventory import get_inventory_movements
+
+    samples, cursor = [], None
+    for page in range(1, pages + 1):
+        async with Session() as db:
+            with stopwatch(samples):
+                result = await get_inventory_movements(db, limit=limit, cursor=cursor, **filters)
+        print(f"{name} {page} {samples[-1] * 1000:.2f}", file=sys.stderr)
+        cursor = result.next_cursor
+        if cursor is None:
+            break
+    return samples
+
+async def offset_timings(Session, filters: dict, pages: int, limit: int, every: int) -> List[dict]:
+    """El mismo orden y filtros con OFFSET/LIMIT, muestreado cada `every` páginas."""
+    from sqlalchemy.future import select
+    from ..models import InventoryMovement
+
+    conditions = [getattr(InventoryMovement, key) == value for key, value in filters.items() if not key.endswith("_date")]
+    if "start_date" in filters:
+        conditions.append(InventoryMovement.movement_date >= filters["start_date"])
+    if "end_date" in filters:
+        conditions.append(InventoryMovement.movement_date <= filters["end_date"])
+    timings = []
+    for page in range(1, pages + 1, every):
+        query = (
+            select(InventoryMovement).where(*conditions)
+            .order_by(InventoryMovement.movement_date.desc(), InventoryMovement.id.desc())
+            .offset((page - 1) * limit).limit(limit)
+        )
+        async with Session() as db:
+            started = time.perf_counter()
+            await db.execute(query)
+            timings.append({"page": page, "ms": round((time.perf_counter() - started) * 1000, 2)})
+    return timings
+
+async def run(seed: int, pages: int, limit: int, inputs: int, warehouses: int, offset_every: int, keep: bool) -> dict:
+    engine, Session = session_factory()
+    start = datetime.now().replace(microsecond=0) - 2 * SEASON
+    report = {"seeded": seed, "pages": pages, "limit": limit, "scenarios": {}}
+    try:
+        async with Session() as db:
+            fixture = await create_inventory_fixture(db, "movement-history", inputs, warehouses)
+        try:
+            if seed:
+                await seed_movements(Session, fixture, seed, start)
+            for name, filters in scenarios(fixture, start):
+                samples = await walk_cursor(Session, name, filters, pages, limit)
+                head, tail = samples[:10], samples[-10:]
+                scenario = {
+                    "pages_read": len(samples),
+                    "all_pages": latency_summary(samples),
+                    "first_10_pages": latency_summary(head),
+                    "last_10_pages": latency_summary(tail),
+                }
+                if offset_every:
+                    scenario["offset_limit"] = await offset_timings(Session, filters, len(samples), limit, offset_every)
+                report["scenarios"][name] = scenario
+        finally:
+            if keep:
+                report["fixture"] = fixture._asdict()
+            else:
+                async with Session() as db:
+                    await drop_inventory_fixture(db, fixture)
+    finally:
+        await engine.dispose()
+    return report
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Latencia por página del historial de movimientos con cursor")
+    parser.add_argument("--seed", type=int, default=3_000_000, help="Movimientos a sembrar (0 para usar los existentes)")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--inputs", type=int, default=200)
+    parser.add_argument("--warehouses", type=int, default=5)
+    parser.add_argument("--offset-sample", type=int, default=0, help="Mide OFFSET/LIMIT cada N páginas (0 desactiva)")
+    parser.add_argument("--keep", action="store_true", help="No borra los datos sembrados")
+    args = parser.parse_args()
+    require_dsn()
+    report = asyncio.run(run(
+        args.seed, args.pages, args.limit, args.inputs, args.warehouses, args.offset_sample, args.keep
+    ))
+    print(json.dumps(report, indent=2, default=str))
+
+if __name__ == "__main__":
+    main()
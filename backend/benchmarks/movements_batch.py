@@ -0,0 +1,105 @@
+"""
+Throughput de POST /inventory/movements/batch frente a POST
+/inventory/movements/ en movimientos por segundo. Mide el camino de base
+de datos de cada endpoint (create_inventory_movements_batch y
+create_inventory_movement, una sesión por petición), sin HTTP.
+
+El mismo juego de movimientos (entradas y salidas alternas sobre varios
+insumos) se registra por las dos vías sobre fixtures separados.
+
+Uso (desde la raíz del proyecto):
+    BENCHMARK_DATABASE_URL=... python -m backend.benchmarks.movements_batch
+    BENCHMARK_DATABASE_URL=... python -m backend.benchmarks.movements_batch --movements 5000 --batch-size 500
+"""
+import argparse
+import asyncio
+import json
+import time
+from . import create_inventory_fixture, drop_inventory_fixture, require_dsn, session_factory
+
+def build_movements(fixture, count: int) -> list:
+    from ..schemas.schemas_inventory import InventoryMovementCreate
+
+    pairs = [(i, w) for i in fixture.input_ids for w in fixture.warehouse_ids]
+    movements = []
+    for index in range(count):
+        input_id, warehouse_id = pairs[index % len(pairs)]
+        # Entradas y salidas alternas: el saldo nunca baja del stock inicial
+        exit_turn = (index // len(pairs)) % 2 == 1
+        movements.append(InventoryMovementCreate(
+            input_id=input_id, warehouse_id=warehouse_id,
+            movement_type="exit" if exit_turn else "entry",
+            quantity=1.0, unit_price=None if exit_turn else 1.0,
+        ))
+    return movements
+
+async def seed_stock(Session, fixture) -> None:
+    from ..crud.crud_inventory import create_inventory_movements_batch
+    from ..schemas.schemas_inventory import InventoryMovementCreate
+
+    async with Session() as db:
+        await create_inventory_movements_batch(db, [
+            InventoryMovementCreate(input_id=i, warehouse_id=w, movement_type="entry", quantity=100.0, unit_price=1.0)
+            for i in fixture.input_ids for w in fixture.warehouse_ids
+        ])
+
+async def run_single(Session, movements: list) -> float:
+    from ..crud.crud_inventory import create_inventory_movement
+
+    start = time.perf_counter()
+    for movement in movements:
+        async with Session() as db:
+            await create_inventory_movement(db, movement)
+    return time.perf_counter() - start
+
+async def run_batch(Session, movements: list, batch_size: int) -> float:
+    from ..crud.crud_inventory import create_inventory_movements_batch
+
+    start = time.perf_counter()
+    for offset in range(0, len(movements), batch_size):
+        async with Session() as db:
+            result = await create_inventory_movements_batch(db, movements[offset:offset + batch_size])
+        if result.failed:
+            raise RuntimeError(f"El lote en {offset} tuvo {result.failed} movimientos con error")
+    return time.perf_counter() - start
+
+async def run(count: int, batch_size: int, inputs: int, warehouses: int) -> dict:
+    engine, Session = session_factory()
+    report = {"movements": count, "batch_size": batch_size, "pairs": inputs * warehouses}
+    try:
+        for path in ("single", "batch"):
+            async with Session() as db:
+                fixture = await create_inventory_fixture(db, f"movements-{path}", inputs, warehouses)
+            try:
+                await seed_stock(Session, fixture)
+                movements = build_movements(fixture, count)
+                if path == "single":
+                    elapsed = await run_single(Session, movements)
+                else:
+                    elapsed = await run_batch(Session, movements, batch_size)
+                report[path] = {
+                    "seconds": round(elapsed, 3),
+                    "movements_per_second": round(count / elapsed, 1),
+                }
+            finally:
+                async with Session() as db:
+                    await drop_inventory_fixture(db, fixture)
+        report["speedup"] = round(
+            report["batch"]["movements_per_second"] / report["single"]["movements_per_second"], 1
+        )
+    finally:
+        await engine.dispose()
+    return report
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Movimientos por segundo: lote frente a movimiento suelto")
+    parser.add_argument("--movements", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--inputs", type=int, default=20)
+    parser.add_argument("--warehouses", type=int, default=2)
+    args = parser.parse_args()
+    require_dsn()
+    print(json.dumps(asyncio.run(run(args.movements, args.batch_size, args.inputs, args.warehouses))))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Tamaño de respuesta y tiempo de servidor de GET /plots/ en cada nivel de
+simplificación (plot_geom, _high, _medium, _low) elegido por zoom o
+tolerance. Mide get_plots más la serialización JSON de la respuesta
+(List[PlotResponse]), que es lo que hace el endpoint, sin HTTP.
+
+Usa las parcelas de la base; con --seed crea antes N parcelas sintéticas
+de muchos vértices (y las borra al terminar). Las parcelas sembradas se
+insertan por SQL y no pasan por plot_summary: usar una base desechable.
+
+Uso (desde la raíz del proyecto):
+    BENCHMARK_DATABASE_URL=... python -m backend.benchmarks.plot_simplification
+    BENCHMARK_DATABASE_URL=... python -m backend.benchmarks.plot_simplification --seed 2000 --vertices 400
+"""
+import argparse
+import asyncio
+import json
+import uuid
+from typing import List
+from . import latency_summary, require_dsn, session_factory, stopwatch
+
+# (etiqueta, zoom, tolerance); None en ambos pide la geometría completa
+LEVELS = (
+    ("full", None, None),
+    ("zoom=19", 19, None),
+    ("zoom=16", 16, None),
+    ("zoom=13", 13, None),
+    ("zoom=10", 10, None),
+    ("tolerance=0.00001", None, 0.00001),
+    ("tolerance=0.0001", None, 0.0001),
+    ("tolerance=0.001", None, 0.001),
+)
+
+SEED_SQL = """
+    INSERT INTO plot (plot_name, plot_var, active, plot_geom)
+    SELECT CAST(:prefix AS text) || n, :plot_var, true,
+           ST_Buffer(
+               ST_SetSRID(ST_MakePoint(-68.8 + (n % 100) * 0.01, -33.0 + (n / 100) * 0.01), 4326)::geography,
+               150, CAST(:quad_segs AS integer)
+           )::geometry
+    FROM generate_series(1, CAST(:count AS integer)) AS n
+"""
+
+async def seed_plots(Session, count: int, vertices: int) -> str:
+    from sqlalchemy import text
+    from sqlalchemy.future import select
+    from ..models import Grapevine
+
+    prefix = f"bench-simplification {uuid.uuid4().hex[:8]} "
+    async with Session() as db:
+        plot_var = await db.scalar(select(Grapevine.gv_id).limit(1))
+        if plot_var is None:
+            raise SystemExit("--seed necesita al menos una fila en grapevines")
+        await db.execute(text(SEED_SQL), {
+            "prefix": prefix, "plot_var": plot_var, "count": count, "quad_segs": max(vertices // 4, 1),
+        })
+        await db.commit()
+        await db.execute(text("ANALYZE plot"))
+    return prefix
+
+async def drop_plots(Session, prefix: str) -> None:
+    from sqlalchemy import delete
+    from ..models import Plot
+
+    async with Session() as db:
+        await db.execute(delete(Plot).where(Plot.plot_name.startswith(prefix)))
+        await db.commit()
+
+async def measure(Session, geometry_format: str, repeat: int) -> List[dict]:
+    from pydantic import TypeAdapter
+    from ..crud.crud_plot import get_plots, select_geometry_column
+    from ..schemas.schemas_plot import PlotResponse
+
+    adapter = TypeAdapter(List[PlotResponse])
+    results = []
+    for label, zoom, tolerance in LEVELS:
+        samples, size, plots = [], 0, 0
+        for _ in range(repeat):
+            async with Session() as db:
+                with stopwatch(samples):
+                    response = await get_plots(db, geometry_format=geometry_format, zoom=zoom, tolerance=tolerance)
+                    body = adapter.dump_json(response)
+            size, plots = len(body), len(response)
+        results.append({
+            "level": label,
+            "column": select_geometry_column(zoom, tolerance).key,
+            "plots": plots,
+            "response_bytes": size,
+            **latency_summary(samples),
+        })
+    return results
+
+async def run(geometry_format: str, repeat: int, seed: int, vertices: int) -> dict:
+    engine, Session = session_factory()
+    prefix = None
+    try:
+        if seed:
+            prefix = await seed_plots(Session, seed, vertices)
+        levels = await measure(Session, geometry_format, repeat)
+    finally:
+        if prefix:
+            await drop_plots(Session, prefix)
+        await engine.dispose()
+    full = levels[0]["response_bytes"] or 1
+    for level in levels:
+        level["bytes_vs_full"] = round(level["response_bytes"] / full, 3)
+    return {"geometry_format": geometry_format, "repeat": repeat, "levels": levels}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bytes y tiempo de GET /plots/ por nivel de simplificación")
+    parser.add_argument("--geometry-format", choices=("wkt", "geojson"), default="geojson")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0, help="Parcelas sintéticas a crear antes de medir")
+    parser.add_argument("--vertices", type=int, default=400, help="Vértices aproximados por parcela sembrada")
+    args = parser.parse_args()
+    require_dsn()
+    print(json.dumps(asyncio.run(run(args.geometry_format, args.repeat, args.seed, args.vertices)), indent=2))
+
+if __name__ == "__main__":
+    main()
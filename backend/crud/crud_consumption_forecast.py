@@ -0,0 +1,235 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import Date, cast, func
+from sqlalchemy.exc import SQLAlchemyError
+from fastapi import HTTPException
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+import numpy as np
+from ..models import InputStock, InventoryMovement
+from ..models import Input as InputModel
+from ..schemas.schemas_inventory import ConsumptionForecastItem, ConsumptionForecastReport
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ventanas (días) de las tasas de consumo móviles
+RATE_WINDOWS = (30, 90, 365)
+
+# Índices de semana ISO 1..53; la columna 0 no se usa
+ISO_WEEKS = 54
+
+# Límites del factor de tendencia (consumo reciente frente a la estacionalidad)
+TREND_BOUNDS = (0.5, 2.0)
+TREND_WINDOW = 90
+
+# El consumo de los insumos fitosanitarios se concentra en pocas ventanas de
+# tratamiento, así que una media plana subestima la demanda justo antes de
+# cada ventana. El modelo es una matriz insumos x días de salidas:
+# - tasas móviles de 30/90/365 días a partir de la suma acumulada;
+# - perfil estacional: consumo medio diario de cada semana ISO en el
+#   histórico (una multiplicación de matrices por la indicatriz semana-día);
+# - tendencia: consumo real de los últimos 90 días frente a lo que el
+#   perfil predecía para esos mismos días, acotada a [0.5, 2];
+# - proyección: perfil x tendencia para cada día del horizonte, acumulada
+#   contra el stock actual para hallar cuándo cae por debajo del mínimo.
+# Todo el catálogo se calcula a la vez, sin bucles por insumo.
+
+def _iso_weeks(start: date, days: int) -> np.ndarray:
+    return np.fromiter(((start + timedelta(days=i)).isocalendar()[1] for i in range(days)), dtype=np.int64, count=days)
+
+def _week_indicator(weeks: np.ndarray) -> np.ndarray:
+    indicator = np.zeros((weeks.size, ISO_WEEKS))
+    indicator[np.arange(weeks.size), weeks] = 1.0
+    return indicator
+
+def forecast_consumption(
+        daily_exits: np.ndarray,
+        history_start: date,
+        available: np.ndarray,
+        minimum: np.ndarray,
+        horizon_days: int,
+        lead_time_days: int,
+        coverage_days: int
+        ) -> Dict[str, np.ndarray]:
+    """
+    Núcleo vectorizado. `daily_exits` es (insumos x días de histórico) y
+    termina en el día anterior a la previsión; `available` y `minimum` son
+    vectores por insumo. Devuelve arrays por insumo.
+    """
+    n_inputs, history_days = daily_exits.shape
+    cumulative = np.concatenate([np.zeros((n_inputs, 1)), np.cumsum(daily_exits, axis=1)], axis=1)
+    rates = {}
+    for window in RATE_WINDOWS:
+        span = min(window, history_days)
+        rates[window] = (cumulative[:, -1] - cumulative[:, -1 - span]) / span if span else np.zeros(n_inputs)
+
+    # Perfil estacional: consumo medio diario por semana ISO; las semanas sin
+    # histórico (menos de un año de datos, o la semana 53) usan la tasa de 90 días
+    history_weeks = _iso_weeks(history_start, history_days)
+    indicator = _week_indicator(history_weeks)
+    weekly_totals = daily_exits @ indicator
+    week_days = indicator.sum(axis=0)
+    profile = np.where(
+        week_days > 0,
+        weekly_totals / np.maximum(week_days, 1),
+        rates[90][:, None]
+    )
+
+    # Tendencia: últimos días reales frente al perfil de esos mismos días
+    recent = min(TREND_WINDOW, history_days)
+    expected_recent = profile[:, history_weeks[history_days - recent:]].sum(axis=1)
+    actual_recent = cumulative[:, -1] - cumulative[:, -1 - recent]
+    trend = np.divide(actual_recent, expected_recent, out=np.ones(n_inputs), where=expected_recent > 0)
+    trend = np.clip(trend, *TREND_BOUNDS)
+
+    forecast_start = history_start + timedelta(days=history_days)
+    future_weeks = _iso_weeks(forecast_start, horizon_days)
+    projected = profile[:, future_weeks] * trend[:, None]
+    projected_cumulative = np.cumsum(projected, axis=1)
+
+    # Día en que stock - demanda acumulada cae por debajo del mínimo. La
+    # columna 0 es el stock actual y la k el saldo al cierre del día k - 1.
+    remaining = available[:, None] - projected_cumulative
+    below = np.concatenate([(available < minimum)[:, None], remaining < minimum[:, None]], axis=1)
+    has_breach = below.any(axis=1)
+    breach_day = np.where(has_breach, np.maximum(np.argmax(below, axis=1) - 1, 0), -1)
+
+    # Pedido sugerido en la fecha de pedido (rotura - plazo de entrega, u hoy
+    # si no hay rotura): debe dejar, tras el plazo y la cobertura, al menos el
+    # mínimo como stock de seguridad. Punto de pedido: mínimo + demanda
+    # durante el plazo a partir de esa fecha.
+    order_day = np.where(has_breach, np.maximum(breach_day - lead_time_days, 0), 0)
+    padded = np.concatenate([np.zeros((n_inputs, 1)), projected_cumulative], axis=1)
+    at_order = np.take_along_axis(padded, order_day[:, None], axis=1)[:, 0]
+    at_arrival = np.take_along_axis(padded, np.minimum(order_day + lead_time_days, horizon_days)[:, None], axis=1)[:, 0]
+    covered = np.take_along_axis(
+        padded, np.minimum(order_day + lead_time_days + coverage_days, horizon_days)[:, None], axis=1
+    )[:, 0]
+    reorder_point = minimum + at_arrival - at_order
+    order_quantity = np.maximum(minimum + covered - available, 0.0)
+    order_day = np.where(has_breach, order_day, -1)
+
+    return {
+        "rate_30d": rates[30],
+        "rate_90d": rates[90],
+        "rate_365d": rates[365],
+        "trend": trend,
+        "peak_iso_week": np.where(profile[:, 1:].max(axis=1) > 0, profile[:, 1:].argmax(axis=1) + 1, 0),
+        "projected_demand": projected_cumulative[:, -1],
+        "breach_day": breach_day,
+        "reorder_point": reorder_point,
+        "order_quantity": order_quantity,
+        "order_day": order_day,
+        "profile": profile[:, 1:],
+    }
+
+def _decimal(value: float) -> Decimal:
+    return Decimal(str(round(float(value), 2)))
+
+async def get_consumption_forecast(
+        db: AsyncSession,
+        input_id: Optional[int] = None,
+        history_days: int = 730,
+        horizon_days: int = 180,
+        lead_time_days: int = 14,
+        coverage_days: int = 30,
+        only_at_risk: bool = False,
+        include_profile: bool = False
+        ) -> ConsumptionForecastReport:
+    """
+    Previsión de consumo y punto de pedido de los insumos activos a partir de
+    las salidas del libro (todos los almacenes). Dos consultas agregadas en
+    la base de datos y el resto en NumPy sobre el catálogo completo.
+    """
+    today = date.today()
+    history_start = today - timedelta(days=history_days)
+    stock = (
+        select(InputStock.input_id, func.sum(InputStock.available_quantity).label("available_quantity"))
+        .group_by(InputStock.input_id)
+        .subquery("stock")
+    )
+    input_conditions = [InputModel.is_active.is_(True)]
+    if input_id is not None:
+        input_conditions.append(InputModel.id == input_id)
+
+    movement_day = cast(InventoryMovement.movement_date, Date)
+    exit_conditions = [
+        InventoryMovement.movement_type == "exit",
+        InventoryMovement.movement_date >= datetime.combine(history_start, datetime.min.time()),
+        InventoryMovement.movement_date < datetime.combine(today, datetime.min.time()),
+    ]
+    if input_id is not None:
+        exit_conditions.append(InventoryMovement.input_id == input_id)
+
+    try:
+        inputs = (await db.execute(
+            select(
+                InputModel.id,
+                InputModel.name,
+                InputModel.unit_of_measure,
+                InputModel.minimum_stock,
+                func.coalesce(stock.c.available_quantity, 0).label("available_quantity"),
+            )
+            .outerjoin(stock, stock.c.input_id == InputModel.id)
+            .where(*input_conditions)
+            .order_by(InputModel.id)
+        )).all()
+        exits = (await db.execute(
+            select(InventoryMovement.input_id, movement_day.label("day"), func.sum(InventoryMovement.quantity))
+            .where(*exit_conditions)
+            .group_by(InventoryMovement.input_id, movement_day)
+        )).all()
+    except SQLAlchemyError as e:
+        logger.error(f"Error al cargar el histórico de consumo: {e}")
+        raise HTTPException(status_code=500, detail="Error al calcular la previsión de consumo")
+
+    report = ConsumptionForecastReport(
+        generated_at=datetime.now(),
+        history_days=history_days,
+        horizon_days=horizon_days,
+        lead_time_days=lead_time_days,
+        coverage_days=coverage_days,
+    )
+    if not inputs:
+        return report
+
+    positions = {row.id: index for index, row in enumerate(inputs)}
+    daily_exits = np.zeros((len(inputs), history_days))
+    if exits:
+        known = [(positions[row[0]], (row[1] - history_start).days, float(row[2])) for row in exits if row[0] in positions]
+        if known:
+            rows, columns, quantities = (np.array(values) for values in zip(*known))
+            np.add.at(daily_exits, (rows.astype(np.int64), columns.astype(np.int64)), quantities)
+
+    available = np.array([float(row.available_quantity) for row in inputs])
+    minimum = np.array([float(row.minimum_stock or 0) for row in inputs])
+    result = forecast_consumption(
+        daily_exits, history_start, available, minimum, horizon_days, lead_time_days, coverage_days
+    )
+
+    for index, row in enumerate(inputs):
+        breach_day = int(result["breach_day"][index])
+        if only_at_risk and breach_day < 0:
+            continue
+        order_day = int(result["order_day"][index])
+        report.items.append(ConsumptionForecastItem(
+            input_id=row.id,
+            input_name=row.name,
+            unit_of_measure=row.unit_of_measure,
+            available_quantity=row.available_quantity,
+            minimum_stock=row.minimum_stock,
+            rate_30d=_decimal(result["rate_30d"][index]),
+            rate_90d=_decimal(result["rate_90d"][index]),
+            rate_365d=_decimal(result["rate_365d"][index]),
+            trend=round(float(result["trend"][index]), 3),
+            peak_iso_week=int(result["peak_iso_week"][index]) or None,
+            projected_demand=_decimal(result["projected_demand"][index]),
+            below_minimum_on=today + timedelta(days=breach_day) if breach_day >= 0 else None,
+            reorder_point=_decimal(result["reorder_point"][index]),
+            suggested_order_date=today + timedelta(days=order_day) if order_day >= 0 else None,
+            suggested_order_quantity=_decimal(result["order_quantity"][index]),
+            weekly_profile=[round(float(value), 3) for value in result["profile"][index]] if include_profile else None,
+        ))
+    return report
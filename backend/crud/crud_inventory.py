@@ -1,15 +1,25 @@
 import sqlalchemy.exc
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, delete, and_, func, or_
+from sqlalchemy import update, delete, insert, and_, func, or_, tuple_, case, values, column, Integer, Numeric
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import datetime
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Union, Tuple
 from decimal import Decimal
-from ..models import InputCategory, Warehouse, InputStock, InventoryMovement, Supplier, PurchaseOrder, PurchaseOrderDetail, TaskInput
+from ..models import InputCategory, Warehouse, InputStock, InventoryMovement, Supplier, PurchaseOrder, PurchaseOrderDetail, TaskInput, StockSnapshotRun
 from ..models import  Input as InputModel
 from ..schemas.schemas_inventory import TaskInputUpdate,TaskInputCreate,PurchaseOrderDetailUpdate,PurchaseOrderUpdate,PurchaseOrderCreate,SupplierUpdate,SupplierCreate,InventoryMovementCreate,InputStockUpdate,InputStockCreate,WarehouseUpdate,WarehouseCreate,InputUpdate,InputCreate,InputCategoryUpdate 
 from ..schemas.schemas_inventory import Input as InputSchema
+from ..schemas.schemas_inventory import InventoryMovementBatchResult, InventoryMovementBatchItemResult, InputPage, InventoryMovementPage
+from ..schemas.schemas_inventory import PurchaseOrderReceive, PurchaseOrderReceiveResult, PurchaseOrderReceiveLineResult
+from ..schemas.schemas_inventory import PurchaseOrderWithDetails, PurchaseOrderDetailWithInput, PurchaseOrderPage
+from ..schemas.schemas_inventory import Supplier as SupplierSchema
+from ..schemas.schemas_inventory import StockTransferCreate, StockTransferResult, StockTransferLineResult
+from .pagination import encode_cursor, decode_cursor, parse_cursor_datetime
+from .crud_stock_alerts import refresh_stock_alerts, refresh_input_stock_alerts, clear_stock_alerts
+from .crud_valuation import record_movement_valuation, average_unit_costs, VALUATION_COLUMNS
 from fastapi import HTTPException
+import logging
 # ==================== Input Categories CRUD ====================
 
 async def create_input(db: AsyncSession, input_data: InputCreate):
@@ -127,6 +137,8 @@ async def create_input(db: AsyncSession, input_item: InputCreate) -> InputModel:
                     available_quantity=input_item.initial_quantity,
                 )
                 db.add(db_stock)
+                await db.flush()
+                await refresh_stock_alerts(db, [(db_input.id, warehouse.id)])
 
         await db.commit()
         await db.refresh(db_input)
@@ -140,6 +152,73 @@ async def get_input(db: AsyncSession, input_id: int) -> Optional[InputModel]:
     result = await db.execute(select(InputModel).where(InputModel.id == input_id))
     return result.scalars().first()
 
+def input_catalog_query(
+    category_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    brand: Optional[str] = None,
+    name_prefix: Optional[str] = None
+):
+    """
+    Consulta del catálogo de insumos con el nombre de la categoría en la misma
+    sentencia (sin una consulta por insumo) y los filtros del listado.
+    """
+    query = (
+        select(InputModel, InputCategory.name.label("category_name"))
+        .outerjoin(InputCategory, InputModel.category_id == InputCategory.id)
+    )
+    if category_id is not None:
+        query = query.where(InputModel.category_id == category_id)
+    if is_active is not None:
+        query = query.where(InputModel.is_active == is_active)
+    if brand:
+        query = query.where(func.lower(InputModel.brand) == brand.lower())
+    if name_prefix:
+        # Usa el índice ix_input_lower_name (text_pattern_ops)
+        query = query.where(func.lower(InputModel.name).startswith(name_prefix.lower(), autoescape=True))
+    return query
+
+def input_from_catalog_row(row) -> InputSchema:
+    input_item = row[0]
+    return InputSchema(
+        id=input_item.id,
+        name=input_item.name,
+        category_id=input_item.category_id,
+        category_name=row.category_name if row.category_name is not None else "Categoría no encontrada",
+        brand=input_item.brand,
+        description=input_item.description,
+        unit_of_measure=input_item.unit_of_measure,
+        unit_price=input_item.unit_price,
+        minimum_stock=input_item.minimum_stock,
+        is_active=input_item.is_active,
+        created_at=input_item.created_at,
+        updated_at=input_item.updated_at
+    )
+
+async def get_input_catalog(
+    db: AsyncSession,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    category_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    brand: Optional[str] = None,
+    name_prefix: Optional[str] = None
+) -> InputPage:
+    """
+    Página del catálogo de insumos ordenada por (name, id) con paginación por
+    cursor: cada página cuesta lo mismo que la primera porque se continúa
+    desde la última clave con el índice ix_input_name_id, sin OFFSET.
+    """
+    query = input_catalog_query(category_id, is_active, brand, name_prefix)
+    after = decode_cursor(cursor, 2)
+    if after is not None:
+        query = query.where(tuple_(InputModel.name, InputModel.id) > tuple_(after[0], after[1]))
+    query = query.order_by(InputModel.name, InputModel.id).limit(limit + 1)
+
+    rows = (await db.execute(query)).all()
+    items = [input_from_catalog_row(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(items[-1].name, items[-1].id) if len(rows) > limit else None
+    return InputPage(items=items, next_cursor=next_cursor)
+
 async def get_inputs(
     db: AsyncSession,
     skip: int = 0,
@@ -147,37 +226,18 @@ async def get_inputs(
     category_id: Optional[int] = None,
     is_active: Optional[bool] = None
 ) -> List[InputSchema]:
-    query = select(InputModel)
-
-    if category_id is not None:
-        query = query.where(InputModel.category_id == category_id)
-
-    if is_active is not None:
-        query = query.where(InputModel.is_active == is_active)
-
-    query = query.offset(skip).limit(limit)
+    """
+    Listado con OFFSET que usa el frontend actual. Para recorrer el catálogo
+    completo usar get_input_catalog, que pagina por cursor.
+    """
+    query = (
+        input_catalog_query(category_id, is_active)
+        .order_by(InputModel.name, InputModel.id)
+        .offset(skip)
+        .limit(limit)
+    )
     result = await db.execute(query)
-    inputs = result.scalars().all()
-
-    result_list = []
-    for input_item in inputs:
-        category = await db.execute(select(InputCategory).where(InputCategory.id == input_item.category_id))
-        category = category.scalars().first()
-        result_list.append(InputSchema(
-            id=input_item.id,
-            name=input_item.name,
-            category_id=input_item.category_id, # Usar el category_id del input_item
-            category_name=category.name if category else "Categoría no encontrada",
-            brand=input_item.brand,
-            description=input_item.description,
-            unit_of_measure=input_item.unit_of_measure,
-            unit_price=input_item.unit_price,
-            minimum_stock=input_item.minimum_stock,
-            is_active=input_item.is_active,
-            created_at=input_item.created_at,
-            updated_at=input_item.updated_at
-        ))
-    return result_list
+    return [input_from_catalog_row(row) for row in result.all()]
 
 async def update_input(
     db: AsyncSession, 
@@ -194,12 +254,19 @@ async def update_input(
         .where(InputModel.id == input_id)
         .values(**input_data)
     )
+    if "minimum_stock" in input_data:
+        await refresh_input_stock_alerts(db, input_id)
     await db.commit()
     return await get_input(db, input_id)
 
 async def delete_input(db: AsyncSession, input_id: int) -> bool:
     # Eliminar registros en input_stock
-    await db.execute(delete(InputStock).where(InputStock.input_id == input_id))
+    stock_keys = await db.execute(
+        delete(InputStock)
+        .where(InputStock.input_id == input_id)
+        .returning(InputStock.input_id, InputStock.warehouse_id)
+    )
+    await clear_stock_alerts(db, [tuple(row) for row in stock_keys])
     # Eliminar registros en inventory_movements
     await db.execute(delete(InventoryMovement).where(InventoryMovement.input_id == input_id))
     # Eliminar registros en purchase_order_details
@@ -271,6 +338,8 @@ async def delete_warehouse(db: AsyncSession, warehouse_id: int) -> bool:
 async def create_input_stock(db: AsyncSession, stock: InputStockCreate) -> InputStock:
     db_stock = InputStock(**stock.dict())
     db.add(db_stock)
+    await db.flush()
+    await refresh_stock_alerts(db, [(db_stock.input_id, db_stock.warehouse_id)])
     await db.commit()
     await db.refresh(db_stock)
     return db_stock
@@ -389,103 +458,567 @@ async def update_input_stock(
         return await get_input_stock(db, stock_id)
     
     stock_data["last_update"] = datetime.now()
-    await db.execute(
+    result = await db.execute(
         update(InputStock)
         .where(InputStock.id == stock_id)
         .values(**stock_data)
+        .returning(InputStock.input_id, InputStock.warehouse_id)
     )
+    await refresh_stock_alerts(db, [tuple(row) for row in result])
     await db.commit()
     return await get_input_stock(db, stock_id)
 
 async def delete_input_stock(db: AsyncSession, stock_id: int) -> bool:
     result = await db.execute(
-        delete(InputStock).where(InputStock.id == stock_id)
+        delete(InputStock)
+        .where(InputStock.id == stock_id)
+        .returning(InputStock.input_id, InputStock.warehouse_id)
     )
+    deleted = [tuple(row) for row in result]
+    await clear_stock_alerts(db, deleted)
     await db.commit()
-    return result.rowcount > 0
+    return bool(deleted)
 
 # ==================== Inventory Movements CRUD ====================
 
+def movement_stock_delta(movement_type: str, quantity) -> Decimal:
+    """
+    Variación de stock que produce un movimiento: las entradas suman, las
+    salidas restan y los ajustes aplican la cantidad con su signo.
+    """
+    quantity = Decimal(str(quantity))
+    if movement_type == "entry":
+        if quantity <= 0:
+            raise HTTPException(status_code=400, detail="La cantidad de una entrada debe ser positiva")
+        return quantity
+    if movement_type == "exit":
+        if quantity <= 0:
+            raise HTTPException(status_code=400, detail="La cantidad de una salida debe ser positiva")
+        return -quantity
+    if movement_type == "adjustment":
+        return quantity
+    raise HTTPException(status_code=400, detail="Tipo de movimiento no valido")
+
+# La misma regla que movement_stock_delta como expresión SQL, para los
+# cálculos agregados sobre el libro de movimientos
+MOVEMENT_DELTA = case(
+    (InventoryMovement.movement_type == "exit", -InventoryMovement.quantity),
+    else_=InventoryMovement.quantity,
+)
+
+async def apply_stock_delta(
+    db: AsyncSession,
+    input_id: int,
+    warehouse_id: int,
+    delta: Decimal
+) -> Decimal:
+    """
+    Aplica una variación de stock en una sola sentencia atómica y devuelve
+    el nuevo saldo. No hace commit.
+
+    - delta >= 0: upsert sobre (input_id, warehouse_id).
+    - delta < 0: UPDATE condicionado a que el saldo no quede negativo; si
+      no hay fila que cumplirlo, responde 409.
+    PostgreSQL bloquea la fila durante el UPDATE y reevalúa la condición
+    sobre la versión más reciente, así que dos salidas simultáneas nunca
+    pierden un descuento.
+    """
+    if delta >= 0:
+        stmt = pg_insert(InputStock).values(
+            input_id=input_id,
+            warehouse_id=warehouse_id,
+            available_quantity=delta,
+            last_update=func.now()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[InputStock.input_id, InputStock.warehouse_id],
+            set_={
+                "available_quantity": InputStock.available_quantity + stmt.excluded.available_quantity,
+                "last_update": func.now(),
+            }
+        ).returning(InputStock.available_quantity)
+        new_quantity = (await db.execute(stmt)).scalar_one()
+        await refresh_stock_alerts(db, [(input_id, warehouse_id)])
+        return new_quantity
+
+    result = await db.execute(
+        update(InputStock)
+        .where(
+            InputStock.input_id == input_id,
+            InputStock.warehouse_id == warehouse_id,
+            InputStock.available_quantity + delta >= 0
+        )
+        .values(
+            available_quantity=InputStock.available_quantity + delta,
+            last_update=func.now()
+        )
+        .returning(InputStock.available_quantity)
+    )
+    new_quantity = result.scalar_one_or_none()
+    if new_quantity is None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Stock insuficiente del insumo {input_id} en el almacén {warehouse_id}"
+        )
+    await refresh_stock_alerts(db, [(input_id, warehouse_id)])
+    return new_quantity
+
+async def discard_stock_snapshots_after(db: AsyncSession, moment: Optional[datetime]) -> None:
+    """
+    Un movimiento con fecha pasada invalida los snapshots de stock posteriores
+    a esa fecha; se borran y el siguiente snapshot se recalcula desde el
+    anterior que sigue siendo válido. No hace commit.
+    """
+    if moment is None:
+        return
+    await db.execute(delete(StockSnapshotRun).where(StockSnapshotRun.snapshot_at > moment))
+
 async def create_inventory_movement(
-    db: AsyncSession, 
+    db: AsyncSession,
     movement: InventoryMovementCreate
 ) -> InventoryMovement:
-    # Create the movement
-    db_movement = InventoryMovement(**movement.dict())
-    db.add(db_movement)
-    await db.commit()
-    await db.refresh(db_movement)
-    
-    # Update stock based on movement type
-    stock = await get_input_stock_by_input_warehouse(
-        db, movement.input_id, movement.warehouse_id
-    )
-    
-    if stock:
-        if movement.movement_type == "entry":
-            stock.available_quantity += movement.quantity
-        elif movement.movement_type == "exit":
-            stock.available_quantity -= movement.quantity
-        elif movement.movement_type == "adjustment":
-            stock.available_quantity += movement.quantity  # Can be positive or negative for adjustment
-        
-        stock.last_update = datetime.now()
+    """
+    Registra un movimiento y actualiza el stock en la misma transacción.
+    Devuelve 409 si una salida o ajuste dejaría el stock en negativo.
+    """
+    try:
+        delta = movement_stock_delta(movement.movement_type, movement.quantity)
+        await apply_stock_delta(db, movement.input_id, movement.warehouse_id, delta)
+        await discard_stock_snapshots_after(db, movement.movement_date)
+
+        # Todos los atributos explícitos: la valoración los lee tras el flush
+        db_movement = InventoryMovement(**movement.dict())
+        db_movement.movement_date = movement.movement_date or datetime.now()
+        db.add(db_movement)
+        await db.flush()
+        await record_movement_valuation(db, [db_movement])
         await db.commit()
-    else:
-        # If stock doesn't exist and it's an entry, create new stock
-        if movement.movement_type == "entry":
-            new_stock = InputStock(
-                input_id=movement.input_id,
-                warehouse_id=movement.warehouse_id,
-                available_quantity=movement.quantity
+        await db.refresh(db_movement)
+        return db_movement
+    except HTTPException:
+        await db.rollback()
+        raise
+    except sqlalchemy.exc.IntegrityError as integrity_exc:
+        await db.rollback()
+        logging.error(f"Movimiento de inventario rechazado: {integrity_exc}")
+        raise HTTPException(status_code=409, detail="El movimiento viola una restricción de inventario")
+    except sqlalchemy.exc.SQLAlchemyError as sql_exc:
+        await db.rollback()
+        logging.error(f"Error de base de datos al crear movimiento: {sql_exc}")
+        raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(sql_exc)}")
+
+def aggregate_stock_deltas(lines) -> Dict[Tuple[int, int], Decimal]:
+    """Suma variaciones de stock [(input_id, warehouse_id, delta), ...] por par."""
+    deltas: Dict[Tuple[int, int], Decimal] = {}
+    for input_id, warehouse_id, delta in lines:
+        key = (input_id, warehouse_id)
+        deltas[key] = deltas.get(key, Decimal(0)) + Decimal(str(delta))
+    return {key: delta for key, delta in deltas.items() if delta != 0}
+
+async def lock_stock_rows(
+    db: AsyncSession,
+    deltas: Dict[Tuple[int, int], Decimal]
+) -> Dict[Tuple[int, int], Decimal]:
+    """
+    Bloquea (SELECT ... FOR UPDATE) las filas de stock de los pares con
+    variación, siempre en orden (input_id, warehouse_id) para evitar
+    interbloqueos, y devuelve su saldo actual.
+
+    Los pares que reciben stock y aún no tienen fila se crean antes a 0
+    (INSERT ... ON CONFLICT DO NOTHING): FOR UPDATE no bloquea filas
+    inexistentes, y sin ellas dos transacciones concurrentes leerían saldo 0
+    y el segundo upsert de saldo absoluto pisaría al primero. Un insert
+    concurrente del mismo par espera al índice único hasta el commit del otro.
+    Los pares que solo pierden stock no se crean; sin fila no aparecen.
+    """
+    keys = sorted(set(deltas))
+    if not keys:
+        return {}
+    incoming = [key for key in keys if deltas[key] > 0]
+    if incoming:
+        await db.execute(
+            pg_insert(InputStock)
+            .values([
+                {"input_id": input_id, "warehouse_id": warehouse_id, "available_quantity": 0, "last_update": func.now()}
+                for input_id, warehouse_id in incoming
+            ])
+            .on_conflict_do_nothing(index_elements=[InputStock.input_id, InputStock.warehouse_id])
+        )
+    result = await db.execute(
+        select(InputStock.input_id, InputStock.warehouse_id, InputStock.available_quantity)
+        .where(tuple_(InputStock.input_id, InputStock.warehouse_id).in_(keys))
+        .order_by(InputStock.input_id, InputStock.warehouse_id)
+        .with_for_update()
+    )
+    return {(row.input_id, row.warehouse_id): row.available_quantity for row in result}
+
+def stock_shortfalls(
+    balances: Dict[Tuple[int, int], Decimal],
+    deltas: Dict[Tuple[int, int], Decimal]
+) -> List[Dict[str, Any]]:
+    """Pares cuyo saldo quedaría negativo al aplicar las variaciones."""
+    shortfalls = []
+    for (input_id, warehouse_id), delta in sorted(deltas.items()):
+        available = balances.get((input_id, warehouse_id), Decimal(0))
+        if available + delta < 0:
+            shortfalls.append({
+                "input_id": input_id,
+                "warehouse_id": warehouse_id,
+                "available_quantity": float(available),
+                "requested_quantity": float(-delta),
+            })
+    return shortfalls
+
+async def apply_stock_deltas(
+    db: AsyncSession,
+    deltas: Dict[Tuple[int, int], Decimal]
+) -> Dict[Tuple[int, int], Decimal]:
+    """
+    Aplica varias variaciones de stock como una unidad: una consulta bloquea
+    y valida todos los pares y un único upsert multi-fila escribe los nuevos
+    saldos. Si algún par quedaría negativo no se escribe nada y se responde
+    409 con el detalle. No hace commit.
+    """
+    if not deltas:
+        return {}
+    balances = await lock_stock_rows(db, deltas)
+    shortfalls = stock_shortfalls(balances, deltas)
+    if shortfalls:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Stock insuficiente", "shortfalls": shortfalls}
+        )
+
+    new_balances = {
+        key: balances.get(key, Decimal(0)) + delta for key, delta in deltas.items()
+    }
+    await write_stock_balances(db, new_balances)
+    return new_balances
+
+async def write_stock_balances(
+    db: AsyncSession,
+    balances: Dict[Tuple[int, int], Decimal]
+) -> None:
+    """Escribe saldos ya validados con un único upsert multi-fila. No hace commit."""
+    if not balances:
+        return
+    stmt = pg_insert(InputStock).values([
+        {
+            "input_id": input_id,
+            "warehouse_id": warehouse_id,
+            "available_quantity": quantity,
+            "last_update": func.now(),
+        }
+        for (input_id, warehouse_id), quantity in sorted(balances.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[InputStock.input_id, InputStock.warehouse_id],
+        set_={
+            "available_quantity": stmt.excluded.available_quantity,
+            "last_update": func.now(),
+        }
+    )
+    await db.execute(stmt)
+    await refresh_stock_alerts(db, balances.keys())
+
+async def consume_inputs(
+    db: AsyncSession,
+    inputs: List[TaskInputCreate],
+    operation_id: Optional[int] = None,
+    vessel_activity_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    comments: Optional[str] = None
+) -> None:
+    """
+    Registra las salidas de stock de los insumos usados por una operación o
+    actividad de bodega: valida y descuenta todo el stock con apply_stock_deltas
+    e inserta todos los movimientos en una sola sentencia. No hace commit.
+    """
+    used = [i for i in inputs if i.used_quantity]
+    for input_data in used:
+        if input_data.warehouse_id is None:
+            raise HTTPException(status_code=400, detail=f"Falta el almacén del insumo {input_data.input_id}")
+        movement_stock_delta("exit", input_data.used_quantity)
+    if not used:
+        return
+
+    await apply_stock_deltas(db, aggregate_stock_deltas(
+        (i.input_id, i.warehouse_id, -Decimal(str(i.used_quantity))) for i in used
+    ))
+    now = datetime.now()
+    result = await db.execute(insert(InventoryMovement).returning(*VALUATION_COLUMNS, sort_by_parameter_order=True), [
+        {
+            "movement_date": now,
+            "input_id": i.input_id,
+            "warehouse_id": i.warehouse_id,
+            "movement_type": "exit",
+            "quantity": i.used_quantity,
+            "operation_id": operation_id,
+            "vessel_activity_id": vessel_activity_id,
+            "user_id": user_id,
+            "comments": comments,
+        }
+        for i in used
+    ])
+    await record_movement_valuation(db, result.all())
+
+async def create_inventory_movements_batch(
+    db: AsyncSession,
+    movements: List[InventoryMovementCreate]
+) -> InventoryMovementBatchResult:
+    """
+    Registra un lote de movimientos (recuentos, descargas de camión) en una
+    transacción: las variaciones se agregan por (input_id, warehouse_id), el
+    stock se bloquea y valida en una consulta, se escribe con un único upsert
+    y los movimientos se insertan con un INSERT multi-fila.
+
+    Los errores se informan por ítem: un ítem inválido, o todos los de un par
+    cuyo saldo quedaría negativo, se descartan sin afectar al resto.
+    """
+    report = InventoryMovementBatchResult(
+        results=[InventoryMovementBatchItemResult(index=i) for i in range(len(movements))]
+    )
+    try:
+        input_ids = {m.input_id for m in movements}
+        warehouse_ids = {m.warehouse_id for m in movements}
+        known_inputs = set((await db.execute(
+            select(InputModel.id).where(InputModel.id.in_(input_ids))
+        )).scalars().all()) if input_ids else set()
+        known_warehouses = set((await db.execute(
+            select(Warehouse.id).where(Warehouse.id.in_(warehouse_ids))
+        )).scalars().all()) if warehouse_ids else set()
+
+        # Validación por ítem
+        accepted = []
+        for item, movement in zip(report.results, movements):
+            if movement.input_id not in known_inputs:
+                item.errors.append(f"Insumo no encontrado: {movement.input_id}")
+            if movement.warehouse_id not in known_warehouses:
+                item.errors.append(f"Almacén no encontrado: {movement.warehouse_id}")
+            if movement.operation_id is not None and movement.vessel_activity_id is not None:
+                item.errors.append("Un movimiento no puede referir a una operación y a una actividad a la vez")
+            try:
+                delta = movement_stock_delta(movement.movement_type, movement.quantity)
+            except HTTPException as e:
+                item.errors.append(e.detail)
+            if item.errors:
+                item.status = "error"
+                continue
+            accepted.append((item, movement, delta))
+
+        # Saldos: los pares que quedarían negativos se descartan enteros
+        deltas = aggregate_stock_deltas(
+            (m.input_id, m.warehouse_id, delta) for _, m, delta in accepted
+        )
+        balances = await lock_stock_rows(db, deltas)
+        rejected = {}
+        for shortfall in stock_shortfalls(balances, deltas):
+            rejected[(shortfall["input_id"], shortfall["warehouse_id"])] = (
+                f"Stock insuficiente: disponible {shortfall['available_quantity']}, "
+                f"solicitado {shortfall['requested_quantity']}"
+            )
+        if rejected:
+            for item, movement, _ in accepted:
+                reason = rejected.get((movement.input_id, movement.warehouse_id))
+                if reason:
+                    item.status = "error"
+                    item.errors.append(reason)
+            accepted = [entry for entry in accepted if entry[0].status != "error"]
+
+        if accepted:
+            now = datetime.now()
+            await write_stock_balances(db, {
+                key: balances.get(key, Decimal(0)) + delta
+                for key, delta in deltas.items() if key not in rejected
+            })
+            result = await db.execute(
+                insert(InventoryMovement).returning(*VALUATION_COLUMNS, sort_by_parameter_order=True),
+                [
+                    {**movement.dict(), "movement_date": movement.movement_date or now}
+                    for _, movement, _ in accepted
+                ]
+            )
+            inserted = result.all()
+            movement_ids = [row.id for row in inserted]
+            await record_movement_valuation(db, inserted)
+            await discard_stock_snapshots_after(
+                db, min((m.movement_date for _, m, _ in accepted if m.movement_date), default=None)
             )
-            db.add(new_stock)
             await db.commit()
-    
-    return db_movement
+            for (item, _, _), movement_id in zip(accepted, movement_ids):
+                item.status = "created"
+                item.movement_id = movement_id
+    except HTTPException:
+        await db.rollback()
+        raise
+    except sqlalchemy.exc.IntegrityError as integrity_exc:
+        await db.rollback()
+        logging.error(f"Lote de movimientos rechazado: {integrity_exc}")
+        raise HTTPException(status_code=409, detail="El lote viola una restricción de inventario")
+    except sqlalchemy.exc.SQLAlchemyError as sql_exc:
+        await db.rollback()
+        logging.error(f"Error de base de datos al crear lote de movimientos: {sql_exc}")
+        raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(sql_exc)}")
+
+    report.total = len(report.results)
+    report.created = sum(1 for item in report.results if item.status == "created")
+    report.failed = report.total - report.created
+    return report
 
 async def get_inventory_movement(db: AsyncSession, movement_id: int) -> Optional[InventoryMovement]:
     result = await db.execute(select(InventoryMovement).where(InventoryMovement.id == movement_id))
     return result.scalars().first()
 
+async def transfer_stock(
+    db: AsyncSession,
+    transfer: StockTransferCreate
+) -> StockTransferResult:
+    """
+    Traslada insumos entre dos almacenes en una sola transacción: por cada
+    insumo una salida del origen y una entrada en el destino. Las filas de
+    stock de ambos almacenes se bloquean juntas en orden (input_id,
+    warehouse_id), así dos traslados en sentidos opuestos no se interbloquean.
+    La entrada se valora al costo promedio del origen.
+    """
+    source_id, destination_id = transfer.source_warehouse_id, transfer.destination_warehouse_id
+    if source_id == destination_id:
+        raise HTTPException(status_code=400, detail="El almacén de origen y el de destino deben ser distintos")
+
+    quantities: Dict[int, Decimal] = {}
+    for line in transfer.lines:
+        quantities[line.input_id] = quantities.get(line.input_id, Decimal(0)) + Decimal(str(line.quantity))
+
+    try:
+        warehouses = {
+            row.id: row.name for row in await db.execute(
+                select(Warehouse.id, Warehouse.name).where(Warehouse.id.in_((source_id, destination_id)))
+            )
+        }
+        missing_warehouses = {source_id, destination_id} - set(warehouses)
+        if missing_warehouses:
+            raise HTTPException(status_code=404, detail=f"Almacenes no encontrados: {sorted(missing_warehouses)}")
+        known_inputs = set((await db.execute(
+            select(InputModel.id).where(InputModel.id.in_(list(quantities)))
+        )).scalars().all())
+        missing_inputs = set(quantities) - known_inputs
+        if missing_inputs:
+            raise HTTPException(status_code=400, detail=f"Insumos no encontrados: {sorted(missing_inputs)}")
+
+        balances = await apply_stock_deltas(db, aggregate_stock_deltas(
+            line
+            for input_id, quantity in quantities.items()
+            for line in ((input_id, source_id, -quantity), (input_id, destination_id, quantity))
+        ))
+        unit_costs = await average_unit_costs(db, ((input_id, source_id) for input_id in quantities))
+
+        now = datetime.now()
+        reference = f"Traslado {warehouses[source_id]} → {warehouses[destination_id]}"
+        comments = f"{reference}: {transfer.comments}" if transfer.comments else reference
+        input_ids = sorted(quantities)
+        rows = []
+        for input_id in input_ids:
+            for warehouse_id, movement_type, unit_price in (
+                (source_id, "exit", None),
+                (destination_id, "entry", unit_costs.get((input_id, source_id))),
+            ):
+                rows.append({
+                    "movement_date": now,
+                    "input_id": input_id,
+                    "warehouse_id": warehouse_id,
+                    "movement_type": movement_type,
+                    "quantity": quantities[input_id],
+                    "unit_price": unit_price,
+                    "user_id": transfer.user_id,
+                    "comments": comments,
+                })
+        result = await db.execute(
+            insert(InventoryMovement).returning(*VALUATION_COLUMNS, sort_by_parameter_order=True), rows
+        )
+        inserted = result.all()
+        await record_movement_valuation(db, inserted)
+        await db.commit()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except sqlalchemy.exc.SQLAlchemyError as sql_exc:
+        await db.rollback()
+        logging.error(f"Error de base de datos en el traslado de stock: {sql_exc}")
+        raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(sql_exc)}")
+
+    return StockTransferResult(
+        source_warehouse_id=source_id,
+        destination_warehouse_id=destination_id,
+        movement_date=now,
+        lines=[
+            StockTransferLineResult(
+                input_id=input_id,
+                quantity=quantities[input_id],
+                exit_movement_id=inserted[2 * index].id,
+                entry_movement_id=inserted[2 * index + 1].id,
+                source_quantity=balances[(input_id, source_id)],
+                destination_quantity=balances[(input_id, destination_id)],
+            )
+            for index, input_id in enumerate(input_ids)
+        ]
+    )
+
 async def get_inventory_movements(
-    db: AsyncSession, 
-    skip: int = 0, 
+    db: AsyncSession,
     limit: int = 100,
+    cursor: Optional[str] = None,
     input_id: Optional[int] = None,
     warehouse_id: Optional[int] = None,
     movement_type: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     operation_id: Optional[int] = None
-) -> List[InventoryMovement]:
-    query = select(InventoryMovement)
-    
+) -> InventoryMovementPage:
+    """
+    Historial de movimientos, del más reciente al más antiguo, paginado por
+    cursor sobre (movement_date, id). Cada filtro tiene un índice compuesto
+    que termina en (movement_date, id), así que una página es un recorrido
+    acotado del índice sea cual sea su profundidad.
+    """
     filters = []
     if input_id is not None:
         filters.append(InventoryMovement.input_id == input_id)
-    
+
     if warehouse_id is not None:
         filters.append(InventoryMovement.warehouse_id == warehouse_id)
-    
+
     if movement_type is not None:
         filters.append(InventoryMovement.movement_type == movement_type)
-    
+
     if start_date is not None:
         filters.append(InventoryMovement.movement_date >= start_date)
-    
+
     if end_date is not None:
         filters.append(InventoryMovement.movement_date <= end_date)
-    
+
     if operation_id is not None:
         filters.append(InventoryMovement.operation_id == operation_id)
-    
-    if filters:
-        query = query.where(and_(*filters))
-    
-    query = query.order_by(InventoryMovement.movement_date.desc()).offset(skip).limit(limit)
+
+    before = decode_cursor(cursor, 2)
+    if before is not None:
+        filters.append(
+            tuple_(InventoryMovement.movement_date, InventoryMovement.id)
+            < tuple_(parse_cursor_datetime(before[0]), before[1])
+        )
+
+    query = (
+        select(InventoryMovement)
+        .where(*filters)
+        .order_by(InventoryMovement.movement_date.desc(), InventoryMovement.id.desc())
+        .limit(limit + 1)
+    )
     result = await db.execute(query)
-    return result.scalars().all()
+    movements = result.scalars().all()
+
+    page = movements[:limit]
+    next_cursor = None
+    if len(movements) > limit:
+        next_cursor = encode_cursor(page[-1].movement_date, page[-1].id)
+    return InventoryMovementPage(items=page, next_cursor=next_cursor)
 
 # ==================== Suppliers CRUD ====================
 
@@ -572,50 +1105,87 @@ async def get_purchase_order(db: AsyncSession, order_id: int) -> Optional[Purcha
     result = await db.execute(select(PurchaseOrder).where(PurchaseOrder.id == order_id))
     return result.scalars().first()
 
-async def get_purchase_order_with_details(db: AsyncSession, order_id: int) -> Optional[Dict]:
-    # Get the order
-    order_result = await db.execute(select(PurchaseOrder).where(PurchaseOrder.id == order_id))
-    order = order_result.scalars().first()
-    
-    if not order:
-        return None
-    
-    # Get supplier
-    supplier_result = await db.execute(
-        select(Supplier).where(Supplier.id == order.supplier_id)
+def _purchase_order_detail_from_row(row) -> PurchaseOrderDetailWithInput:
+    detail = row.PurchaseOrderDetail
+    return PurchaseOrderDetailWithInput(
+        id=detail.id,
+        order_id=detail.order_id,
+        input_id=detail.input_id,
+        requested_quantity=detail.requested_quantity,
+        received_quantity=detail.received_quantity if detail.received_quantity is not None else 0,
+        unit_price=detail.unit_price,
+        reception_date=detail.reception_date,
+        created_at=detail.created_at,
+        updated_at=detail.updated_at,
+        input=input_from_catalog_row(row)
     )
-    supplier = supplier_result.scalars().first()
-    
-    # Get order details with input information
+
+async def _load_purchase_orders(db: AsyncSession, order_rows) -> List[PurchaseOrderWithDetails]:
+    """
+    Completa filas (PurchaseOrder, Supplier) con sus líneas e insumos en una
+    sola consulta para todas las órdenes (order_id = ANY(...)).
+    """
+    if not order_rows:
+        return []
+    order_ids = [row.PurchaseOrder.id for row in order_rows]
     details_result = await db.execute(
-        select(PurchaseOrderDetail, InputModel)
-        .join(InputModel, PurchaseOrderDetail.input_id == InputModel.id)
-        .where(PurchaseOrderDetail.order_id == order_id)
+        select(InputModel, InputCategory.name.label("category_name"), PurchaseOrderDetail)
+        .join(PurchaseOrderDetail, PurchaseOrderDetail.input_id == InputModel.id)
+        .outerjoin(InputCategory, InputModel.category_id == InputCategory.id)
+        .where(PurchaseOrderDetail.order_id.in_(order_ids))
+        .order_by(PurchaseOrderDetail.order_id, PurchaseOrderDetail.id)
+    )
+    details: Dict[int, List[PurchaseOrderDetailWithInput]] = {order_id: [] for order_id in order_ids}
+    for row in details_result:
+        details[row.PurchaseOrderDetail.order_id].append(_purchase_order_detail_from_row(row))
+
+    orders = []
+    for row in order_rows:
+        order, supplier = row.PurchaseOrder, row.Supplier
+        orders.append(PurchaseOrderWithDetails(
+            id=order.id,
+            order_date=order.order_date,
+            supplier_id=order.supplier_id,
+            user_id=order.user_id,
+            comments=order.comments,
+            status=order.status,
+            reception_date=order.reception_date,
+            created_at=order.created_at,
+            updated_at=order.updated_at,
+            supplier=SupplierSchema.model_validate(supplier) if supplier is not None else None,
+            order_details=details[order.id]
+        ))
+    return orders
+
+def _purchase_orders_query():
+    return (
+        select(PurchaseOrder, Supplier)
+        .outerjoin(Supplier, PurchaseOrder.supplier_id == Supplier.id)
     )
-    
-    details_with_inputs = []
-    for detail, input_item in details_result:
-        detail_dict = {**detail.__dict__}
-        detail_dict["input"] = input_item
-        details_with_inputs.append(detail_dict)
-    
-    order_with_details = {**order.__dict__}
-    order_with_details["order_details"] = details_with_inputs
-    order_with_details["supplier"] = supplier
-    
-    return order_with_details
+
+async def get_purchase_order_with_details(db: AsyncSession, order_id: int) -> Optional[PurchaseOrderWithDetails]:
+    """Orden con proveedor y líneas (con su insumo) en dos consultas."""
+    order_row = (await db.execute(
+        _purchase_orders_query().where(PurchaseOrder.id == order_id)
+    )).first()
+    if order_row is None:
+        return None
+    return (await _load_purchase_orders(db, [order_row]))[0]
 
 async def get_purchase_orders(
     db: AsyncSession, 
-    skip: int = 0, 
     limit: int = 100,
+    cursor: Optional[str] = None,
     supplier_id: Optional[int] = None,
     status: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None
-) -> List[PurchaseOrder]:
-    query = select(PurchaseOrder)
-    
+) -> PurchaseOrderPage:
+    """
+    Página de órdenes, de la más reciente a la más antigua, con proveedor y
+    líneas incluidos: una consulta para las órdenes (con su proveedor) y otra
+    para las líneas de toda la página. Cursor sobre (order_date, id).
+    """
     filters = []
     if supplier_id is not None:
         filters.append(PurchaseOrder.supplier_id == supplier_id)
@@ -628,13 +1198,28 @@ async def get_purchase_orders(
     
     if end_date is not None:
         filters.append(PurchaseOrder.order_date <= end_date)
-    
-    if filters:
-        query = query.where(and_(*filters))
-    
-    query = query.order_by(PurchaseOrder.order_date.desc()).offset(skip).limit(limit)
-    result = await db.execute(query)
-    return result.scalars().all()
+
+    before = decode_cursor(cursor, 2)
+    if before is not None:
+        filters.append(
+            tuple_(PurchaseOrder.order_date, PurchaseOrder.id)
+            < tuple_(parse_cursor_datetime(before[0]), before[1])
+        )
+
+    query = (
+        _purchase_orders_query()
+        .where(*filters)
+        .order_by(PurchaseOrder.order_date.desc(), PurchaseOrder.id.desc())
+        .limit(limit + 1)
+    )
+    rows = (await db.execute(query)).all()
+
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1].PurchaseOrder
+        next_cursor = encode_cursor(last.order_date, last.id)
+    return PurchaseOrderPage(items=await _load_purchase_orders(db, page), next_cursor=next_cursor)
 
 async def update_purchase_order(
     db: AsyncSession, 
@@ -654,109 +1239,202 @@ async def update_purchase_order(
     await db.commit()
     return await get_purchase_order(db, order_id)
 
+async def _receive_order_lines(
+    db: AsyncSession,
+    order_id: int,
+    lines: List[Tuple[int, Decimal]],
+    warehouse_id: Optional[int] = None,
+    reception_date: Optional[datetime] = None,
+    user_id: Optional[int] = None
+) -> PurchaseOrderReceiveResult:
+    """
+    Registra cantidades recibidas (totales acumulados por línea) de una orden.
+    Las variaciones se calculan en el mismo UPDATE que fija los nuevos
+    totales, el stock y los movimientos de entrada se escriben en bloque y el
+    estado de la orden se recalcula en SQL. No hace commit.
+    """
+    order = (await db.execute(
+        select(PurchaseOrder.id, PurchaseOrder.user_id)
+        .where(PurchaseOrder.id == order_id)
+        .with_for_update()
+    )).first()
+    if order is None:
+        raise HTTPException(status_code=404, detail="Orden de compra no encontrada")
+
+    if warehouse_id is None:
+        # Almacén por defecto de las recepciones: el primero de bodega
+        warehouse_id = await db.scalar(
+            select(Warehouse.id).where(Warehouse.type == "winery").order_by(Warehouse.id).limit(1)
+        )
+        if warehouse_id is None:
+            raise HTTPException(status_code=400, detail="No hay almacén de bodega para la recepción")
+
+    now = datetime.now()
+    reception_date = reception_date or now
+    received = values(
+        column("detail_id", Integer), column("received_quantity", Numeric(12, 2)), name="received"
+    ).data([(detail_id, Decimal(str(quantity))) for detail_id, quantity in dict(lines).items()])
+    previous = PurchaseOrderDetail.__table__.alias("previous")
+    result = await db.execute(
+        update(PurchaseOrderDetail)
+        .where(
+            PurchaseOrderDetail.id == received.c.detail_id,
+            PurchaseOrderDetail.order_id == order_id,
+            previous.c.id == PurchaseOrderDetail.id,
+        )
+        .values(
+            received_quantity=received.c.received_quantity,
+            reception_date=reception_date,
+            updated_at=now,
+        )
+        .returning(
+            PurchaseOrderDetail.id,
+            PurchaseOrderDetail.input_id,
+            PurchaseOrderDetail.unit_price,
+            (received.c.received_quantity - func.coalesce(previous.c.received_quantity, 0)).label("delta"),
+        )
+    )
+    updated = result.all()
+
+    missing = {detail_id for detail_id, _ in lines} - {row.id for row in updated}
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Líneas que no pertenecen a la orden {order_id}: {sorted(missing)}"
+        )
+    reduced = [row.id for row in updated if row.delta < 0]
+    if reduced:
+        raise HTTPException(
+            status_code=400,
+            detail=f"No se puede reducir la cantidad recibida de las líneas {sorted(reduced)}"
+        )
+
+    receipts = sorted((row for row in updated if row.delta > 0), key=lambda row: row.id)
+    movement_ids: Dict[int, int] = {}
+    if receipts:
+        await apply_stock_deltas(db, aggregate_stock_deltas(
+            (row.input_id, warehouse_id, row.delta) for row in receipts
+        ))
+        inserted = (await db.execute(
+            insert(InventoryMovement).returning(*VALUATION_COLUMNS, sort_by_parameter_order=True),
+            [
+                {
+                    "movement_date": reception_date,
+                    "input_id": row.input_id,
+                    "warehouse_id": warehouse_id,
+                    "movement_type": "entry",
+                    "quantity": row.delta,
+                    "unit_price": row.unit_price,
+                    "user_id": user_id or order.user_id,
+                    "comments": f"Recepción de orden de compra #{order_id}",
+                }
+                for row in receipts
+            ]
+        )).all()
+        await record_movement_valuation(db, inserted)
+        movement_ids = {row.id: movement.id for row, movement in zip(receipts, inserted)}
+        await discard_stock_snapshots_after(db, reception_date if reception_date < now else None)
+
+    lines_status = (
+        select(case(
+            (func.bool_and(func.coalesce(PurchaseOrderDetail.received_quantity, 0) >= PurchaseOrderDetail.requested_quantity), "completed"),
+            (func.bool_or(func.coalesce(PurchaseOrderDetail.received_quantity, 0) > 0), "partially_received"),
+            else_="pending",
+        ))
+        .where(PurchaseOrderDetail.order_id == order_id)
+        .scalar_subquery()
+    )
+    status = await db.scalar(
+        update(PurchaseOrder)
+        .where(PurchaseOrder.id == order_id)
+        .values(status=lines_status, reception_date=reception_date, updated_at=now)
+        .returning(PurchaseOrder.status)
+    )
+
+    return PurchaseOrderReceiveResult(
+        order_id=order_id,
+        status=status,
+        warehouse_id=warehouse_id,
+        lines=[
+            PurchaseOrderReceiveLineResult(
+                detail_id=row.id,
+                input_id=row.input_id,
+                received_delta=row.delta,
+                movement_id=movement_ids.get(row.id),
+            )
+            for row in sorted(updated, key=lambda row: row.id)
+        ]
+    )
+
+async def receive_purchase_order(
+    db: AsyncSession,
+    order_id: int,
+    receipt: PurchaseOrderReceive
+) -> PurchaseOrderReceiveResult:
+    """Recepción de una orden completa (todas sus líneas) en una transacción."""
+    try:
+        result = await _receive_order_lines(
+            db, order_id,
+            [(line.detail_id, line.received_quantity) for line in receipt.lines],
+            receipt.warehouse_id, receipt.reception_date, receipt.user_id
+        )
+        await db.commit()
+        return result
+    except HTTPException:
+        await db.rollback()
+        raise
+    except sqlalchemy.exc.IntegrityError as integrity_exc:
+        await db.rollback()
+        logging.error(f"Recepción de orden rechazada: {integrity_exc}")
+        raise HTTPException(status_code=409, detail="La recepción viola una restricción de inventario")
+    except sqlalchemy.exc.SQLAlchemyError as sql_exc:
+        await db.rollback()
+        logging.error(f"Error de base de datos al recibir la orden {order_id}: {sql_exc}")
+        raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(sql_exc)}")
+
 async def update_purchase_order_detail(
     db: AsyncSession, 
     detail_id: int, 
     detail: PurchaseOrderDetailUpdate
 ) -> Optional[PurchaseOrderDetail]:
+    """
+    Actualiza una línea. Un cambio de received_quantity se registra por el
+    mismo camino que la recepción de la orden completa.
+    """
     detail_data = detail.dict(exclude_unset=True)
-    if not detail_data:
-        # Get the detail
-        result = await db.execute(
-            select(PurchaseOrderDetail).where(PurchaseOrderDetail.id == detail_id)
-        )
-        return result.scalars().first()
-    
-    detail_data["updated_at"] = datetime.now()
-    await db.execute(
-        update(PurchaseOrderDetail)
-        .where(PurchaseOrderDetail.id == detail_id)
-        .values(**detail_data)
+    order_id = await db.scalar(
+        select(PurchaseOrderDetail.order_id).where(PurchaseOrderDetail.id == detail_id)
     )
-    await db.commit()
-    
-    # Get the detail
-    result = await db.execute(
-        select(PurchaseOrderDetail).where(PurchaseOrderDetail.id == detail_id)
-    )
-    detail = result.scalars().first()
-    
-    # Update order status
-    if detail:
-        # Get order details
-        order_details_result = await db.execute(
-            select(PurchaseOrderDetail).where(PurchaseOrderDetail.order_id == detail.order_id)
-        )
-        order_details = order_details_result.scalars().all()
-        
-        # Check if all items are received
-        all_received = all(d.received_quantity >= d.requested_quantity for d in order_details)
-        any_received = any(d.received_quantity > 0 for d in order_details)
-        
-        # Update order status
-        new_status = "completed" if all_received else "partially_received" if any_received else "pending"
-        
-        await db.execute(
-            update(PurchaseOrder)
-            .where(PurchaseOrder.id == detail.order_id)
-            .values(status=new_status, updated_at=datetime.now())
-        )
-        
-        # If receiving items, create inventory movement
-        if "received_quantity" in detail_data and detail_data["received_quantity"] > 0:
-            # Calculate the quantity being received now (delta)
-            previous_result = await db.execute(
-                select(PurchaseOrderDetail).where(PurchaseOrderDetail.id == detail_id)
+    if order_id is None:
+        return None
+
+    received_quantity = detail_data.pop("received_quantity", None)
+    try:
+        if detail_data:
+            detail_data["updated_at"] = datetime.now()
+            await db.execute(
+                update(PurchaseOrderDetail)
+                .where(PurchaseOrderDetail.id == detail_id)
+                .values(**detail_data)
+            )
+        if received_quantity is not None:
+            await _receive_order_lines(
+                db, order_id, [(detail_id, received_quantity)],
+                reception_date=detail_data.get("reception_date")
             )
-            previous_detail = previous_result.scalars().first()
-            received_delta = Decimal(detail_data["received_quantity"]) - previous_detail.received_quantity
-            
-            if received_delta > 0:
-                # Get input and warehouse for this order
-                order_result = await db.execute(
-                    select(PurchaseOrder).where(PurchaseOrder.id == detail.order_id)
-                )
-                order = order_result.scalars().first()
-                
-                # Get the default warehouse (first warehouse of type 'winery')
-                warehouse_result = await db.execute(
-                    select(Warehouse).where(Warehouse.type == "winery").limit(1)
-                )
-                warehouse = warehouse_result.scalars().first()
-                
-                if warehouse:
-                    # Create inventory movement
-                    movement = InventoryMovement(
-                        input_id=detail.input_id,
-                        warehouse_id=warehouse.id,
-                        movement_type="entry",
-                        quantity=received_delta,
-                        unit_price=detail.unit_price,
-                        user_id=order.user_id,
-                        comments=f"Recepción de orden de compra #{order.id}"
-                    )
-                    db.add(movement)
-                    
-                    # Update stock
-                    stock = await get_input_stock_by_input_warehouse(
-                        db, detail.input_id, warehouse.id
-                    )
-                    
-                    if stock:
-                        stock.available_quantity += received_delta
-                        stock.last_update = datetime.now()
-                    else:
-                        # Create new stock entry
-                        new_stock = InputStock(
-                            input_id=detail.input_id,
-                            warehouse_id=warehouse.id,
-                            available_quantity=received_delta
-                        )
-                        db.add(new_stock)
-        
         await db.commit()
-    
-    # Get the updated detail
+    except HTTPException:
+        await db.rollback()
+        raise
+    except sqlalchemy.exc.IntegrityError as integrity_exc:
+        await db.rollback()
+        logging.error(f"Actualización de la línea {detail_id} rechazada: {integrity_exc}")
+        raise HTTPException(status_code=409, detail="La actualización viola una restricción de inventario")
+    except sqlalchemy.exc.SQLAlchemyError as sql_exc:
+        await db.rollback()
+        logging.error(f"Error de base de datos al actualizar la línea {detail_id}: {sql_exc}")
+        raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(sql_exc)}")
+
     result = await db.execute(
         select(PurchaseOrderDetail).where(PurchaseOrderDetail.id == detail_id)
     )
@@ -866,7 +1544,6 @@ async def update_task_input(
         .where(TaskInput.id == task_input_id)
         .values(**task_input_data)
     )
-    await db.commit()
     
     # Handle inventory movement if status changes to "used"
     if (task_input.status == "used" and current_task_input.status != "used") and task_input.used_quantity:
@@ -876,22 +1553,27 @@ async def update_task_input(
             warehouse_id=current_task_input.warehouse_id if task_input.warehouse_id is None else task_input.warehouse_id,
             movement_type="exit",
             quantity=task_input.used_quantity,
+            unit_price=None,
             operation_id=current_task_input.operation_id,
-            comments=f"Insumos usados en operación #{current_task_input.operation_id}"
+            comments=f"Insumos usados en operación #{current_task_input.operation_id}",
+            movement_date=datetime.now()
         )
         db.add(movement)
         
-        # Update stock
+        # Update stock (same transaction as the status change)
         warehouse_id = current_task_input.warehouse_id if task_input.warehouse_id is None else task_input.warehouse_id
-        stock = await get_input_stock_by_input_warehouse(
-            db, current_task_input.input_id, warehouse_id
-        )
-        
-        if stock:
-            stock.available_quantity -= task_input.used_quantity
-            stock.last_update = datetime.now()
-            await db.commit()
+        try:
+            await apply_stock_delta(
+                db, current_task_input.input_id, warehouse_id,
+                movement_stock_delta("exit", task_input.used_quantity)
+            )
+            await db.flush()
+            await record_movement_valuation(db, [movement])
+        except HTTPException:
+            await db.rollback()
+            raise
     
+    await db.commit()
     return await get_task_input(db, task_input_id)
 
 async def delete_task_input(db: AsyncSession, task_input_id: int) -> bool:
@@ -900,63 +1582,3 @@ async def delete_task_input(db: AsyncSession, task_input_id: int) -> bool:
     )
     await db.commit()
     return result.rowcount > 0
-
-async def create_inventory_movement(
-    db: AsyncSession,
-    movement: InventoryMovementCreate
-):
-    try:
-        print(f"DEBUG: Movement data: {movement.dict()}")
-        db_movement = InventoryMovement(**movement.dict())
-        db.add(db_movement)
-
-        # Actualizar el stock disponible
-        stock = await db.execute(
-            select(InputStock).filter(
-                InputStock.input_id == movement.input_id,
-                InputStock.warehouse_id == movement.warehouse_id
-            )
-        )
-        stock = stock.scalar_one_or_none()
-        print(f"DEBUG: Stock found: {stock}") #Log de debug
-
-        if stock:
-            print(f"DEBUG: Stock available quantity before: {stock.available_quantity}")
-            print(f"DEBUG: Movement quantity: {movement.quantity}")
-            if movement.movement_type == 'entry':
-                stock.available_quantity += Decimal(str(movement.quantity))
-                print(f"DEBUG: Stock available quantity after entry: {stock.available_quantity}")
-            elif movement.movement_type == 'exit':
-                if stock.available_quantity < Decimal(str(movement.quantity)):
-                    raise HTTPException(status_code=400, detail="Cantidad insuficiente en stock")
-                stock.available_quantity -= Decimal(str(movement.quantity))
-                print(f"DEBUG: Stock available quantity after exit: {stock.available_quantity}")
-            else:
-                raise HTTPException(status_code=400, detail="Tipo de movimiento no valido")
-        else:
-            if movement.movement_type == "exit":
-                raise HTTPException(status_code=400, detail="No existe stock para el producto y almacen indicados")
-            new_stock = InputStock(
-                input_id=movement.input_id,
-                warehouse_id=movement.warehouse_id,
-                available_quantity= Decimal(str(movement.quantity)) #Convertimos a decimal.Decimal
-            )
-            db.add(new_stock)
-            print(f"DEBUG: New Stock Created: {new_stock}")
-
-        await db.commit()
-        await db.refresh(db_movement)
-        return db_movement
-    except HTTPException as http_exc:
-        await db.rollback()
-        print(f"DEBUG: HTTPException: {str(http_exc)}")
-        raise http_exc
-    except sqlalchemy.exc.SQLAlchemyError as sql_exc:
-        await db.rollback()
-        print(f"DEBUG: SQLAlchemyError: {str(sql_exc)}") #Log con el error especifico
-        raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(sql_exc)}")
-    except Exception as e:
-        await db.rollback()
-        print(f"DEBUG: Exception: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error inesperado: {str(e)}")
-    
\ No newline at end of file
@@ -0,0 +1,83 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import and_, or_, update, func
+from fastapi import HTTPException
+from typing import Dict, Iterable, Optional, Tuple
+from ..models import Operacion, TaskList
+import logging
+
+logger = logging.getLogger(__name__)
+
+# operaciones guarda task_list_id y task_type copiados de task_list para
+# filtrar por dominio (viñedo/bodega) con un predicado indexado en lugar de
+# unir por task_name, un texto libre. Toda escritura de una operación toma
+# los dos campos de resolve_task_columns; las filas anteriores a la columna
+# se completan con backfill_operaciones_task (python -m backend.backfill_operaciones_task).
+
+def task_type_condition(task_type: str):
+    """
+    Filtro de operaciones por task_type. Las filas que el backfill aún no
+    ha completado (task_type NULL) se resuelven uniendo por task_name como
+    antes de la desnormalización; cuando el backfill termina esa rama no
+    encuentra filas y el índice (task_type, fecha, id) la descarta.
+    """
+    return or_(
+        Operacion.task_type == task_type,
+        and_(
+            Operacion.task_type.is_(None),
+            Operacion.tipo_operacion.in_(select(TaskList.task_name).where(TaskList.task_type == task_type)),
+        ),
+    )
+
+async def resolve_task_columns(db: AsyncSession, tipo_operaciones: Iterable[str]) -> Dict[str, dict]:
+    """
+    task_list_id y task_type de cada tipo_operacion dado, en una consulta.
+    Responde 400 si alguno no existe en task_list.
+    """
+    names = set(tipo_operaciones)
+    if not names:
+        return {}
+    result = await db.execute(
+        select(TaskList.task_name, TaskList.task_list_id, TaskList.task_type)
+        .where(TaskList.task_name.in_(names))
+    )
+    columns = {
+        row.task_name: {"task_list_id": row.task_list_id, "task_type": row.task_type}
+        for row in result
+    }
+    missing = names - set(columns)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Tipos de operación no encontrados: {sorted(missing)}")
+    return columns
+
+async def backfill_operaciones_task(
+        db: AsyncSession,
+        after_id: int = 0,
+        chunk_size: int = 5000
+        ) -> Optional[Tuple[int, int]]:
+    """
+    Sincroniza task_list_id y task_type con task_list para las operaciones
+    con id en (after_id, after_id + chunk_size] y hace commit. Cada bloque es
+    una transacción corta que solo bloquea sus filas, y solo se escriben las
+    que difieren, así que se puede repetir sin coste. Devuelve (último id
+    del bloque, filas actualizadas) o None si no quedan operaciones.
+    """
+    max_id = await db.scalar(select(func.max(Operacion.id)))
+    if max_id is None or after_id >= max_id:
+        return None
+    upper = after_id + chunk_size
+    result = await db.execute(
+        update(Operacion)
+        .where(
+            Operacion.id > after_id,
+            Operacion.id <= upper,
+            Operacion.tipo_operacion == TaskList.task_name,
+            (Operacion.task_list_id.is_distinct_from(TaskList.task_list_id))
+            | (Operacion.task_type.is_distinct_from(TaskList.task_type)),
+        )
+        .values(task_list_id=TaskList.task_list_id, task_type=TaskList.task_type)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    logger.info(f"Operaciones {after_id + 1}..{upper}: {result.rowcount} actualizadas")
+    return min(upper, max_id), result.rowcount
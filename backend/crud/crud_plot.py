@@ -1,23 +1,174 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.sql import func
+from sqlalchemy import Float, LargeBinary, cast, or_
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased
 from geoalchemy2 import WKTElement
+from geoalchemy2.shape import to_shape
+from shapely import wkt as shapely_wkt
 from fastapi import HTTPException
-from typing import List
+from typing import List, Optional, Tuple
 from ..models import Plot, Grapevine
 from ..schemas.schemas_plot import PlotCreate, PlotUpdate, PlotResponse
+from .plot_tile_cache import tile_cache, TILE_EXTENT, TILE_BUFFER
+from .crud_plot_statistics import apply_plot_summary_delta
 import logging
-from shapely.geometry import shape
-from geoalchemy2.elements import WKTElement
-from geoalchemy2.shape import to_shape
-from shapely.wkt import dumps
 
 logger = logging.getLogger(__name__)
 
+# Circunferencia ecuatorial en metros de EPSG:3857
+WEB_MERCATOR_EQUATOR = 40075016.68557849
+
+# Niveles de geometría simplificada almacenados en Plot, de más a menos
+# simplificado: (tolerancia en grados, columna)
+SIMPLIFICATION_LEVELS = (
+    (0.001, Plot.plot_geom_low),
+    (0.0001, Plot.plot_geom_medium),
+    (0.00001, Plot.plot_geom_high),
+)
+
+# Alias para unir la tabla grapevines dos veces (variedad y portainjerto)
+Variety = aliased(Grapevine, name="variety")
+Rootstock = aliased(Grapevine, name="rootstock")
+
 ##Funciones para las parcelas
 
+def zoom_to_tolerance(zoom: int) -> float:
+    """Tamaño de un píxel (en grados) para teselas de 256 px en el nivel de zoom dado."""
+    return 360.0 / 256 / (2 ** zoom)
+
+def select_geometry_column(zoom: Optional[int] = None, tolerance: Optional[float] = None):
+    """
+    Elige la geometría almacenada más simplificada cuya tolerancia no supere
+    la pedida (o un píxel del zoom dado). Sin parámetros, la geometría completa.
+    """
+    if tolerance is None and zoom is not None:
+        tolerance = zoom_to_tolerance(zoom)
+    if tolerance is None:
+        return Plot.plot_geom
+    for level_tolerance, column in SIMPLIFICATION_LEVELS:
+        if level_tolerance <= tolerance:
+            return column
+    return Plot.plot_geom
+
+def _geometry_column(geometry_format: str = "wkt", geom_column=Plot.plot_geom):
+    """Expresión SQL que serializa la geometría en el formato pedido."""
+    if geometry_format == "geojson":
+        return func.ST_AsGeoJSON(geom_column).label("plot_geom")
+    return func.ST_AsText(geom_column).label("plot_geom")
+
+def plot_listing_query(geometry_format: str = "wkt", geom_column=Plot.plot_geom):
+    """
+    Consulta base de parcelas: columnas, geometría serializada y nombres
+    de variedad/portainjerto en una sola sentencia. geom_column permite
+    servir una de las variantes simplificadas en lugar de plot_geom.
+    """
+    return (
+        select(
+            Plot.plot_id,
+            Plot.plot_name,
+            Plot.plot_var,
+            Plot.plot_rootstock,
+            Plot.plot_implant_year,
+            Plot.plot_creation_year,
+            Plot.plot_conduction,
+            Plot.plot_management,
+            Plot.plot_description,
+            Plot.active,
+            Plot.plot_area,
+            _geometry_column(geometry_format, geom_column),
+            Variety.name.label("variety_name"),
+            Rootstock.name.label("rootstock_name"),
+        )
+        .outerjoin(Variety, Plot.plot_var == Variety.gv_id)
+        .outerjoin(Rootstock, Plot.plot_rootstock == Rootstock.gv_id)
+    )
+
+def plot_response_from_row(row) -> PlotResponse:
+    """Construye un PlotResponse a partir de una fila de plot_listing_query."""
+    return PlotResponse(
+        plot_id=row.plot_id,
+        plot_name=row.plot_name,
+        plot_var=row.plot_var,
+        plot_geom=row.plot_geom,
+        plot_area=float(row.plot_area) if row.plot_area else None,
+        variety_name=row.variety_name,
+        rootstock_name=row.rootstock_name,
+        plot_rootstock=row.plot_rootstock,
+        plot_implant_year=row.plot_implant_year,
+        plot_creation_year=row.plot_creation_year,
+        plot_conduction=row.plot_conduction,
+        plot_management=row.plot_management,
+        plot_description=row.plot_description,
+        active=row.active,
+    )
+
+def min_visible_area(zoom: int) -> float:
+    """
+    Área (m² en EPSG:3857, la misma unidad que plot_area) de un píxel de
+    256 px por tesela en el nivel de zoom dado.
+    """
+    meters_per_pixel = WEB_MERCATOR_EQUATOR / 256 / (2 ** zoom)
+    return meters_per_pixel ** 2
+
+def plot_filter_conditions(
+        active_only: bool = True,
+        plot_var: Optional[str] = None,
+        plot_management: Optional[str] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        zoom: Optional[int] = None
+        ) -> list:
+    """
+    Condiciones WHERE comunes al listado, las teselas y la exportación de parcelas.
+    bbox (minx, miny, maxx, maxy en EPSG:4326) se resuelve con ST_Intersects sobre
+    el índice GiST de plot_geom; zoom descarta parcelas menores que un píxel
+    (las que no tienen plot_area se mantienen).
+    """
+    conditions = []
+    if active_only:
+        conditions.append(Plot.active == True)
+    if plot_var is not None:
+        conditions.append(Plot.plot_var == plot_var)
+    if plot_management is not None:
+        conditions.append(Plot.plot_management == plot_management)
+    if bbox is not None:
+        # geoalchemy2 compila .intersects() como &&, que solo compara bbox;
+        # ST_Intersects usa el mismo índice y descarta los falsos positivos
+        conditions.append(
+            func.ST_Intersects(Plot.plot_geom, func.ST_MakeEnvelope(*bbox, 4326))
+        )
+    if zoom is not None:
+        # Sin plot_area no se sabe si la parcela es visible: se incluye
+        conditions.append(
+            or_(Plot.plot_area.is_(None), Plot.plot_area >= min_visible_area(zoom))
+        )
+    return conditions
+
+def _geom_bounds(geom) -> Optional[tuple]:
+    """bbox (minx, miny, maxx, maxy) de una geometría WKB/WKT sin consultar la base de datos."""
+    if geom is None:
+        return None
+    try:
+        if isinstance(geom, str):
+            return shapely_wkt.loads(geom).bounds
+        return to_shape(geom).bounds
+    except Exception as e:
+        logger.warning(f"No se pudo calcular el bbox de la geometría: {e}")
+        return None
+
+async def fetch_plot_response(
+        db: AsyncSession,
+        plot_id: int,
+        geometry_format: str = "wkt"
+        ) -> Optional[PlotResponse]:
+    """Obtiene una parcela ya serializada con una única consulta."""
+    result = await db.execute(
+        plot_listing_query(geometry_format).where(Plot.plot_id == plot_id)
+    )
+    row = result.first()
+    return plot_response_from_row(row) if row else None
+
 async def validate_grapevine(db: AsyncSession, grapevine_id: str) -> bool:
     """Valida que una variedad/portainjerto existe en la base de datos."""
     result = await db.execute(
@@ -57,16 +208,15 @@ async def create_plot(db: AsyncSession, plot: PlotCreate) -> PlotResponse:
         )
 
         db.add(db_plot)
+        await db.flush()
+        await apply_plot_summary_delta(db, [db_plot.plot_id], 1)
         await db.commit()
-        await db.refresh(db_plot)
-
-        # Convertir WKTElement a WKT
-        if db_plot.plot_geom:
-            shape = to_shape(db_plot.plot_geom)
-            db_plot.plot_geom = dumps(shape)
+        tile_cache.invalidate_bounds(_geom_bounds(plot.plot_geom))
 
-        return PlotResponse.from_orm(db_plot)
+        return await fetch_plot_response(db, db_plot.plot_id)
 
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
         await db.rollback()
         logger.error(f"Error en la base de datos: {e}")
@@ -75,46 +225,38 @@ async def create_plot(db: AsyncSession, plot: PlotCreate) -> PlotResponse:
         logger.error(f"Error inesperado: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
-async def get_plots(db: AsyncSession, active_only: bool = True) -> List[PlotResponse]:
+async def get_plots(
+        db: AsyncSession,
+        active_only: bool = True,
+        geometry_format: str = "wkt",
+        plot_var: Optional[str] = None,
+        plot_management: Optional[str] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        zoom: Optional[int] = None,
+        tolerance: Optional[float] = None
+        ) -> List[PlotResponse]:
     """
     Obtiene todas las parcelas con información relacionada.
+    La geometría y los nombres de variedad/portainjerto se resuelven en la
+    misma consulta, por lo que el coste no crece en round trips por parcela.
     Args:
         active_only: Si True, solo devuelve parcelas activas
+        geometry_format: 'wkt' o 'geojson'
+        plot_var: Filtra por variedad
+        plot_management: Filtra por tipo de manejo
+        bbox: Ventana visible (minx, miny, maxx, maxy) en EPSG:4326
+        zoom: Nivel de zoom del mapa; omite parcelas menores que un píxel
+            y elige la geometría simplificada adecuada
+        tolerance: Tolerancia de simplificación en grados (prevalece sobre zoom)
     """
     try:
-        query = select(Plot).options(
-            joinedload(Plot.plot_var_relationship),
-            joinedload(Plot.plot_rootstock_relationship)
+        geom_column = select_geometry_column(zoom, tolerance)
+        query = plot_listing_query(geometry_format, geom_column).where(
+            *plot_filter_conditions(active_only, plot_var, plot_management, bbox, zoom)
         )
-        
-        if active_only:
-            query = query.where(Plot.active == True)
-
-        result = await db.execute(query)
-        plots = result.unique().scalars().all()
-
-        plot_responses = []
-        for plot in plots:
-            geom_wkt = await db.scalar(func.ST_AsText(plot.plot_geom))
-            plot_responses.append(
-                PlotResponse(
-                    plot_id=plot.plot_id,
-                    plot_name=plot.plot_name,
-                    plot_var=plot.plot_var,
-                    plot_geom=geom_wkt,
-                    plot_area=float(plot.plot_area) if plot.plot_area else None,
-                    variety_name=plot.plot_var_relationship.name if plot.plot_var_relationship else None,
-                    rootstock_name=plot.plot_rootstock_relationship.name if plot.plot_rootstock_relationship else None,
-                    plot_rootstock=plot.plot_rootstock,
-                    plot_implant_year=plot.plot_implant_year,
-                    plot_creation_year=plot.plot_creation_year,
-                    plot_conduction=plot.plot_conduction,
-                    plot_management=plot.plot_management,
-                    plot_description=plot.plot_description,
-                    active=plot.active,
-                )
-            )
-        return plot_responses
+
+        result = await db.execute(query.order_by(Plot.plot_id))
+        return [plot_response_from_row(row) for row in result]
 
     except SQLAlchemyError as e:
         logger.error(f"Error al obtener parcelas: {e}")
@@ -122,7 +264,8 @@ async def get_plots(db: AsyncSession, active_only: bool = True) -> List[PlotResp
 
 async def get_plot(
         db: AsyncSession,
-        plot_id: int
+        plot_id: int,
+        geometry_format: str = "wkt"
         ) -> PlotResponse:
     """
     Obtiene una parcela específica por ID.
@@ -130,40 +273,23 @@ async def get_plot(
         HTTPException: Si la parcela no existe
     """
     try:
-        result = await db.execute(
-            select(Plot)
-            .options(
-                joinedload(Plot.plot_var_relationship),
-                joinedload(Plot.plot_rootstock_relationship)
-            )
-            .where(Plot.plot_id == plot_id)
-        )
-        plot = result.unique().scalar_one_or_none()
-        
+        plot = await fetch_plot_response(db, plot_id, geometry_format)
         if not plot:
             raise HTTPException(status_code=404, detail="Parcela no encontrada")
-
-        geom_wkt = await db.scalar(func.ST_AsText(plot.plot_geom))
-        
-        return PlotResponse(
-            plot_id=plot.plot_id,
-            plot_name=plot.plot_name,
-            plot_geom=geom_wkt,
-            plot_area=float(plot.plot_area) if plot.plot_area else None,
-            plot_var=plot.plot_var,
-            plot_rootstock=plot.plot_rootstock,
-            plot_implant_year=plot.plot_implant_year,
-            plot_creation_year=plot.plot_creation_year,
-            plot_conduction=plot.plot_conduction,
-            plot_management=plot.plot_management,
-            plot_description=plot.plot_description,
-            active=plot.active,
-        )
+        return plot
 
     except SQLAlchemyError as e:
         logger.error(f"Error al obtener parcela {plot_id}: {e}")
         raise HTTPException(status_code=500, detail="Error al obtener la parcela")
 
+async def lock_plot(db: AsyncSession, plot_id: int) -> Optional[Plot]:
+    """
+    Carga la parcela con SELECT ... FOR UPDATE. Quien resta su contribución
+    al resumen debe tener la fila bloqueada: dos ediciones concurrentes
+    leerían el mismo estado anterior y lo restarían dos veces.
+    """
+    return await db.get(Plot, plot_id, with_for_update=True, populate_existing=True)
+
 async def update_plot(db: AsyncSession, plot_id: int, plot_update: PlotUpdate) -> PlotResponse:
     """
     Actualiza una parcela existente.
@@ -171,17 +297,17 @@ async def update_plot(db: AsyncSession, plot_id: int, plot_update: PlotUpdate) -
         HTTPException: Si la parcela no existe o hay errores de validación
     """
     try:
-        plot = await db.get(Plot, plot_id)
+        plot = await lock_plot(db, plot_id)
         if not plot:
             raise HTTPException(status_code=404, detail="Parcela no encontrada")
 
         update_data = plot_update.dict(exclude_unset=True)
-        
+
         # Validar variedad y portainjerto si se están actualizando
         if 'plot_var' in update_data:
             if not await validate_grapevine(db, update_data['plot_var']):
                 raise HTTPException(status_code=400, detail="Variedad no encontrada")
-                
+
         if 'plot_rootstock' in update_data:
             if update_data['plot_rootstock'] and not await validate_grapevine(db, update_data['plot_rootstock']):
                 raise HTTPException(status_code=400, detail="Portainjerto no encontrado")
@@ -194,28 +320,17 @@ async def update_plot(db: AsyncSession, plot_id: int, plot_update: PlotUpdate) -
                 logger.error(f"Error al procesar geometría: {e}")
                 raise HTTPException(status_code=400, detail="Geometría inválida")
 
+        old_bounds = _geom_bounds(plot.plot_geom)
+        await apply_plot_summary_delta(db, [plot_id], -1)
         for key, value in update_data.items():
             setattr(plot, key, value)
 
+        await db.flush()
+        await apply_plot_summary_delta(db, [plot_id], 1)
         await db.commit()
-        await db.refresh(plot)
+        tile_cache.invalidate_bounds(old_bounds, _geom_bounds(update_data.get('plot_geom')))
 
-        geom_wkt = await db.scalar(func.ST_AsText(plot.plot_geom))
-        
-        return PlotResponse(
-            plot_id=plot.plot_id,
-            plot_name=plot.plot_name,
-            plot_geom=geom_wkt,
-            plot_area=float(plot.plot_area) if plot.plot_area else None,
-            plot_var=plot.plot_var,
-            plot_rootstock=plot.plot_rootstock,
-            plot_implant_year=plot.plot_implant_year,
-            plot_creation_year=plot.plot_creation_year,
-            plot_conduction=plot.plot_conduction,
-            plot_management=plot.plot_management,
-            plot_description=plot.plot_description,
-            active=plot.active,
-        )
+        return await fetch_plot_response(db, plot_id)
 
     except SQLAlchemyError as e:
         await db.rollback()
@@ -231,13 +346,16 @@ async def delete_plot_permanent(db: AsyncSession, plot_id: int) -> bool:
         HTTPException: Si la parcela no existe
     """
     try:
-        plot = await db.get(Plot, plot_id)
+        plot = await lock_plot(db, plot_id)
         if not plot:
             raise HTTPException(status_code=404, detail="Parcela no encontrada")
 
         # Borrado físico de la base de datos
+        old_bounds = _geom_bounds(plot.plot_geom)
+        await apply_plot_summary_delta(db, [plot_id], -1)
         await db.delete(plot)
         await db.commit()
+        tile_cache.invalidate_bounds(old_bounds)
         return True
 
     except SQLAlchemyError as e:
@@ -254,242 +372,77 @@ async def archive_plot(db: AsyncSession, plot_id: int) -> PlotResponse:
         HTTPException: Si la parcela no existe
     """
     try:
-        plot = await db.get(Plot, plot_id)
+        plot = await lock_plot(db, plot_id)
         if not plot:
             raise HTTPException(status_code=404, detail="Parcela no encontrada")
 
-        # Cambiar estado a inactivo
+        # Cambiar estado a inactivo (las parcelas inactivas salen del resumen)
+        await apply_plot_summary_delta(db, [plot_id], -1)
         plot.active = False
         await db.commit()
-        await db.refresh(plot)
+        tile_cache.invalidate_bounds(_geom_bounds(plot.plot_geom))
 
-        # Obtener geometría en formato WKT para la respuesta
-        geom_wkt = await db.scalar(func.ST_AsText(plot.plot_geom))
-        
-        return PlotResponse(
-            plot_id=plot.plot_id,
-            plot_name=plot.plot_name,
-            plot_geom=geom_wkt,
-            plot_area=float(plot.plot_area) if plot.plot_area else None,
-            plot_var=plot.plot_var,
-            plot_rootstock=plot.plot_rootstock,
-            plot_implant_year=plot.plot_implant_year,
-            plot_creation_year=plot.plot_creation_year,
-            plot_conduction=plot.plot_conduction,
-            plot_management=plot.plot_management,
-            plot_description=plot.plot_description,
-            active=plot.active,
-        )
+        return await fetch_plot_response(db, plot_id)
 
     except SQLAlchemyError as e:
         await db.rollback()
         logger.error(f"Error al archivar parcela {plot_id}: {e}")
         raise HTTPException(status_code=500, detail="Error al archivar la parcela")
 
-async def get_plots(db: AsyncSession, active_only: bool = True) -> List[PlotResponse]:
-    """
-    Obtiene todas las parcelas con información relacionada.
-    Args:
-        active_only: Si True, solo devuelve parcelas activas
-    """
-    try:
-        query = select(Plot).options(
-            joinedload(Plot.plot_var_relationship),
-            joinedload(Plot.plot_rootstock_relationship)
-        )
-        
-        if active_only:
-            query = query.where(Plot.active == True)
-
-        result = await db.execute(query)
-        plots = result.unique().scalars().all()
-
-        plot_responses = []
-        for plot in plots:
-            geom_wkt = await db.scalar(func.ST_AsText(plot.plot_geom))
-            plot_responses.append(
-                PlotResponse(
-                    plot_id=plot.plot_id,
-                    plot_name=plot.plot_name,
-                    plot_var=plot.plot_var,
-                    plot_geom=geom_wkt,
-                    plot_area=float(plot.plot_area) if plot.plot_area else None,
-                    variety_name=plot.plot_var_relationship.name if plot.plot_var_relationship else None,
-                    rootstock_name=plot.plot_rootstock_relationship.name if plot.plot_rootstock_relationship else None,
-                    plot_rootstock=plot.plot_rootstock,
-                    plot_implant_year=plot.plot_implant_year,
-                    plot_creation_year=plot.plot_creation_year,
-                    plot_conduction=plot.plot_conduction,
-                    plot_management=plot.plot_management,
-                    plot_description=plot.plot_description,
-                    active=plot.active,
-                )
-            )
-        return plot_responses
-
-    except SQLAlchemyError as e:
-        logger.error(f"Error al obtener parcelas: {e}")
-        raise HTTPException(status_code=500, detail="Error al obtener las parcelas")
-
-async def get_plot(db: AsyncSession, plot_id: int) -> PlotResponse:
+async def get_plot_tile(
+        db: AsyncSession,
+        z: int,
+        x: int,
+        y: int,
+        active_only: bool = True,
+        plot_var: Optional[str] = None,
+        plot_management: Optional[str] = None
+        ) -> bytes:
     """
-    Obtiene una parcela específica por ID.
-    Raises:
-        HTTPException: Si la parcela no existe
+    Genera (o sirve desde caché) una tesela Mapbox Vector Tile con las
+    parcelas que intersectan la tesela z/x/y, usando ST_AsMVT/ST_AsMVTGeom.
     """
+    filters = (active_only, plot_var, plot_management)
+    cached = tile_cache.get(z, x, y, filters)
+    if cached is not None:
+        return cached
+
+    # Antes de la consulta: si una edición invalida la caché mientras se
+    # genera, esta tesela puede venir de la instantánea anterior
+    generation = tile_cache.generation
     try:
-        result = await db.execute(
-            select(Plot)
-            .options(
-                joinedload(Plot.plot_var_relationship),
-                joinedload(Plot.plot_rootstock_relationship)
+        envelope = func.ST_TileEnvelope(z, x, y)
+        geom_column = select_geometry_column(zoom=z)
+        features = (
+            select(
+                func.ST_AsMVTGeom(
+                    func.ST_Transform(geom_column, 3857),
+                    envelope,
+                    TILE_EXTENT,
+                    TILE_BUFFER,
+                    True
+                ).label("geom"),
+                Plot.plot_id,
+                Plot.plot_name,
+                Plot.plot_var,
+                Plot.plot_rootstock,
+                Plot.plot_conduction,
+                Plot.plot_management,
+                Plot.active,
+                cast(Plot.plot_area, Float).label("plot_area"),
             )
-            .where(Plot.plot_id == plot_id)
-        )
-        plot = result.unique().scalar_one_or_none()
-        
-        if not plot:
-            raise HTTPException(status_code=404, detail="Parcela no encontrada")
-
-        geom_wkt = await db.scalar(func.ST_AsText(plot.plot_geom))
-        
-        return PlotResponse(
-            plot_id=plot.plot_id,
-            plot_name=plot.plot_name,
-            plot_geom=geom_wkt,
-            plot_area=float(plot.plot_area) if plot.plot_area else None,
-            plot_var=plot.plot_var,
-            plot_rootstock=plot.plot_rootstock,
-            plot_implant_year=plot.plot_implant_year,
-            plot_creation_year=plot.plot_creation_year,
-            plot_conduction=plot.plot_conduction,
-            plot_management=plot.plot_management,
-            plot_description=plot.plot_description,
-            active=plot.active,
+            .where(Plot.plot_geom.intersects(func.ST_Transform(envelope, 4326)))
+            .where(*plot_filter_conditions(active_only, plot_var, plot_management))
+            .subquery("plots")
         )
-
-    except SQLAlchemyError as e:
-        logger.error(f"Error al obtener parcela {plot_id}: {e}")
-        raise HTTPException(status_code=500, detail="Error al obtener la parcela")
-
-async def update_plot(db: AsyncSession, plot_id: int, plot_update: PlotUpdate) -> PlotResponse:
-    """
-    Actualiza una parcela existente.
-    Raises:
-        HTTPException: Si la parcela no existe o hay errores de validación
-    """
-    try:
-        plot = await db.get(Plot, plot_id)
-        if not plot:
-            raise HTTPException(status_code=404, detail="Parcela no encontrada")
-
-        update_data = plot_update.dict(exclude_unset=True)
-        
-        # Validar variedad y portainjerto si se están actualizando
-        if 'plot_var' in update_data:
-            if not await validate_grapevine(db, update_data['plot_var']):
-                raise HTTPException(status_code=400, detail="Variedad no encontrada")
-                
-        if 'plot_rootstock' in update_data:
-            if update_data['plot_rootstock'] and not await validate_grapevine(db, update_data['plot_rootstock']):
-                raise HTTPException(status_code=400, detail="Portainjerto no encontrado")
-
-        # Manejar la geometría separadamente
-        if 'plot_geom' in update_data:
-            try:
-                update_data['plot_geom'] = WKTElement(update_data['plot_geom'], srid=4326)
-            except Exception as e:
-                logger.error(f"Error al procesar geometría: {e}")
-                raise HTTPException(status_code=400, detail="Geometría inválida")
-
-        for key, value in update_data.items():
-            setattr(plot, key, value)
-
-        await db.commit()
-        await db.refresh(plot)
-
-        geom_wkt = await db.scalar(func.ST_AsText(plot.plot_geom))
-        
-        return PlotResponse(
-            plot_id=plot.plot_id,
-            plot_name=plot.plot_name,
-            plot_geom=geom_wkt,
-            plot_area=float(plot.plot_area) if plot.plot_area else None,
-            plot_var=plot.plot_var,
-            plot_rootstock=plot.plot_rootstock,
-            plot_implant_year=plot.plot_implant_year,
-            plot_creation_year=plot.plot_creation_year,
-            plot_conduction=plot.plot_conduction,
-            plot_management=plot.plot_management,
-            plot_description=plot.plot_description,
-            active=plot.active,
+        query = select(
+            func.ST_AsMVT(features.table_valued(), "plots", TILE_EXTENT, "geom", type_=LargeBinary)
         )
+        tile = bytes(await db.scalar(query) or b"")
 
     except SQLAlchemyError as e:
-        await db.rollback()
-        logger.error(f"Error al actualizar parcela {plot_id}: {e}")
-        raise HTTPException(status_code=500, detail="Error al actualizar la parcela")
+        logger.error(f"Error al generar tesela {z}/{x}/{y}: {e}")
+        raise HTTPException(status_code=500, detail="Error al generar la tesela")
 
-async def delete_plot_permanent(db: AsyncSession, plot_id: int) -> bool:
-    """
-    Elimina permanentemente una parcela de la base de datos.
-    Returns:
-        bool: True si se eliminó correctamente
-    Raises:
-        HTTPException: Si la parcela no existe
-    """
-    try:
-        plot = await db.get(Plot, plot_id)
-        if not plot:
-            raise HTTPException(status_code=404, detail="Parcela no encontrada")
-
-        # Borrado físico de la base de datos
-        await db.delete(plot)
-        await db.commit()
-        return True
-
-    except SQLAlchemyError as e:
-        await db.rollback()
-        logger.error(f"Error al eliminar permanentemente parcela {plot_id}: {e}")
-        raise HTTPException(status_code=500, detail="Error al eliminar la parcela")
-
-async def archive_plot(db: AsyncSession, plot_id: int) -> PlotResponse:
-    """
-    Archiva una parcela cambiando su estado a inactivo.
-    Returns:
-        PlotResponse: La parcela actualizada
-    Raises:
-        HTTPException: Si la parcela no existe
-    """
-    try:
-        plot = await db.get(Plot, plot_id)
-        if not plot:
-            raise HTTPException(status_code=404, detail="Parcela no encontrada")
-
-        # Cambiar estado a inactivo
-        plot.active = False
-        await db.commit()
-        await db.refresh(plot)
-
-        # Obtener geometría en formato WKT para la respuesta
-        geom_wkt = await db.scalar(func.ST_AsText(plot.plot_geom))
-        
-        return PlotResponse(
-            plot_id=plot.plot_id,
-            plot_name=plot.plot_name,
-            plot_geom=geom_wkt,
-            plot_area=float(plot.plot_area) if plot.plot_area else None,
-            plot_var=plot.plot_var,
-            plot_rootstock=plot.plot_rootstock,
-            plot_implant_year=plot.plot_implant_year,
-            plot_creation_year=plot.plot_creation_year,
-            plot_conduction=plot.plot_conduction,
-            plot_management=plot.plot_management,
-            plot_description=plot.plot_description,
-            active=plot.active,
-        )
-
-    except SQLAlchemyError as e:
-        await db.rollback()
-        logger.error(f"Error al archivar parcela {plot_id}: {e}")
-        raise HTTPException(status_code=500, detail="Error al archivar la parcela")
+    tile_cache.set(z, x, y, filters, tile, generation)
+    return tile
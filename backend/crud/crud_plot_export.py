@@ -0,0 +1,122 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.sql import func
+from sqlalchemy import Float, LargeBinary, cast
+from typing import AsyncIterator, Optional, Tuple
+import csv
+import io
+import json
+from ..models import Plot
+from .crud_plot import plot_listing_query, plot_filter_conditions, select_geometry_column, Variety, Rootstock
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Formato -> (media type, extensión)
+EXPORT_FORMATS = {
+    "geojsonseq": ("application/geo+json-seq", "geojsons"),
+    "csv": ("text/csv", "csv"),
+    "flatgeobuf": ("application/flatgeobuf", "fgb"),
+}
+
+# Filas leídas del cursor de servidor por cada bloque enviado al cliente
+EXPORT_CHUNK_SIZE = 500
+
+EXPORT_PROPERTIES = (
+    "plot_id", "plot_name", "plot_var", "variety_name", "plot_rootstock", "rootstock_name",
+    "plot_implant_year", "plot_creation_year", "plot_conduction", "plot_management",
+    "plot_description", "active", "plot_area",
+)
+
+def _properties(row) -> dict:
+    properties = {name: getattr(row, name) for name in EXPORT_PROPERTIES}
+    if properties["plot_area"] is not None:
+        properties["plot_area"] = float(properties["plot_area"])
+    return properties
+
+async def _stream_rows(db: AsyncSession, query) -> AsyncIterator[list]:
+    """Recorre la consulta con un cursor de servidor, un bloque de filas por vez."""
+    result = await db.stream(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    async for partition in result.partitions():
+        yield partition
+
+async def _geojsonseq(db: AsyncSession, query) -> AsyncIterator[bytes]:
+    # RFC 8142: cada Feature precedido por RS (0x1E) y terminado en salto de línea
+    async for rows in _stream_rows(db, query):
+        yield "".join(
+            f'\x1e{{"type":"Feature","geometry":{row.plot_geom or "null"},'
+            f'"properties":{json.dumps(_properties(row), ensure_ascii=False)}}}\n'
+            for row in rows
+        ).encode("utf-8")
+
+async def _csv(db: AsyncSession, query) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_PROPERTIES + ("wkt",))
+    async for rows in _stream_rows(db, query):
+        for row in rows:
+            properties = _properties(row)
+            writer.writerow([properties[name] for name in EXPORT_PROPERTIES] + [row.plot_geom])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+async def _flatgeobuf(db: AsyncSession, conditions: list, geom_column) -> AsyncIterator[bytes]:
+    # ST_AsFlatGeobuf es un agregado: PostGIS arma el archivo completo
+    features = (
+        select(
+            geom_column.label("geom"),
+            Plot.plot_id,
+            Plot.plot_name,
+            Plot.plot_var,
+            Variety.name.label("variety_name"),
+            Plot.plot_rootstock,
+            Rootstock.name.label("rootstock_name"),
+            Plot.plot_implant_year,
+            Plot.plot_creation_year,
+            Plot.plot_conduction,
+            Plot.plot_management,
+            Plot.plot_description,
+            Plot.active,
+            cast(Plot.plot_area, Float).label("plot_area"),
+        )
+        .outerjoin(Variety, Plot.plot_var == Variety.gv_id)
+        .outerjoin(Rootstock, Plot.plot_rootstock == Rootstock.gv_id)
+        .where(*conditions)
+        .where(Plot.plot_geom.isnot(None))
+        .order_by(Plot.plot_id)
+        .subquery("plots")
+    )
+    data = await db.scalar(
+        select(func.ST_AsFlatGeobuf(features.table_valued(), False, "geom", type_=LargeBinary))
+    )
+    yield bytes(data or b"")
+
+def stream_plots_export(
+        db: AsyncSession,
+        export_format: str,
+        active_only: bool = True,
+        plot_var: Optional[str] = None,
+        plot_management: Optional[str] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        zoom: Optional[int] = None,
+        tolerance: Optional[float] = None
+        ) -> AsyncIterator[bytes]:
+    """
+    Genera la exportación de parcelas por bloques con los mismos filtros que
+    el listado. GeoJSON sequence y CSV leen de un cursor de servidor, así que
+    la memoria no depende del número de parcelas.
+    """
+    conditions = plot_filter_conditions(active_only, plot_var, plot_management, bbox, zoom)
+    geom_column = select_geometry_column(zoom, tolerance)
+
+    if export_format == "flatgeobuf":
+        return _flatgeobuf(db, conditions, geom_column)
+
+    geometry_format = "geojson" if export_format == "geojsonseq" else "wkt"
+    query = plot_listing_query(geometry_format, geom_column).where(*conditions).order_by(Plot.plot_id)
+    if export_format == "geojsonseq":
+        return _geojsonseq(db, query)
+    return _csv(db, query)
@@ -0,0 +1,474 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from geoalchemy2 import WKTElement
+from fastapi import HTTPException
+from pydantic import ValidationError
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Iterator, List, Optional, Tuple, Union
+from xml.etree import ElementTree
+import asyncio
+import codecs
+import json
+import os
+import zipfile
+import shapely
+from shapely.geometry import shape
+from shapely.validation import explain_validity
+from ..models import Plot, Grapevine, Vineyard
+from ..schemas.schemas_plot import PlotCreate, PlotImportFeatureResult, PlotImportResult
+from .plot_tile_cache import tile_cache
+from .crud_plot_statistics import apply_plot_summary_delta
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("geojson", "kml", "shapefile")
+IMPORT_BATCH_SIZE = 500
+
+# Tamaño de bloque al leer GeoJSON
+GEOJSON_CHUNK_SIZE = 64 * 1024
+
+# Prefijo que se inspecciona para distinguir un documento de una secuencia
+GEOJSON_SNIFF_SIZE = 4096
+
+# Separador de registros de RFC 8142 / RFC 7464
+RECORD_SEPARATOR = b"\x1e"
+
+# Pool para validar geometrías fuera del event loop (shapely libera el GIL)
+_geometry_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 2)
+
+Feature = Tuple[dict, Optional[dict]]
+
+class FeatureReadError:
+    """
+    Feature que no se pudo leer. Los lectores la emiten en su posición para
+    que la importación la informe como error y siga con las demás.
+    """
+    __slots__ = ("message",)
+
+    def __init__(self, message: str):
+        self.message = message
+
+ReadFeature = Union[Feature, FeatureReadError]
+
+# ==================== Lectores de formatos ====================
+
+class _JsonStream:
+    """
+    Lector incremental de JSON sobre un flujo binario: decodifica un valor
+    cada vez con JSONDecoder.raw_decode y solo retiene en memoria el valor
+    en curso y un bloque de lectura.
+    """
+
+    def __init__(self, source: IO[bytes]):
+        self._source = source
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._source.read(GEOJSON_CHUNK_SIZE)
+        self._eof = not chunk
+        self._buffer = self._buffer[self._pos:] + self._text.decode(chunk, final=self._eof)
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Siguiente carácter significativo sin consumirlo ('' al final del flujo)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n\x1e":
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Se esperaba '{char}'")
+        self._pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # Un número al final del bloque puede seguir en el siguiente
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+def _iter_geojson_document(source: IO[bytes]) -> Iterator:
+    """
+    Recorre un documento GeoJSON emitiendo uno a uno los elementos de
+    "features" a medida que se leen. El resto de claves del objeto raíz se
+    conservan; si no es un FeatureCollection se emite el propio documento.
+    Varios objetos raíz seguidos (una secuencia sin líneas) se leen igual.
+    """
+    stream = _JsonStream(source)
+    while stream.peek():
+        stream.expect("{")
+        document = {}
+        first = True
+        while stream.peek() != "}":
+            if not first:
+                stream.expect(",")
+            first = False
+            key = stream.value()
+            if not isinstance(key, str):
+                raise ValueError("Clave no válida en el objeto raíz")
+            stream.expect(":")
+            if key != "features" or stream.peek() != "[":
+                document[key] = stream.value()
+                continue
+            stream.expect("[")
+            first_feature = True
+            while stream.peek() != "]":
+                if not first_feature:
+                    stream.expect(",")
+                first_feature = False
+                yield stream.value()
+            stream.expect("]")
+        stream.expect("}")
+        if document.get("type") != "FeatureCollection":
+            yield document
+
+def _iter_records(source: IO[bytes], separator: bytes) -> Iterator[bytes]:
+    """Registros de una secuencia separados por `separator`, leídos por bloques."""
+    pending = b""
+    while True:
+        chunk = source.read(GEOJSON_CHUNK_SIZE)
+        if not chunk:
+            break
+        *records, pending = (pending + chunk).split(separator)
+        yield from records
+    yield pending
+
+def _geojson_feature(value) -> ReadFeature:
+    """Comprueba la forma de un Feature decodificado."""
+    if not isinstance(value, dict):
+        return FeatureReadError(f"Se esperaba un objeto Feature y se recibió {type(value).__name__}")
+    properties = value.get("properties") or {}
+    geometry = value.get("geometry")
+    if not isinstance(properties, dict):
+        return FeatureReadError("properties debe ser un objeto")
+    if geometry is not None and not isinstance(geometry, dict):
+        return FeatureReadError("geometry debe ser un objeto")
+    return properties, geometry
+
+def _is_geojson_sequence(head: bytes) -> bool:
+    """
+    Una secuencia empieza por el separador RS o tiene un Feature completo
+    en la primera línea. Solo se inspecciona el prefijo leído, así que un
+    FeatureCollection minificado (una sola línea) no se decodifica aquí.
+    """
+    head = head.lstrip()
+    if head.startswith(RECORD_SEPARATOR):
+        return True
+    first_line, newline, _ = head.partition(b"\n")
+    if not newline:
+        return False
+    try:
+        first = json.loads(first_line)
+    except ValueError:
+        return False
+    return isinstance(first, dict) and first.get("type") == "Feature"
+
+def iter_geojson_features(source: IO[bytes]) -> Iterator[ReadFeature]:
+    """
+    Lee un FeatureCollection/Feature GeoJSON o una secuencia GeoJSON
+    (RFC 8142 o un Feature por línea). Las secuencias se leen registro a
+    registro y los FeatureCollection feature a feature, sin cargar el
+    documento. Un registro ilegible se emite como FeatureReadError y la
+    lectura sigue; un documento truncado o mal formado termina la lectura
+    con un FeatureReadError tras los features ya leídos.
+    """
+    head = source.read(GEOJSON_SNIFF_SIZE)
+    source.seek(0)
+
+    if not _is_geojson_sequence(head):
+        try:
+            for value in _iter_geojson_document(source):
+                yield _geojson_feature(value)
+        except ValueError as e:
+            yield FeatureReadError(f"GeoJSON mal formado, lectura detenida: {e}")
+        return
+
+    separator = RECORD_SEPARATOR if head.lstrip().startswith(RECORD_SEPARATOR) else b"\n"
+    for record in _iter_records(source, separator):
+        record = record.strip().lstrip(RECORD_SEPARATOR)
+        if not record:
+            continue
+        try:
+            value = json.loads(record)
+        except ValueError as e:
+            yield FeatureReadError(f"JSON mal formado: {e}")
+            continue
+        yield _geojson_feature(value)
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def _kml_ring(element) -> List[List[float]]:
+    coordinates = next((c for c in element.iter() if _local(c.tag) == "coordinates"), None)
+    if coordinates is None or not coordinates.text:
+        return []
+    return [[float(v) for v in point.split(",")[:2]] for point in coordinates.text.split()]
+
+def iter_kml_features(source: IO[bytes]) -> Iterator[Feature]:
+    """Lee los Placemark de un KML con iterparse, sin cargar el documento entero."""
+    for _, element in ElementTree.iterparse(source, events=("end",)):
+        if _local(element.tag) != "Placemark":
+            continue
+        properties = {}
+        geometry = None
+        for child in element.iter():
+            tag = _local(child.tag)
+            if tag == "name" and "plot_name" not in properties:
+                properties["plot_name"] = (child.text or "").strip()
+            elif tag == "Data" and child.get("name"):
+                value = next((v.text for v in child if _local(v.tag) == "value"), None)
+                properties[child.get("name")] = value
+            elif tag == "SimpleData" and child.get("name"):
+                properties[child.get("name")] = child.text
+            elif tag == "Polygon" and geometry is None:
+                rings = []
+                for boundary in child:
+                    if _local(boundary.tag) in ("outerBoundaryIs", "innerBoundaryIs"):
+                        ring = _kml_ring(boundary)
+                        if _local(boundary.tag) == "outerBoundaryIs":
+                            rings.insert(0, ring)
+                        else:
+                            rings.append(ring)
+                geometry = {"type": "Polygon", "coordinates": rings}
+        yield properties, geometry
+        element.clear()
+
+def iter_shapefile_features(source: IO[bytes]) -> Iterator[Feature]:
+    """Lee un Shapefile comprimido en .zip (requiere el paquete opcional pyshp)."""
+    try:
+        import shapefile
+    except ImportError:
+        raise HTTPException(status_code=400, detail="Importar Shapefile requiere el paquete 'pyshp'")
+
+    with zipfile.ZipFile(source) as archive:
+        members = {os.path.splitext(name)[1].lower(): name for name in archive.namelist()}
+        if ".shp" not in members or ".dbf" not in members:
+            raise HTTPException(status_code=400, detail="El .zip debe contener los archivos .shp y .dbf")
+        reader = shapefile.Reader(
+            shp=archive.open(members[".shp"]),
+            dbf=archive.open(members[".dbf"]),
+            shx=archive.open(members[".shx"]) if ".shx" in members else None,
+        )
+        for record in reader.iterShapeRecords():
+            yield record.record.as_dict(), record.shape.__geo_interface__
+
+FEATURE_READERS = {
+    "geojson": iter_geojson_features,
+    "kml": iter_kml_features,
+    "shapefile": iter_shapefile_features,
+}
+
+def detect_import_format(filename: Optional[str]) -> Optional[str]:
+    """Deduce el formato a partir de la extensión del archivo."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    return {
+        ".geojson": "geojson",
+        ".json": "geojson",
+        ".geojsonl": "geojson",
+        ".geojsons": "geojson",
+        ".kml": "kml",
+        ".zip": "shapefile",
+    }.get(extension)
+
+# ==================== Validación ====================
+
+def _validate_geometries(geometries: List[Optional[dict]]) -> List[Tuple[Optional[str], Optional[tuple], Optional[str]]]:
+    """
+    Convierte y valida un lote de geometrías GeoJSON. Devuelve, por geometría,
+    (wkt, bounds, error). Se ejecuta en el pool de hilos.
+    """
+    results = []
+    for geometry in geometries:
+        if not geometry:
+            results.append((None, None, "Geometría ausente"))
+            continue
+        try:
+            geom = shapely.force_2d(shape(geometry))
+        except Exception as e:
+            results.append((None, None, f"Geometría ilegible: {e}"))
+            continue
+        if geom.geom_type == "MultiPolygon" and len(geom.geoms) == 1:
+            geom = geom.geoms[0]
+        if geom.geom_type != "Polygon":
+            results.append((None, None, f"Se esperaba un polígono y se recibió {geom.geom_type}"))
+        elif geom.is_empty:
+            results.append((None, None, "Geometría vacía"))
+        elif not geom.is_valid:
+            results.append((None, None, f"Geometría inválida: {explain_validity(geom)}"))
+        else:
+            results.append((geom.wkt, geom.bounds, None))
+    return results
+
+def _format_validation_error(error: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors()]
+
+# ==================== Importación ====================
+
+async def _insert_rows(db: AsyncSession, rows: List[dict]) -> List[int]:
+    """INSERT multi-fila, resumen y commit; el llamador hace rollback si falla."""
+    result = await db.execute(insert(Plot).returning(Plot.plot_id, sort_by_parameter_order=True), rows)
+    plot_ids = list(result.scalars().all())
+    await apply_plot_summary_delta(db, plot_ids, 1)
+    await db.commit()
+    return plot_ids
+
+def _insert_error(error: SQLAlchemyError) -> str:
+    if isinstance(error, IntegrityError):
+        return "La base de datos rechazó la parcela (nombre duplicado o referencia inexistente)"
+    return "Error de base de datos al insertar la parcela"
+
+async def _insert_batch(
+        db: AsyncSession,
+        rows: List[dict],
+        batch_results: List[PlotImportFeatureResult],
+        bounds: List[tuple]
+        ) -> None:
+    """
+    Inserta un lote con un INSERT multi-fila y hace commit del lote. Si el
+    lote falla (p. ej. un nombre creado a la vez por otra petición), se
+    reintenta fila a fila para marcar como error solo las que fallan.
+    """
+    try:
+        plot_ids = await _insert_rows(db, rows)
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.warning(f"Lote de parcelas rechazado, se reintenta fila a fila: {e}")
+        plot_ids = []
+        for row, item in zip(rows, batch_results):
+            try:
+                plot_ids.extend(await _insert_rows(db, [row]))
+            except SQLAlchemyError as row_error:
+                await db.rollback()
+                logger.error(f"Error al insertar la parcela {row.get('plot_name')}: {row_error}")
+                item.status = "error"
+                item.errors.append(_insert_error(row_error))
+
+    created = [(item, geom_bounds) for item, geom_bounds in zip(batch_results, bounds) if item.status != "error"]
+    for (item, _), plot_id in zip(created, plot_ids):
+        item.status = "created"
+        item.plot_id = plot_id
+    if created:
+        tile_cache.invalidate_bounds(*(geom_bounds for _, geom_bounds in created))
+
+async def import_plots(
+        db: AsyncSession,
+        source: IO[bytes],
+        import_format: str,
+        batch_size: int = IMPORT_BATCH_SIZE
+        ) -> PlotImportResult:
+    """
+    Importa parcelas desde un flujo GeoJSON, KML o Shapefile por lotes.
+    Las referencias a grapevines y vineyard y los nombres existentes se
+    precargan una vez; cada feature se valida por separado y los errores
+    (también los de lectura) se informan por feature sin abortar la
+    importación.
+    """
+    if import_format not in FEATURE_READERS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {import_format}")
+
+    try:
+        grapevine_ids = set((await db.execute(select(Grapevine.gv_id))).scalars().all())
+        vineyard_values = set((await db.execute(select(Vineyard.value))).scalars().all())
+        taken_names = set((await db.execute(select(Plot.plot_name))).scalars().all())
+    except SQLAlchemyError as e:
+        logger.error(f"Error al precargar referencias para la importación: {e}")
+        raise HTTPException(status_code=500, detail="Error al preparar la importación")
+
+    report = PlotImportResult()
+    loop = asyncio.get_running_loop()
+
+    async def process_batch(pending: List[Tuple[int, ReadFeature]]) -> None:
+        geometries = await loop.run_in_executor(
+            _geometry_executor, _validate_geometries,
+            [None if isinstance(feature, FeatureReadError) else feature[1] for _, feature in pending]
+        )
+        rows, batch_results, bounds = [], [], []
+        for (index, feature), (geom_wkt, geom_bounds, geom_error) in zip(pending, geometries):
+            if isinstance(feature, FeatureReadError):
+                report.results.append(PlotImportFeatureResult(index=index, status="error", errors=[feature.message]))
+                continue
+            properties = feature[0]
+            plot_name = properties.get("plot_name")
+            item = PlotImportFeatureResult(index=index, plot_name=plot_name if isinstance(plot_name, str) else None)
+            report.results.append(item)
+
+            errors = [geom_error] if geom_error else []
+            plot = None
+            try:
+                plot = PlotCreate(**{**properties, "plot_geom": geom_wkt or ""})
+            except ValidationError as e:
+                errors.extend(_format_validation_error(e))
+
+            if plot is not None:
+                if plot.plot_var not in grapevine_ids:
+                    errors.append(f"Variedad no encontrada: {plot.plot_var}")
+                if plot.plot_rootstock and plot.plot_rootstock not in grapevine_ids:
+                    errors.append(f"Portainjerto no encontrado: {plot.plot_rootstock}")
+                if plot.plot_conduction and plot.plot_conduction not in vineyard_values:
+                    errors.append(f"Sistema de conducción no encontrado: {plot.plot_conduction}")
+                if plot.plot_management and plot.plot_management not in vineyard_values:
+                    errors.append(f"Tipo de manejo no encontrado: {plot.plot_management}")
+                if plot.plot_name in taken_names:
+                    errors.append(f"Ya existe una parcela llamada {plot.plot_name}")
+
+            if errors:
+                item.status = "error"
+                item.errors = errors
+                continue
+
+            taken_names.add(plot.plot_name)
+            row = plot.dict(exclude={"plot_area"})
+            row["plot_geom"] = WKTElement(geom_wkt, srid=4326)
+            rows.append(row)
+            batch_results.append(item)
+            bounds.append(geom_bounds)
+
+        if rows:
+            await _insert_batch(db, rows, batch_results, bounds)
+
+    pending = []
+    features = FEATURE_READERS[import_format](source)
+    index = 0
+    while True:
+        try:
+            feature = next(features)
+        except StopIteration:
+            break
+        except (ValueError, ElementTree.ParseError, zipfile.BadZipFile) as e:
+            # Archivo truncado o ilegible a mitad: se informa y se devuelve
+            # el informe de lo ya procesado
+            feature = FeatureReadError(f"Archivo mal formado, lectura detenida: {e}")
+            features = iter(())
+        pending.append((index, feature))
+        index += 1
+        if len(pending) >= batch_size:
+            await process_batch(pending)
+            pending = []
+    if pending:
+        await process_batch(pending)
+
+    report.total = len(report.results)
+    report.created = sum(1 for item in report.results if item.status == "created")
+    report.failed = report.total - report.created
+    return report
@@ -0,0 +1,135 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.sql import func
+from sqlalchemy import Integer, String, and_, cast, delete, literal, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from fastapi import HTTPException
+from typing import Iterable, Optional
+from ..models import Plot, PlotSummary, Grapevine
+from ..schemas.schemas_plot import PlotStatisticsResponse, PlotSummaryItem
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Dimensiones del resumen y la columna de Plot que las alimenta
+SUMMARY_DIMENSIONS = (
+    ("variety", Plot.plot_var),
+    ("rootstock", Plot.plot_rootstock),
+    ("conduction", Plot.plot_conduction),
+    ("management", Plot.plot_management),
+    ("implant_year", Plot.plot_implant_year),
+)
+
+def _plot_contributions(plot_ids: Optional[Iterable[int]] = None, sign: int = 1):
+    """
+    Contribución agregada de las parcelas activas indicadas (o de todas) a
+    cada fila (dimension, value) del resumen, multiplicada por sign.
+    """
+    conditions = [Plot.active == True]
+    if plot_ids is not None:
+        conditions.append(Plot.plot_id.in_(list(plot_ids)))
+
+    area = func.coalesce(Plot.plot_area, 0)
+    parts = [
+        select(
+            literal(dimension).label("dimension"),
+            func.coalesce(cast(column, String), "").label("value"),
+            area.label("area"),
+        ).where(*conditions)
+        for dimension, column in SUMMARY_DIMENSIONS
+    ]
+    parts.append(
+        select(
+            literal("total").label("dimension"),
+            literal("").label("value"),
+            area.label("area"),
+        ).where(*conditions)
+    )
+    rows = union_all(*parts).subquery("contributions")
+    return (
+        select(
+            rows.c.dimension,
+            rows.c.value,
+            cast(func.count() * sign, Integer).label("plot_count"),
+            (func.sum(rows.c.area) * sign).label("total_area"),
+        )
+        .group_by(rows.c.dimension, rows.c.value)
+    )
+
+async def apply_plot_summary_delta(db: AsyncSession, plot_ids: Iterable[int], sign: int) -> None:
+    """
+    Suma (sign=1) o resta (sign=-1) al resumen la contribución actual de las
+    parcelas dadas. No hace commit: se ejecuta dentro de la transacción que
+    crea, modifica o archiva las parcelas.
+    """
+    plot_ids = list(plot_ids)
+    if not plot_ids:
+        return
+    stmt = insert(PlotSummary).from_select(
+        ["dimension", "value", "plot_count", "total_area"],
+        _plot_contributions(plot_ids, sign),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PlotSummary.dimension, PlotSummary.value],
+        set_={
+            "plot_count": PlotSummary.plot_count + stmt.excluded.plot_count,
+            "total_area": PlotSummary.total_area + stmt.excluded.total_area,
+        },
+    )
+    await db.execute(stmt)
+
+async def rebuild_plot_summary(db: AsyncSession) -> None:
+    """Recalcula el resumen completo desde la tabla plot."""
+    try:
+        await db.execute(delete(PlotSummary))
+        await db.execute(
+            insert(PlotSummary).from_select(
+                ["dimension", "value", "plot_count", "total_area"],
+                _plot_contributions(),
+            )
+        )
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error al recalcular el resumen de parcelas: {e}")
+        raise HTTPException(status_code=500, detail="Error al recalcular las estadísticas")
+
+async def get_plot_summary(db: AsyncSession) -> PlotStatisticsResponse:
+    """
+    Lee el resumen precalculado. El coste depende del número de valores
+    distintos por dimensión, no del número de parcelas.
+    """
+    try:
+        result = await db.execute(
+            select(PlotSummary, Grapevine.name)
+            .outerjoin(
+                Grapevine,
+                and_(
+                    PlotSummary.dimension.in_(("variety", "rootstock")),
+                    Grapevine.gv_id == PlotSummary.value,
+                ),
+            )
+            .where(PlotSummary.plot_count > 0)
+            .order_by(PlotSummary.dimension, PlotSummary.value)
+        )
+
+        response = PlotStatisticsResponse()
+        for summary, name in result:
+            if summary.dimension == "total":
+                response.total_plots = summary.plot_count
+                response.total_area = float(summary.total_area)
+                continue
+            getattr(response, f"by_{summary.dimension}").append(
+                PlotSummaryItem(
+                    value=summary.value or None,
+                    name=name,
+                    plot_count=summary.plot_count,
+                    total_area=float(summary.total_area),
+                )
+            )
+        return response
+
+    except SQLAlchemyError as e:
+        logger.error(f"Error al obtener estadísticas de parcelas: {e}")
+        raise HTTPException(status_code=500, detail="Error al obtener estadísticas")
@@ -0,0 +1,140 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import and_, delete, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+from fastapi import HTTPException
+from typing import Iterable, List, Tuple
+from ..models import StockAlert, InputStock, Warehouse
+from ..models import Input as InputModel
+from ..schemas.schemas_inventory import StockAlert as StockAlertSchema
+from .stock_alert_broker import queue_alert_events
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Una alerta está activa mientras available_quantity < minimum_stock del
+# insumo. La tabla stock_alerts guarda solo las activas y se reevalúa por
+# par (input, warehouse) cada vez que cambia su stock.
+
+def _event(action: str, input_id: int, warehouse_id: int, available_quantity, minimum_stock) -> dict:
+    return {
+        "action": action,
+        "input_id": input_id,
+        "warehouse_id": warehouse_id,
+        "available_quantity": float(available_quantity) if available_quantity is not None else None,
+        "minimum_stock": float(minimum_stock) if minimum_stock is not None else None,
+    }
+
+async def _evaluate_alerts(db: AsyncSession, *conditions) -> None:
+    """Reevalúa las alertas de los pares de input_stock que cumplen `conditions`. No hace commit."""
+    result = await db.execute(
+        select(
+            InputStock.input_id,
+            InputStock.warehouse_id,
+            InputStock.available_quantity,
+            InputModel.minimum_stock,
+            StockAlert.available_quantity.label("alerted_quantity"),
+            StockAlert.input_id.isnot(None).label("alerted"),
+        )
+        .join(InputModel, InputModel.id == InputStock.input_id)
+        .outerjoin(StockAlert, and_(
+            StockAlert.input_id == InputStock.input_id,
+            StockAlert.warehouse_id == InputStock.warehouse_id,
+        ))
+        .where(*conditions)
+    )
+
+    upserts, resolved, events = [], [], []
+    for row in result:
+        below = row.minimum_stock is not None and row.available_quantity < row.minimum_stock
+        if below and (not row.alerted or row.alerted_quantity != row.available_quantity):
+            upserts.append({
+                "input_id": row.input_id,
+                "warehouse_id": row.warehouse_id,
+                "available_quantity": row.available_quantity,
+                "minimum_stock": row.minimum_stock,
+            })
+            events.append(_event(
+                "updated" if row.alerted else "raised",
+                row.input_id, row.warehouse_id, row.available_quantity, row.minimum_stock
+            ))
+        elif not below and row.alerted:
+            resolved.append((row.input_id, row.warehouse_id))
+            events.append(_event("resolved", row.input_id, row.warehouse_id, row.available_quantity, row.minimum_stock))
+
+    if upserts:
+        stmt = pg_insert(StockAlert).values(upserts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StockAlert.input_id, StockAlert.warehouse_id],
+            set_={
+                "available_quantity": stmt.excluded.available_quantity,
+                "minimum_stock": stmt.excluded.minimum_stock,
+            }
+        )
+        await db.execute(stmt)
+    if resolved:
+        await db.execute(delete(StockAlert).where(tuple_(StockAlert.input_id, StockAlert.warehouse_id).in_(resolved)))
+    queue_alert_events(db.sync_session, events)
+
+async def refresh_stock_alerts(db: AsyncSession, keys: Iterable[Tuple[int, int]]) -> None:
+    """Reevalúa solo los pares (input_id, warehouse_id) cuyo stock acaba de cambiar. No hace commit."""
+    keys = sorted(set(keys))
+    if keys:
+        await _evaluate_alerts(db, tuple_(InputStock.input_id, InputStock.warehouse_id).in_(keys))
+
+async def refresh_input_stock_alerts(db: AsyncSession, input_id: int) -> None:
+    """Reevalúa todos los almacenes de un insumo (p. ej. al cambiar su minimum_stock). No hace commit."""
+    await _evaluate_alerts(db, InputStock.input_id == input_id)
+
+async def clear_stock_alerts(db: AsyncSession, keys: Iterable[Tuple[int, int]]) -> None:
+    """Elimina las alertas de pares cuyo stock se borró. No hace commit."""
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    result = await db.execute(
+        delete(StockAlert)
+        .where(tuple_(StockAlert.input_id, StockAlert.warehouse_id).in_(keys))
+        .returning(StockAlert.input_id, StockAlert.warehouse_id)
+    )
+    queue_alert_events(db.sync_session, [
+        _event("resolved", row.input_id, row.warehouse_id, None, None) for row in result
+    ])
+
+async def rebuild_stock_alerts(db: AsyncSession) -> List[StockAlertSchema]:
+    """Reevalúa todos los pares y elimina alertas de stocks que ya no existen."""
+    try:
+        orphans = await db.execute(
+            delete(StockAlert)
+            .where(tuple_(StockAlert.input_id, StockAlert.warehouse_id).not_in(
+                select(InputStock.input_id, InputStock.warehouse_id)
+            ))
+            .returning(StockAlert.input_id, StockAlert.warehouse_id)
+        )
+        queue_alert_events(db.sync_session, [
+            _event("resolved", row.input_id, row.warehouse_id, None, None) for row in orphans
+        ])
+        await _evaluate_alerts(db)
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error al reconstruir alertas de stock: {e}")
+        raise HTTPException(status_code=500, detail="Error al reconstruir las alertas de stock")
+    return await get_active_stock_alerts(db)
+
+async def get_active_stock_alerts(db: AsyncSession) -> List[StockAlertSchema]:
+    result = await db.execute(
+        select(
+            StockAlert.input_id,
+            InputModel.name.label("input_name"),
+            StockAlert.warehouse_id,
+            Warehouse.name.label("warehouse_name"),
+            StockAlert.available_quantity,
+            StockAlert.minimum_stock,
+            StockAlert.raised_at,
+        )
+        .join(InputModel, InputModel.id == StockAlert.input_id)
+        .join(Warehouse, Warehouse.id == StockAlert.warehouse_id)
+        .order_by(StockAlert.raised_at, StockAlert.input_id, StockAlert.warehouse_id)
+    )
+    return [StockAlertSchema(**row._mapping) for row in result]
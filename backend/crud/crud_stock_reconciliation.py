@@ -0,0 +1,148 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import insert, func, text, or_
+from sqlalchemy.exc import SQLAlchemyError
+from fastapi import HTTPException
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+from ..models import InputStock, InventoryMovement
+from ..schemas.schemas_inventory import StockDriftItem, StockReconciliationReport
+from .crud_inventory import MOVEMENT_DELTA
+from .crud_valuation import record_movement_valuation, VALUATION_COLUMNS
+import logging
+
+logger = logging.getLogger(__name__)
+
+RECONCILIATION_COMMENT = "Ajuste de reconciliación de stock"
+
+def reconciliation_query(input_id: Optional[int] = None, warehouse_id: Optional[int] = None):
+    """
+    Una sola pasada sobre inventory_movements: el saldo acumulado por par se
+    calcula con una suma de ventana ordenada por (movement_date, id), que usa
+    el índice (input_id, warehouse_id, movement_date, id). Por par se obtiene
+    el saldo final del libro, el mínimo histórico y la primera fecha en que
+    el libro quedó negativo, y se cruza (FULL JOIN) con input_stock.
+    """
+    conditions = [InventoryMovement.input_id.isnot(None), InventoryMovement.warehouse_id.isnot(None)]
+    if input_id is not None:
+        conditions.append(InventoryMovement.input_id == input_id)
+    if warehouse_id is not None:
+        conditions.append(InventoryMovement.warehouse_id == warehouse_id)
+
+    running = (
+        select(
+            InventoryMovement.input_id,
+            InventoryMovement.warehouse_id,
+            InventoryMovement.movement_date,
+            MOVEMENT_DELTA.label("delta"),
+            func.sum(MOVEMENT_DELTA).over(
+                partition_by=(InventoryMovement.input_id, InventoryMovement.warehouse_id),
+                order_by=(InventoryMovement.movement_date, InventoryMovement.id),
+            ).label("running"),
+        )
+        .where(*conditions)
+        .subquery("running")
+    )
+    ledger = (
+        select(
+            running.c.input_id,
+            running.c.warehouse_id,
+            func.sum(running.c.delta).label("ledger_quantity"),
+            func.min(running.c.running).label("min_running_balance"),
+            func.min(running.c.movement_date).filter(running.c.running < 0).label("first_negative_at"),
+        )
+        .group_by(running.c.input_id, running.c.warehouse_id)
+        .subquery("ledger")
+    )
+
+    stock_conditions = []
+    if input_id is not None:
+        stock_conditions.append(InputStock.input_id == input_id)
+    if warehouse_id is not None:
+        stock_conditions.append(InputStock.warehouse_id == warehouse_id)
+    stock = (
+        select(InputStock.input_id, InputStock.warehouse_id, InputStock.available_quantity)
+        .where(*stock_conditions)
+        .subquery("stock")
+    )
+
+    stock_quantity = func.coalesce(stock.c.available_quantity, 0)
+    ledger_quantity = func.coalesce(ledger.c.ledger_quantity, 0)
+    return (
+        select(
+            func.coalesce(stock.c.input_id, ledger.c.input_id).label("input_id"),
+            func.coalesce(stock.c.warehouse_id, ledger.c.warehouse_id).label("warehouse_id"),
+            stock_quantity.label("stock_quantity"),
+            ledger_quantity.label("ledger_quantity"),
+            (stock_quantity - ledger_quantity).label("drift"),
+            ledger.c.min_running_balance,
+            ledger.c.first_negative_at,
+        )
+        .select_from(stock)
+        .join(
+            ledger,
+            (stock.c.input_id == ledger.c.input_id) & (stock.c.warehouse_id == ledger.c.warehouse_id),
+            full=True,
+        )
+    )
+
+async def reconcile_stock(
+        db: AsyncSession,
+        correct: bool = False,
+        input_id: Optional[int] = None,
+        warehouse_id: Optional[int] = None,
+        user_id: Optional[int] = None
+        ) -> StockReconciliationReport:
+    """
+    Recalcula los saldos desde el libro de movimientos y los compara con
+    input_stock. Informa los pares con diferencia o con saldo histórico
+    negativo. Con correct=True registra, para cada diferencia, un movimiento
+    de ajuste por (stock - libro) que deja el libro igual al stock actual;
+    input_stock no cambia. Mientras corrige, input_stock queda bloqueada
+    para escritura y ningún movimiento concurrente altera la comparación.
+    """
+    try:
+        if correct:
+            await db.execute(text("LOCK TABLE input_stock IN SHARE ROW EXCLUSIVE MODE"))
+
+        pairs = reconciliation_query(input_id, warehouse_id).subquery("pairs")
+        checked = await db.scalar(select(func.count()).select_from(pairs))
+        result = await db.execute(
+            select(pairs)
+            .where(or_(pairs.c.drift != 0, pairs.c.min_running_balance < 0))
+            .order_by(pairs.c.input_id, pairs.c.warehouse_id)
+        )
+        items = [StockDriftItem(**row._mapping) for row in result]
+
+        corrected = 0
+        drifted = [item for item in items if item.drift != 0]
+        if correct and drifted:
+            now = datetime.now()
+            result = await db.execute(insert(InventoryMovement).returning(*VALUATION_COLUMNS), [
+                {
+                    "movement_date": now,
+                    "input_id": item.input_id,
+                    "warehouse_id": item.warehouse_id,
+                    "movement_type": "adjustment",
+                    "quantity": item.drift,
+                    "user_id": user_id,
+                    "comments": RECONCILIATION_COMMENT,
+                }
+                for item in drifted
+            ])
+            await record_movement_valuation(db, result.all())
+            corrected = len(drifted)
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error en la reconciliación de stock: {e}")
+        raise HTTPException(status_code=500, detail="Error en la reconciliación de stock")
+
+    return StockReconciliationReport(
+        checked_pairs=checked or 0,
+        drifted_pairs=len(drifted),
+        total_drift=sum((item.drift for item in drifted), Decimal(0)),
+        corrected=corrected,
+        items=items,
+    )
@@ -0,0 +1,170 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import DateTime, delete, insert, func, literal, union_all
+from sqlalchemy.exc import SQLAlchemyError
+from fastapi import HTTPException
+from datetime import datetime, time
+from typing import List, Optional
+from ..models import StockSnapshot, StockSnapshotRun, InventoryMovement, Warehouse
+from ..models import Input as InputModel
+from ..schemas.schemas_inventory import StockSnapshotRun as StockSnapshotRunSchema, StockAsOfResponse, StockBalanceAsOf
+from .crud_inventory import MOVEMENT_DELTA
+import logging
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PERIODS = ("daily", "monthly", "manual")
+
+# Un snapshot en T guarda, por (input, warehouse), la suma de los movimientos
+# con movement_date < T. Cada snapshot se construye desde el anterior más los
+# movimientos entre ambos, y el saldo a una fecha sale del snapshot más
+# cercano más los movimientos posteriores: el coste depende del intervalo
+# entre snapshots, no del tamaño del libro.
+
+def snapshot_boundary(period: str, moment: Optional[datetime] = None) -> datetime:
+    """Inicio del día (daily) o del mes (monthly) que contiene `moment`."""
+    moment = moment or datetime.now()
+    if period == "monthly":
+        return datetime(moment.year, moment.month, 1)
+    return datetime.combine(moment.date(), time.min)
+
+async def latest_snapshot_at(db: AsyncSession, moment: datetime, inclusive: bool = True) -> Optional[datetime]:
+    """Fecha del último snapshot anterior (o igual, si inclusive) a `moment`."""
+    condition = StockSnapshotRun.snapshot_at <= moment if inclusive else StockSnapshotRun.snapshot_at < moment
+    return await db.scalar(select(func.max(StockSnapshotRun.snapshot_at)).where(condition))
+
+def _balances_query(
+        base_at: Optional[datetime],
+        movement_conditions: list,
+        input_id: Optional[int] = None,
+        warehouse_id: Optional[int] = None
+        ):
+    """Saldos por par: filas del snapshot `base_at` más las variaciones de los movimientos filtrados."""
+    movement_conditions = movement_conditions + [
+        InventoryMovement.input_id.isnot(None),
+        InventoryMovement.warehouse_id.isnot(None),
+    ]
+    if input_id is not None:
+        movement_conditions.append(InventoryMovement.input_id == input_id)
+    if warehouse_id is not None:
+        movement_conditions.append(InventoryMovement.warehouse_id == warehouse_id)
+    parts = [
+        select(
+            InventoryMovement.input_id,
+            InventoryMovement.warehouse_id,
+            MOVEMENT_DELTA.label("quantity"),
+        ).where(*movement_conditions)
+    ]
+
+    if base_at is not None:
+        snapshot_conditions = [StockSnapshot.snapshot_at == base_at]
+        if input_id is not None:
+            snapshot_conditions.append(StockSnapshot.input_id == input_id)
+        if warehouse_id is not None:
+            snapshot_conditions.append(StockSnapshot.warehouse_id == warehouse_id)
+        parts.append(
+            select(StockSnapshot.input_id, StockSnapshot.warehouse_id, StockSnapshot.quantity)
+            .where(*snapshot_conditions)
+        )
+
+    ledger = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery("ledger")
+    return (
+        select(ledger.c.input_id, ledger.c.warehouse_id, func.sum(ledger.c.quantity).label("quantity"))
+        .group_by(ledger.c.input_id, ledger.c.warehouse_id)
+    )
+
+async def create_stock_snapshot(
+        db: AsyncSession,
+        snapshot_at: datetime,
+        period: str = "manual"
+        ) -> StockSnapshotRunSchema:
+    """
+    Escribe (o reescribe) el snapshot en `snapshot_at` a partir del snapshot
+    anterior y los movimientos entre ambos, con un único INSERT ... SELECT.
+    """
+    if period not in SNAPSHOT_PERIODS:
+        raise HTTPException(status_code=400, detail=f"Periodo no válido: {period}")
+    if snapshot_at > datetime.now():
+        raise HTTPException(status_code=400, detail="No se puede crear un snapshot en el futuro")
+
+    try:
+        previous = await latest_snapshot_at(db, snapshot_at, inclusive=False)
+        await db.execute(delete(StockSnapshotRun).where(StockSnapshotRun.snapshot_at == snapshot_at))
+        await db.execute(insert(StockSnapshotRun).values(snapshot_at=snapshot_at, period=period))
+
+        conditions = [InventoryMovement.movement_date < snapshot_at]
+        if previous is not None:
+            conditions.append(InventoryMovement.movement_date >= previous)
+        balances = _balances_query(previous, conditions).subquery("balances")
+        result = await db.execute(
+            insert(StockSnapshot).from_select(
+                ["snapshot_at", "input_id", "warehouse_id", "quantity"],
+                select(
+                    literal(snapshot_at, type_=DateTime()),
+                    balances.c.input_id,
+                    balances.c.warehouse_id,
+                    balances.c.quantity,
+                ).where(balances.c.quantity != 0)
+            )
+        )
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error al crear snapshot de stock: {e}")
+        raise HTTPException(status_code=500, detail="Error al crear el snapshot de stock")
+
+    return StockSnapshotRunSchema(snapshot_at=snapshot_at, period=period, pairs=result.rowcount)
+
+async def get_stock_snapshot_runs(db: AsyncSession, limit: int = 100) -> List[StockSnapshotRunSchema]:
+    """Snapshots existentes, del más reciente al más antiguo."""
+    pairs = (
+        select(func.count())
+        .where(StockSnapshot.snapshot_at == StockSnapshotRun.snapshot_at)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(StockSnapshotRun.snapshot_at, StockSnapshotRun.period, pairs.label("pairs"))
+        .order_by(StockSnapshotRun.snapshot_at.desc())
+        .limit(limit)
+    )
+    return [StockSnapshotRunSchema(snapshot_at=row.snapshot_at, period=row.period, pairs=row.pairs) for row in result]
+
+async def get_stock_as_of(
+        db: AsyncSession,
+        as_of: datetime,
+        input_id: Optional[int] = None,
+        warehouse_id: Optional[int] = None
+        ) -> StockAsOfResponse:
+    """
+    Saldo por (input, warehouse) en `as_of` (movimientos con movement_date
+    <= as_of): snapshot más cercano anterior más los movimientos posteriores.
+    Solo devuelve pares con saldo distinto de cero.
+    """
+    try:
+        base_at = await latest_snapshot_at(db, as_of)
+        conditions = [InventoryMovement.movement_date <= as_of]
+        if base_at is not None:
+            conditions.append(InventoryMovement.movement_date >= base_at)
+        balances = _balances_query(base_at, conditions, input_id, warehouse_id).subquery("balances")
+        result = await db.execute(
+            select(
+                balances.c.input_id,
+                InputModel.name.label("input_name"),
+                balances.c.warehouse_id,
+                Warehouse.name.label("warehouse_name"),
+                balances.c.quantity,
+            )
+            .outerjoin(InputModel, InputModel.id == balances.c.input_id)
+            .outerjoin(Warehouse, Warehouse.id == balances.c.warehouse_id)
+            .where(balances.c.quantity != 0)
+            .order_by(balances.c.input_id, balances.c.warehouse_id)
+        )
+    except SQLAlchemyError as e:
+        logger.error(f"Error al calcular stock a fecha: {e}")
+        raise HTTPException(status_code=500, detail="Error al calcular el stock a fecha")
+
+    return StockAsOfResponse(
+        as_of=as_of,
+        snapshot_at=base_at,
+        items=[StockBalanceAsOf(**row._mapping) for row in result]
+    )
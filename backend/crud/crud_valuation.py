@@ -0,0 +1,274 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import delete, insert, update, func, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+from fastapi import HTTPException
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+from ..models import StockValuation, StockCostLayer, InventoryMovement, InputCategory, Warehouse
+from ..models import Input as InputModel
+from ..schemas.schemas_inventory import ValuationItem, ValuationReport, ValuationRebuildResult
+from .valuation_engine import ZERO, CostLayer, CostState, LedgerReplay, valuation_row, layer_row
+import logging
+
+logger = logging.getLogger(__name__)
+
+VALUATION_GROUPS = ("input", "warehouse", "category", "pair")
+
+# Filas del libro leídas por bloque al reconstruir la valoración
+REBUILD_CHUNK_SIZE = 5000
+
+# Columnas que record_movement_valuation necesita; se piden con RETURNING al insertar
+VALUATION_COLUMNS = (
+    InventoryMovement.id,
+    InventoryMovement.input_id,
+    InventoryMovement.warehouse_id,
+    InventoryMovement.movement_type,
+    InventoryMovement.quantity,
+    InventoryMovement.unit_price,
+    InventoryMovement.movement_date,
+)
+
+# Orden del libro en que se aplican los movimientos de cada par
+LEDGER_ORDER = (
+    InventoryMovement.input_id, InventoryMovement.warehouse_id,
+    InventoryMovement.movement_date, InventoryMovement.id,
+)
+
+async def _upsert_valuations(db: AsyncSession, rows: List[dict]) -> None:
+    if not rows:
+        return
+    stmt = pg_insert(StockValuation).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StockValuation.input_id, StockValuation.warehouse_id],
+        set_={
+            "quantity": stmt.excluded.quantity,
+            "average_value": stmt.excluded.average_value,
+            "fifo_value": stmt.excluded.fifo_value,
+            "last_movement_id": stmt.excluded.last_movement_id,
+            "updated_at": stmt.excluded.updated_at,
+        }
+    )
+    await db.execute(stmt)
+
+async def _input_prices(db: AsyncSession, input_ids: Optional[Iterable[int]] = None) -> Dict[int, Optional[Decimal]]:
+    query = select(InputModel.id, InputModel.unit_price)
+    if input_ids is not None:
+        query = query.where(InputModel.id.in_(set(input_ids)))
+    return {row.id: row.unit_price for row in await db.execute(query)}
+
+async def average_unit_costs(db: AsyncSession, keys: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], Decimal]:
+    """Costo unitario promedio actual de los pares dados (solo los que tienen stock valorado)."""
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    result = await db.execute(
+        select(StockValuation.input_id, StockValuation.warehouse_id, StockValuation.quantity, StockValuation.average_value)
+        .where(tuple_(StockValuation.input_id, StockValuation.warehouse_id).in_(keys))
+    )
+    return {
+        (row.input_id, row.warehouse_id): CostState(row.quantity, row.average_value).average_cost
+        for row in result if row.quantity > 0
+    }
+
+# ==================== Actualización incremental ====================
+
+async def _rebuild_pairs(db: AsyncSession, keys: List[Tuple[int, int]]) -> None:
+    """
+    Recalcula desde el libro la valoración y las capas de los pares dados
+    (ya bloqueados por el llamador). No hace commit.
+    """
+    replay = LedgerReplay(await _input_prices(db, {key[0] for key in keys}))
+    result = await db.execute(
+        select(*VALUATION_COLUMNS)
+        .where(tuple_(InventoryMovement.input_id, InventoryMovement.warehouse_id).in_(keys))
+        .order_by(*LEDGER_ORDER)
+    )
+    for movement in result:
+        replay.apply(movement)
+    replay.finish()
+
+    await db.execute(
+        delete(StockCostLayer)
+        .where(tuple_(StockCostLayer.input_id, StockCostLayer.warehouse_id).in_(keys))
+    )
+    await _upsert_valuations(db, replay.valuations)
+    if replay.layers:
+        await db.execute(insert(StockCostLayer), replay.layers)
+
+async def record_movement_valuation(db: AsyncSession, movements) -> None:
+    """
+    Actualiza la valoración con movimientos recién insertados (objetos o filas
+    con id, input_id, warehouse_id, movement_type, quantity, unit_price y
+    movement_date) en orden de fecha, como rebuild_valuation. Lee solo el
+    estado de los pares afectados y sus capas abiertas; un par que recibe un
+    movimiento anterior al último ya valorado se recalcula desde su libro,
+    igual que discard_stock_snapshots_after descarta las fotos posteriores.
+    No hace commit.
+    """
+    movements = sorted(
+        (m for m in movements if m.input_id is not None and m.warehouse_id is not None),
+        key=lambda m: (m.movement_date, m.id)
+    )
+    if not movements:
+        return
+
+    keys = sorted({(m.input_id, m.warehouse_id) for m in movements})
+    result = await db.execute(
+        select(StockValuation, InventoryMovement.movement_date)
+        .outerjoin(InventoryMovement, InventoryMovement.id == StockValuation.last_movement_id)
+        .where(tuple_(StockValuation.input_id, StockValuation.warehouse_id).in_(keys))
+        .with_for_update(of=StockValuation)
+    )
+    states, valued_until = {}, {}
+    for v, last_date in result:
+        states[(v.input_id, v.warehouse_id)] = CostState(v.quantity, v.average_value, v.fifo_value)
+        valued_until[(v.input_id, v.warehouse_id)] = last_date
+
+    backdated = sorted({
+        (m.input_id, m.warehouse_id) for m in movements
+        if valued_until.get((m.input_id, m.warehouse_id)) is not None
+        and m.movement_date < valued_until[(m.input_id, m.warehouse_id)]
+    })
+    if backdated:
+        await _rebuild_pairs(db, backdated)
+        movements = [m for m in movements if (m.input_id, m.warehouse_id) not in backdated]
+        keys = [key for key in keys if key not in backdated]
+        if not movements:
+            return
+
+    for key in keys:
+        states.setdefault(key, CostState())
+    states = {key: states[key] for key in keys}
+
+    issuing = sorted({(m.input_id, m.warehouse_id) for m in movements if m.movement_type == "exit" or Decimal(str(m.quantity)) < 0})
+    if issuing:
+        layers = await db.execute(
+            select(StockCostLayer)
+            .where(
+                tuple_(StockCostLayer.input_id, StockCostLayer.warehouse_id).in_(issuing),
+                StockCostLayer.remaining_quantity > 0,
+            )
+            .order_by(StockCostLayer.input_id, StockCostLayer.warehouse_id, StockCostLayer.received_at, StockCostLayer.id)
+            .with_for_update()
+        )
+        for layer in layers.scalars():
+            states[(layer.input_id, layer.warehouse_id)].layers.append(CostLayer(
+                layer.id, layer.movement_id, layer.received_at, layer.unit_cost,
+                layer.original_quantity, layer.remaining_quantity
+            ))
+
+    prices = await _input_prices(db, {key[0] for key in keys})
+    for movement in movements:
+        states[(movement.input_id, movement.warehouse_id)].apply(movement, prices.get(movement.input_id))
+
+    await _upsert_valuations(db, [valuation_row(key, state) for key, state in states.items()])
+    new_layers = [layer_row(key, layer) for key, state in states.items() for layer in state.new_layers]
+    if new_layers:
+        await db.execute(insert(StockCostLayer), new_layers)
+    touched = [
+        {"id": layer.id, "remaining_quantity": layer.remaining_quantity}
+        for state in states.values() for layer in state.touched_layers.values()
+    ]
+    if touched:
+        await db.execute(update(StockCostLayer), touched)
+
+# ==================== Reconstrucción ====================
+
+async def rebuild_valuation(db: AsyncSession) -> ValuationRebuildResult:
+    """
+    Recalcula toda la valoración recorriendo el libro en orden de fecha por
+    par con un cursor de servidor. Solo se guardan en memoria el estado y las
+    capas abiertas del par en curso y las filas a escribir, no el libro.
+    """
+    report = ValuationRebuildResult()
+    try:
+        replay = LedgerReplay(await _input_prices(db))
+        result = await db.stream(
+            select(*VALUATION_COLUMNS)
+            .where(InventoryMovement.input_id.isnot(None), InventoryMovement.warehouse_id.isnot(None))
+            .order_by(*LEDGER_ORDER)
+            .execution_options(yield_per=REBUILD_CHUNK_SIZE)
+        )
+        async for partition in result.partitions():
+            for movement in partition:
+                replay.apply(movement)
+        replay.finish()
+        valuations, layers = replay.valuations, replay.layers
+        report.movements = replay.movements
+
+        await db.execute(delete(StockCostLayer))
+        await db.execute(delete(StockValuation))
+        for start in range(0, len(valuations), REBUILD_CHUNK_SIZE):
+            await _upsert_valuations(db, valuations[start:start + REBUILD_CHUNK_SIZE])
+        for start in range(0, len(layers), REBUILD_CHUNK_SIZE):
+            await db.execute(insert(StockCostLayer), layers[start:start + REBUILD_CHUNK_SIZE])
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error al reconstruir la valoración de inventario: {e}")
+        raise HTTPException(status_code=500, detail="Error al reconstruir la valoración de inventario")
+
+    report.pairs = len(valuations)
+    report.open_layers = len(layers)
+    return report
+
+# ==================== Consulta ====================
+
+async def get_valuation(
+        db: AsyncSession,
+        group_by: str = "input",
+        input_id: Optional[int] = None,
+        warehouse_id: Optional[int] = None,
+        category_id: Optional[int] = None
+        ) -> ValuationReport:
+    """Valor del inventario a costo promedio y FIFO agrupado por insumo, almacén, categoría o par."""
+    if group_by not in VALUATION_GROUPS:
+        raise HTTPException(status_code=400, detail=f"Agrupación no válida: {group_by}")
+
+    group_columns = {
+        "input": [StockValuation.input_id, InputModel.name.label("input_name")],
+        "warehouse": [StockValuation.warehouse_id, Warehouse.name.label("warehouse_name")],
+        "category": [InputModel.category_id, InputCategory.name.label("category_name")],
+        "pair": [
+            StockValuation.input_id, InputModel.name.label("input_name"),
+            StockValuation.warehouse_id, Warehouse.name.label("warehouse_name"),
+        ],
+    }[group_by]
+
+    conditions = []
+    if input_id is not None:
+        conditions.append(StockValuation.input_id == input_id)
+    if warehouse_id is not None:
+        conditions.append(StockValuation.warehouse_id == warehouse_id)
+    if category_id is not None:
+        conditions.append(InputModel.category_id == category_id)
+
+    query = (
+        select(
+            *group_columns,
+            func.sum(StockValuation.quantity).label("quantity"),
+            func.sum(StockValuation.average_value).label("average_value"),
+            func.sum(StockValuation.fifo_value).label("fifo_value"),
+        )
+        .join(InputModel, InputModel.id == StockValuation.input_id)
+        .join(Warehouse, Warehouse.id == StockValuation.warehouse_id)
+        .outerjoin(InputCategory, InputCategory.id == InputModel.category_id)
+        .where(*conditions)
+        .group_by(*group_columns)
+        .order_by(*group_columns)
+    )
+    try:
+        result = await db.execute(query)
+    except SQLAlchemyError as e:
+        logger.error(f"Error al consultar la valoración de inventario: {e}")
+        raise HTTPException(status_code=500, detail="Error al consultar la valoración de inventario")
+
+    items = [ValuationItem(**row._mapping) for row in result]
+    return ValuationReport(
+        group_by=group_by,
+        total_average_value=sum((item.average_value for item in items), ZERO),
+        total_fifo_value=sum((item.fifo_value for item in items), ZERO),
+        items=items,
+    )
@@ -6,7 +6,7 @@ from datetime import datetime
 from ..models import Batch, Vessel, VesselActivity, InventoryMovement
 from ..schemas.schemas_winery  import VesselCreate,VesselUpdate,BatchCreate,BatchUpdate,VesselActivityCreate,VesselActivityUpdate,VesselActivityCreate,VesselActivityResponse
 from ..schemas.schemas_inventory import TaskInputCreate, InventoryMovementCreate
-from ..crud.crud_inventory import create_inventory_movement
+from ..crud.crud_inventory import consume_inputs
 
 
 async def create_vessel_CRUD(db: AsyncSession, vessel: VesselCreate) -> Vessel:
@@ -131,37 +131,14 @@ async def create_vessel_activity_with_inputs_CRUD(
         db.add(db_vesselact)
         await db.flush()  # Cambiar commit por flush para obtener el ID sin hacer commit final
         
-        # Crear y consumir los insumos
-        inputs_response = []
-        for input_data in inputs:
-            logging.info(f"Procesando input_data: {input_data}")
-
-            movement = InventoryMovementCreate(
-                input_id=input_data.input_id,
-                warehouse_id=input_data.warehouse_id,
-                quantity=input_data.used_quantity,
-                movement_type="exit",
-                movement_date=datetime.now(),
-                vessel_activity_id=db_vesselact.id,  # ✅ CAMBIO: usar vessel_activity_id
-                operation_id=None,  # ✅ CAMBIO: operation_id debe ser None
-                description=f"Consumo de insumo para vessel activity {db_vesselact.id}"
-            )
-            logging.info(f"Creando movimiento de inventario: {movement}")
-            await create_inventory_movement(db, movement)
-            logging.info("Movimiento de inventario creado")
-
-            input_response = TaskInputCreate(
-                input_id=input_data.input_id,
-                used_quantity=input_data.used_quantity,
-                warehouse_id=input_data.warehouse_id,
-                status=input_data.status,
-                operation_id=None  # ✅ CAMBIO: cambiar por vessel_activity_id si tu modelo lo soporta
-            )
-
-            inputs_response.append(input_response)
+        # Consumir los insumos en bloque, en la misma transacción que la actividad
+        await consume_inputs(
+            db, inputs,
+            vessel_activity_id=db_vesselact.id,
+            comments=f"Consumo de insumo para vessel activity {db_vesselact.id}"
+        )
 
         await db.commit()  # Hacer commit final de todo
-        await db.refresh(db_vesselact)
 
         return VesselActivityResponse(
             id=db_vesselact.id,
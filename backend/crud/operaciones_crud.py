@@ -1,14 +1,20 @@
-from ..models import Operacion, TaskInput, InputStock, TaskList
-from ..schemas.operaciones_schemas import OperacionCreate, OperacionUpdate, OperacionResponse, TaskInputUpdate
-from .crud_inventory import create_inventory_movement
+from ..models import Operacion, TaskInput, InputStock, TaskList, Plot, Usuario, InventoryMovement
+from ..schemas.operaciones_schemas import OperacionCreate, OperacionUpdate, OperacionResponse, TaskInputUpdate, OperacionFilters, OperacionPage
+from ..schemas.operaciones_schemas import OperacionCalendar, OperacionCalendarGroup, OperacionInputsUpdateResult, OperacionBulkCreate, OperacionBulkResult
+from ..schemas.operaciones_schemas import Operacion as OperacionSchema
+from .crud_inventory import consume_inputs, aggregate_stock_deltas, apply_stock_deltas, movement_stock_delta
+from .crud_valuation import record_movement_valuation, VALUATION_COLUMNS
+from .crud_operaciones_task import resolve_task_columns, task_type_condition
+from .pagination import encode_cursor, decode_cursor, parse_cursor_date
 from passlib.context import CryptContext
-from sqlalchemy import delete
+from sqlalchemy import Date, delete, insert, update, func, literal, literal_column, or_, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from decimal import Decimal
 from fastapi import HTTPException
-from datetime import datetime
+from datetime import date, datetime
 from ..schemas.schemas_inventory import InventoryMovementCreate, TaskInputCreate
 import logging
 
@@ -16,17 +22,90 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")  # Para encrip
 
 
 async def create_operacion(db: AsyncSession, operacion: OperacionCreate):
-    db_operaciones = Operacion(parcela_id=operacion.parcela_id,tipo_operacion=operacion.tipo_operacion,fecha_inicio=operacion.fecha_inicio,fecha_fin=operacion.fecha_fin,estado=operacion.estado,responsable_id=operacion.responsable_id,nota=operacion.nota,comentario=operacion.comentario)
+    task_columns = (await resolve_task_columns(db, [operacion.tipo_operacion]))[operacion.tipo_operacion]
+    db_operaciones = Operacion(parcela_id=operacion.parcela_id,tipo_operacion=operacion.tipo_operacion,fecha_inicio=operacion.fecha_inicio,fecha_fin=operacion.fecha_fin,estado=operacion.estado,responsable_id=operacion.responsable_id,nota=operacion.nota,comentario=operacion.comentario,**task_columns)
     db.add(db_operaciones)
     await db.commit()
     await db.refresh(db_operaciones)
     return {"status": 201, "message": "Added successfully"}
 
-async def get_operaciones(db: AsyncSession):
-    """Obtiene todas las operaciones cargando también la relación de inputs."""
-    result = await db.execute(select(Operacion).options(selectinload(Operacion.inputs)))
-    operaciones = result.scalars().all()
-    return operaciones
+# Clave de orden del listado: igual a la expresión de los índices
+# ix_operaciones_*_fecha_id; las operaciones sin fecha van al final
+FECHA_KEY = func.coalesce(Operacion.fecha_inicio, literal_column("'-infinity'::date"))
+FECHA_SIN_FECHA = literal_column("'-infinity'::date")
+
+def operaciones_query(filters: Optional[OperacionFilters] = None, task_type: Optional[str] = None):
+    """
+    Consulta común de los listados de operaciones (todas, viñedo y bodega)
+    con los filtros de fecha de inicio, parcela, tarea, estado y responsable.
+    """
+    query = select(Operacion)
+    if task_type is not None:
+        # Copia indexada de task_list.task_type (ix_operaciones_task_type_fecha_id)
+        query = query.where(task_type_condition(task_type))
+    if filters is None:
+        return query
+    if filters.start_date is not None:
+        query = query.where(FECHA_KEY >= filters.start_date)
+    if filters.end_date is not None:
+        query = query.where(FECHA_KEY <= filters.end_date)
+    if filters.parcela_id is not None:
+        query = query.where(Operacion.parcela_id == filters.parcela_id)
+    if filters.tipo_operacion is not None:
+        query = query.where(Operacion.tipo_operacion == filters.tipo_operacion)
+    if filters.estado is not None:
+        query = query.where(Operacion.estado == filters.estado)
+    if filters.responsable_id is not None:
+        query = query.where(Operacion.responsable_id == filters.responsable_id)
+    return query
+
+async def get_operaciones_page(
+    db: AsyncSession,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    filters: Optional[OperacionFilters] = None,
+    task_type: Optional[str] = None
+) -> OperacionPage:
+    """
+    Página de operaciones de la más reciente a la más antigua por fecha de
+    inicio, con paginación por cursor sobre (fecha, id). Los insumos de la
+    página se cargan con una sola consulta adicional.
+    """
+    query = operaciones_query(filters, task_type)
+    before = decode_cursor(cursor, 2)
+    if before is not None:
+        fecha = parse_cursor_date(before[0])
+        query = query.where(
+            tuple_(FECHA_KEY, Operacion.id) < tuple_(fecha if fecha is not None else FECHA_SIN_FECHA, before[1])
+        )
+    query = (
+        query.options(selectinload(Operacion.inputs))
+        .order_by(FECHA_KEY.desc(), Operacion.id.desc())
+        .limit(limit + 1)
+    )
+
+    operaciones = (await db.execute(query)).scalars().all()
+    page = operaciones[:limit]
+    next_cursor = None
+    if len(operaciones) > limit:
+        next_cursor = encode_cursor(page[-1].fecha_inicio, page[-1].id)
+    return OperacionPage(
+        items=[OperacionSchema.model_validate(operacion) for operacion in page],
+        next_cursor=next_cursor
+    )
+
+async def get_operaciones(db: AsyncSession, filters: Optional[OperacionFilters] = None, task_type: Optional[str] = None):
+    """
+    Listado completo (sin paginar) que usa el frontend actual, con los mismos
+    filtros y orden que get_operaciones_page. Para recorrer temporadas
+    enteras usar get_operaciones_page.
+    """
+    result = await db.execute(
+        operaciones_query(filters, task_type)
+        .options(selectinload(Operacion.inputs))
+        .order_by(FECHA_KEY.desc(), Operacion.id.desc())
+    )
+    return result.scalars().all()
 
 async def get_operacion(db: AsyncSession, id: int):
     """Obtiene una operación por su ID cargando también la relación de inputs."""
@@ -34,34 +113,112 @@ async def get_operacion(db: AsyncSession, id: int):
     operacion_db = result.scalars().first()
     return operacion_db
 
-async def get_vineyard_operaciones(db: AsyncSession):
-    """Obtiene todas las operaciones de tipo 'vineyard' cargando también la relación de inputs."""
-    result = await db.execute(
-        select(Operacion)
-        .join(TaskList, Operacion.tipo_operacion == TaskList.task_name)
-        .where(TaskList.task_type == "vineyard")
-        .options(selectinload(Operacion.inputs))
-    )
-    operaciones = result.scalars().all()
-    return operaciones
+async def get_vineyard_operaciones(db: AsyncSession, filters: Optional[OperacionFilters] = None):
+    """Obtiene las operaciones de tipo 'vineyard' cargando también la relación de inputs."""
+    return await get_operaciones(db, filters, task_type="vineyard")
+
+async def get_winery_operaciones(db: AsyncSession, filters: Optional[OperacionFilters] = None):
+    """Obtiene las operaciones de tipo 'winery' cargando también la relación de inputs."""
+    return await get_operaciones(db, filters, task_type="winery")
+
+# Periodo cerrado de una operación; misma expresión que ix_operaciones_periodo (GiST)
+OPERACION_PERIODO = func.daterange(
+    func.least(Operacion.fecha_inicio, Operacion.fecha_fin),
+    func.greatest(Operacion.fecha_inicio, Operacion.fecha_fin),
+    literal_column("'[]'")
+)
+CALENDAR_MAX_DAYS = 400
+CALENDAR_GROUPS = ("plot", "responsable")
+
+async def get_operaciones_calendar(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    group_by: str = "plot",
+    task_type: Optional[str] = None,
+    estado: Optional[str] = None
+) -> OperacionCalendar:
+    """
+    Operaciones cuyo periodo se solapa con [start_date, end_date], agrupadas
+    por parcela o por responsable, en formato columnar: una lista por campo
+    en lugar de un objeto por operación, fechas como días desde start_date y
+    los tipos de operación como índices en `tasks`. Una sola consulta,
+    filtrada por el índice GiST del periodo.
+    """
+    if group_by not in CALENDAR_GROUPS:
+        raise HTTPException(status_code=400, detail=f"Agrupación no válida: {group_by}")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date debe ser posterior a start_date")
+    if (end_date - start_date).days > CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"La ventana no puede superar {CALENDAR_MAX_DAYS} días")
+
+    if group_by == "plot":
+        group_key, group_label = Operacion.parcela_id, Plot.plot_name
+        label_join = (Plot, Plot.plot_id == Operacion.parcela_id)
+    else:
+        group_key = Operacion.responsable_id
+        group_label = func.concat_ws(" ", Usuario.nombre, Usuario.apellido)
+        label_join = (Usuario, Usuario.id == Operacion.responsable_id)
+
+    conditions = [
+        or_(Operacion.fecha_inicio.isnot(None), Operacion.fecha_fin.isnot(None)),
+        OPERACION_PERIODO.op("&&")(func.daterange(
+            literal(start_date, type_=Date), literal(end_date, type_=Date), literal_column("'[]'")
+        )),
+    ]
+    if task_type is not None:
+        conditions.append(task_type_condition(task_type))
+    if estado is not None:
+        conditions.append(Operacion.estado == estado)
 
-async def get_winery_operaciones(db: AsyncSession):
-    """Obtiene todas las operaciones de tipo 'winery' cargando también la relación de inputs."""
+    period_start = func.least(Operacion.fecha_inicio, Operacion.fecha_fin)
     result = await db.execute(
-        select(Operacion)
-        .join(TaskList, Operacion.tipo_operacion == TaskList.task_name)
-        .where(TaskList.task_type == "winery")
-        .options(selectinload(Operacion.inputs))
+        select(
+            Operacion.id,
+            Operacion.parcela_id,
+            Operacion.responsable_id,
+            Operacion.tipo_operacion,
+            Operacion.estado,
+            period_start.label("period_start"),
+            func.greatest(Operacion.fecha_inicio, Operacion.fecha_fin).label("period_end"),
+            group_key.label("group_key"),
+            group_label.label("group_label"),
+        )
+        .outerjoin(*label_join)
+        .where(*conditions)
+        .order_by(group_key.asc().nulls_last(), period_start, Operacion.id)
     )
-    operaciones = result.scalars().all()
-    return operaciones
+
+    calendar = OperacionCalendar(start_date=start_date, end_date=end_date, group_by=group_by)
+    columns = calendar.columns
+    task_index: Dict[str, int] = {}
+    for position, row in enumerate(result):
+        if not calendar.groups or calendar.groups[-1].key != row.group_key:
+            calendar.groups.append(OperacionCalendarGroup(
+                key=row.group_key, label=row.group_label, offset=position, count=0
+            ))
+        calendar.groups[-1].count += 1
+        if row.tipo_operacion not in task_index:
+            task_index[row.tipo_operacion] = len(calendar.tasks)
+            calendar.tasks.append(row.tipo_operacion)
+        columns.id.append(row.id)
+        columns.parcela_id.append(row.parcela_id)
+        columns.responsable_id.append(row.responsable_id)
+        columns.task.append(task_index[row.tipo_operacion])
+        columns.estado.append(row.estado)
+        columns.start_day.append((row.period_start - start_date).days)
+        columns.end_day.append((row.period_end - start_date).days)
+    return calendar
 
 async def update_operacion(db: AsyncSession, operacion_id: int, parcela_update: OperacionUpdate):
     existing_operacion = await db.get(Operacion, operacion_id)
     if existing_operacion is None:
         return None # Retorna None si no existe
 
-    for key, value in parcela_update.dict(exclude_unset=True).items():
+    update_data = parcela_update.dict(exclude_unset=True)
+    if update_data.get("tipo_operacion") is not None:
+        update_data.update((await resolve_task_columns(db, [update_data["tipo_operacion"]]))[update_data["tipo_operacion"]])
+    for key, value in update_data.items():
         setattr(existing_operacion,key,value)
 
     await db.commit()
@@ -87,6 +244,7 @@ async def create_operation_with_inputs(
         logging.info(f"Inputs: {inputs}")
 
         # Crear la operación
+        task_columns = (await resolve_task_columns(db, [operation.tipo_operacion]))[operation.tipo_operacion]
         db_operation = Operacion(
             parcela_id=operation.parcela_id,
             tipo_operacion=operation.tipo_operacion,
@@ -96,56 +254,47 @@ async def create_operation_with_inputs(
             responsable_id=operation.responsable_id,
             nota=operation.nota,
             comentario=operation.comentario,
-            inputs=[] # Inicializa la lista de inputs
+            **task_columns
         )
 
         db.add(db_operation)
         await db.flush() # Es importante hacer un flush para obtener el ID de db_operation
 
-        # Crear y consumir los insumos
-        inputs_response = []
-        for input_data in inputs:
-            logging.info(f"Procesando input_data: {input_data}")
-
-            # Crear el movimiento de inventario
-            movement = InventoryMovementCreate(
-                input_id=input_data.input_id,
-                warehouse_id=input_data.warehouse_id,
-                quantity=input_data.used_quantity,
-                movement_type="exit",
-                movement_date=datetime.now(),
-                operation_id=db_operation.id,
-                description=f"Consumo de insumo para operación {db_operation.id}"
-            )
-            logging.info(f"Creando movimiento de inventario: {movement}")
-            await create_inventory_movement(db, movement)
-            logging.info("Movimiento de inventario creado")
-
-            # Crear la instancia del modelo TaskInput
-            db_task_input = TaskInput(
-                input_id=input_data.input_id,
-                used_quantity=input_data.used_quantity,
-                warehouse_id=input_data.warehouse_id,
-                status=input_data.status,
-                operation_id=db_operation.id
-            )
-            db_operation.inputs.append(db_task_input) # Asocia el TaskInput a la Operacion
+        # Consumir los insumos: stock validado y descontado en bloque, un
+        # INSERT multi-fila para movimientos y otro para task_inputs
+        inputs = inputs or []
+        await consume_inputs(
+            db, inputs,
+            operation_id=db_operation.id,
+            comments=f"Consumo de insumo para operación {db_operation.id}"
+        )
+        if inputs:
+            await db.execute(insert(TaskInput), [
+                {
+                    "operation_id": db_operation.id,
+                    "input_id": input_data.input_id,
+                    "planned_quantity": input_data.planned_quantity,
+                    "used_quantity": input_data.used_quantity,
+                    "warehouse_id": input_data.warehouse_id,
+                    "status": input_data.status,
+                }
+                for input_data in inputs
+            ])
 
-            input_response = TaskInputCreate( # Esto es para la respuesta
+        inputs_response = [
+            TaskInputCreate(
                 input_id=input_data.input_id,
+                planned_quantity=input_data.planned_quantity,
                 used_quantity=input_data.used_quantity,
                 warehouse_id=input_data.warehouse_id,
                 status=input_data.status,
                 operation_id=db_operation.id
             )
-            logging.info(f"Creando input_response: {input_response}")
-            inputs_response.append(input_response)
+            for input_data in inputs
+        ]
 
+        # Un único commit: operación, stock, movimientos e insumos juntos
         await db.commit()
-        await db.refresh(db_operation)
-
-        logging.info(f"inputs_response: {inputs_response}")
-        logging.info(f"db_operation: {db_operation.__dict__}")
 
         return OperacionResponse(
             id=db_operation.id,
@@ -168,18 +317,274 @@ async def create_operation_with_inputs(
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error al crear operación y consumir insumos: {str(e)}")
   
-async def update_operacion_inputs(db: AsyncSession, operacion_id: int, inputs_data: List[TaskInputUpdate]):
-    # Eliminar los insumos existentes para esta operacion
-    await db.execute(delete(TaskInput).where(TaskInput.operation_id == operacion_id))
-
-    # Crear y agregar los nuevos insumos
-    for input_item in inputs_data:
-        new_input = TaskInput(
-            operation_id=operacion_id,
-            input_id=input_item.input_id,
-            used_quantity=input_item.used_quantity
-            # Otros campos de TaskInput si los tienes
-        )
-        db.add(new_input)
+def _split_quantity(total: Optional[Decimal], weights: List[Decimal]) -> List[Optional[Decimal]]:
+    """
+    Reparte `total` según `weights` en centésimas (la escala de las columnas
+    de cantidad) por mayor resto, de modo que las partes suman exactamente
+    el total redondeado a centésimas. `total` no puede ser negativo.
+    """
+    if total is None:
+        return [None] * len(weights)
+    cents = int((Decimal(str(total)) * 100).to_integral_value())
+    weight_sum = sum(weights)
+    exact = [Decimal(cents) * weight / weight_sum for weight in weights]
+    parts = [int(value) for value in exact]
+    by_remainder = sorted(range(len(weights)), key=lambda i: exact[i] - parts[i], reverse=True)
+    for i in by_remainder[:cents - sum(parts)]:
+        parts[i] += 1
+    return [Decimal(part) / 100 for part in parts]
 
-    await db.commit()
+async def create_operaciones_bulk(db: AsyncSession, bulk: OperacionBulkCreate) -> OperacionBulkResult:
+    """
+    Crea la misma operación en varias parcelas repartiendo las cantidades de
+    insumos a partes iguales o según plot_area. El stock total se valida y
+    descuenta al principio con un único bloqueo y upsert; después, un INSERT
+    multi-fila para operaciones, otro para task_inputs y otro para
+    movimientos. Un solo commit.
+    """
+    parcela_ids = list(dict.fromkeys(bulk.parcela_ids))
+    try:
+        areas = {
+            row.plot_id: row.plot_area for row in await db.execute(
+                select(Plot.plot_id, Plot.plot_area).where(Plot.plot_id.in_(parcela_ids))
+            )
+        }
+        missing = [plot_id for plot_id in parcela_ids if plot_id not in areas]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Parcelas no encontradas: {missing}")
+        if bulk.split == "area":
+            no_area = [plot_id for plot_id in parcela_ids if not areas[plot_id]]
+            if no_area:
+                raise HTTPException(status_code=400, detail=f"Parcelas sin superficie para el reparto: {no_area}")
+            weights = [Decimal(str(areas[plot_id])) for plot_id in parcela_ids]
+        else:
+            weights = [Decimal(1)] * len(parcela_ids)
+
+        # Mismas reglas que consume_inputs: lo usado es una salida positiva
+        # con almacén y lo planificado no puede ser negativo
+        splits = []
+        for input_data in bulk.inputs:
+            if input_data.planned_quantity is not None and input_data.planned_quantity < 0:
+                raise HTTPException(status_code=400, detail=f"La cantidad planificada del insumo {input_data.input_id} no puede ser negativa")
+            if input_data.used_quantity is not None:
+                movement_stock_delta("exit", input_data.used_quantity)
+                if input_data.warehouse_id is None:
+                    raise HTTPException(status_code=400, detail=f"Falta el almacén del insumo {input_data.input_id}")
+            splits.append((
+                input_data,
+                _split_quantity(input_data.planned_quantity, weights),
+                _split_quantity(input_data.used_quantity, weights),
+            ))
+        task_columns = (await resolve_task_columns(db, [bulk.tipo_operacion]))[bulk.tipo_operacion]
+
+        # Stock total de todas las parcelas, validado antes de escribir nada.
+        # Se descuenta la suma de las partes redondeadas, que es exactamente
+        # lo que registran los movimientos
+        await apply_stock_deltas(db, aggregate_stock_deltas(
+            (input_data.input_id, input_data.warehouse_id, -part)
+            for input_data, _, used in splits
+            for part in used if part
+        ))
+
+        operation_ids = (await db.execute(
+            insert(Operacion).returning(Operacion.id, sort_by_parameter_order=True),
+            [
+                {
+                    "parcela_id": plot_id,
+                    "tipo_operacion": bulk.tipo_operacion,
+                    "fecha_inicio": bulk.fecha_inicio,
+                    "fecha_fin": bulk.fecha_fin,
+                    "estado": bulk.estado,
+                    "responsable_id": bulk.responsable_id,
+                    "nota": bulk.nota,
+                    "comentario": bulk.comentario,
+                    **task_columns,
+                }
+                for plot_id in parcela_ids
+            ]
+        )).scalars().all()
+
+        task_inputs, movements = [], []
+        now = datetime.now()
+        for input_data, planned, used in splits:
+            for operation_id, planned_part, used_part in zip(operation_ids, planned, used):
+                task_inputs.append({
+                    "operation_id": operation_id,
+                    "input_id": input_data.input_id,
+                    "warehouse_id": input_data.warehouse_id,
+                    "planned_quantity": planned_part,
+                    "used_quantity": used_part,
+                    "status": input_data.status,
+                })
+                if used_part:
+                    movements.append({
+                        "movement_date": now,
+                        "input_id": input_data.input_id,
+                        "warehouse_id": input_data.warehouse_id,
+                        "movement_type": "exit",
+                        "quantity": used_part,
+                        "operation_id": operation_id,
+                        "comments": f"Consumo de insumo para operación {operation_id}",
+                    })
+        if task_inputs:
+            await db.execute(insert(TaskInput), task_inputs)
+        if movements:
+            result = await db.execute(
+                insert(InventoryMovement).returning(*VALUATION_COLUMNS, sort_by_parameter_order=True), movements
+            )
+            await record_movement_valuation(db, result.all())
+        await db.commit()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        logging.exception("Error al crear operaciones en bloque")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al crear operaciones en bloque: {str(e)}")
+
+    return OperacionBulkResult(
+        operation_ids=list(operation_ids),
+        parcela_ids=parcela_ids,
+        task_inputs=len(task_inputs),
+        movements=len(movements)
+    )
+
+def _resolve_input_keys(
+    existing: Dict[Tuple[int, Optional[int]], List[TaskInput]],
+    inputs_data: List[TaskInputUpdate]
+) -> Dict[Tuple[int, Optional[int]], Dict[str, Any]]:
+    """
+    Agrupa la lista nueva por (input_id, warehouse_id). Un insumo sin almacén
+    toma el que ya tiene en la operación; uno nuevo con cantidad usada debe
+    indicarlo.
+    """
+    warehouses_by_input: Dict[int, set] = {}
+    for input_id, warehouse_id in existing:
+        warehouses_by_input.setdefault(input_id, set()).add(warehouse_id)
+
+    wanted: Dict[Tuple[int, Optional[int]], Dict[str, Any]] = {}
+    for item in inputs_data:
+        warehouse_id = item.warehouse_id
+        if warehouse_id is None:
+            known = warehouses_by_input.get(item.input_id, set())
+            if len(known) > 1:
+                raise HTTPException(status_code=400, detail=f"Indique el almacén del insumo {item.input_id}: figura en varios")
+            if known:
+                warehouse_id = next(iter(known))
+            elif item.used_quantity:
+                raise HTTPException(status_code=400, detail=f"Falta el almacén del insumo {item.input_id}")
+        entry = wanted.setdefault((item.input_id, warehouse_id), {"used_quantity": Decimal(0), "planned_quantity": None})
+        entry["used_quantity"] += Decimal(str(item.used_quantity))
+        if item.planned_quantity is not None:
+            entry["planned_quantity"] = (entry["planned_quantity"] or Decimal(0)) + Decimal(str(item.planned_quantity))
+    return wanted
+
+async def update_operacion_inputs(
+    db: AsyncSession,
+    operacion_id: int,
+    inputs_data: List[TaskInputUpdate]
+) -> OperacionInputsUpdateResult:
+    """
+    Reemplaza los insumos de una operación aplicando solo la diferencia por
+    (input_id, warehouse_id): INSERT de los nuevos, UPDATE por lotes de los
+    que cambian y DELETE de los que ya no están. La variación de cantidad
+    usada se compensa en stock (salida si aumenta, entrada si disminuye) con
+    un único upsert de saldos y un INSERT multi-fila de movimientos. Todo en
+    una transacción; si falta stock no se cambia nada (409).
+    """
+    result = OperacionInputsUpdateResult()
+    try:
+        # Serializa ediciones concurrentes de la misma operación
+        locked = await db.scalar(select(Operacion.id).where(Operacion.id == operacion_id).with_for_update())
+        if locked is None:
+            raise HTTPException(status_code=404, detail="Operacion not found")
+
+        current = (await db.execute(
+            select(TaskInput).where(TaskInput.operation_id == operacion_id).order_by(TaskInput.id)
+        )).scalars().all()
+        existing: Dict[Tuple[int, Optional[int]], List[TaskInput]] = {}
+        for task_input in current:
+            existing.setdefault((task_input.input_id, task_input.warehouse_id), []).append(task_input)
+        wanted = _resolve_input_keys(existing, inputs_data)
+
+        now = datetime.now()
+        inserts, updates, deleted_ids, stock_lines = [], [], [], []
+        for key in sorted(set(existing) | set(wanted), key=lambda k: (k[0], k[1] if k[1] is not None else -1)):
+            rows = existing.get(key, [])
+            old_used = sum((Decimal(str(r.used_quantity or 0)) for r in rows), Decimal(0))
+            new = wanted.get(key)
+            new_used = new["used_quantity"] if new else Decimal(0)
+            # Filas antiguas sin almacén nunca descontaron stock: no se compensan
+            if new_used != old_used and key[1] is not None:
+                stock_lines.append((key[0], key[1], old_used - new_used))
+
+            if new is None:
+                deleted_ids.extend(r.id for r in rows)
+                continue
+            status = "used" if new_used else "planned"
+            if not rows:
+                inserts.append({
+                    "operation_id": operacion_id,
+                    "input_id": key[0],
+                    "warehouse_id": key[1],
+                    "planned_quantity": new["planned_quantity"],
+                    "used_quantity": new_used,
+                    "status": status,
+                })
+                continue
+            # Duplicados de un mismo par: la primera fila concentra la cantidad
+            keep, extra = rows[0], rows[1:]
+            deleted_ids.extend(r.id for r in extra)
+            planned = new["planned_quantity"] if new["planned_quantity"] is not None else keep.planned_quantity
+            if extra or keep.used_quantity != new_used or keep.planned_quantity != planned or keep.status != status:
+                updates.append({
+                    "id": keep.id,
+                    "used_quantity": new_used,
+                    "planned_quantity": planned,
+                    "status": status,
+                    "updated_at": now,
+                })
+
+        deltas = aggregate_stock_deltas(stock_lines)
+        await apply_stock_deltas(db, deltas)
+        if deltas:
+            movements = await db.execute(
+                insert(InventoryMovement).returning(*VALUATION_COLUMNS, sort_by_parameter_order=True),
+                [
+                    {
+                        "movement_date": now,
+                        "input_id": input_id,
+                        "warehouse_id": warehouse_id,
+                        "movement_type": "exit" if delta < 0 else "entry",
+                        "quantity": abs(delta),
+                        "operation_id": operacion_id,
+                        "comments": (
+                            f"Ajuste de consumo de insumo en operación {operacion_id}" if delta < 0
+                            else f"Devolución de insumo de operación {operacion_id}"
+                        ),
+                    }
+                    for (input_id, warehouse_id), delta in sorted(deltas.items())
+                ]
+            )
+            await record_movement_valuation(db, movements.all())
+
+        if deleted_ids:
+            await db.execute(delete(TaskInput).where(TaskInput.id.in_(deleted_ids)))
+        if updates:
+            await db.execute(update(TaskInput), updates)
+        if inserts:
+            await db.execute(insert(TaskInput), inserts)
+        await db.commit()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        logging.exception("Error al actualizar los insumos de la operación")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al actualizar los insumos de la operación: {str(e)}")
+
+    result.inserted = len(inserts)
+    result.updated = len(updates)
+    result.deleted = len(deleted_ids)
+    result.movements = len(deltas)
+    return result
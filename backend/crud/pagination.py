@@ -0,0 +1,54 @@
+from fastapi import HTTPException
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Optional
+import base64
+import json
+
+# Paginación por cursor (keyset): el cursor codifica los valores de la clave
+# de orden de la última fila devuelta, y la página siguiente se pide con
+# WHERE (k1, k2) > (v1, v2), que usa el índice sin recorrer las filas previas.
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Tipo no serializable en cursor: {type(value).__name__}")
+
+def encode_cursor(*values: Any) -> str:
+    """Codifica los valores de la clave de orden en un cursor opaco."""
+    raw = json.dumps(list(values), default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    """
+    Decodifica un cursor generado por encode_cursor. Devuelve None si no hay
+    cursor y responde 400 si está mal formado o no tiene `size` valores.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return values
+
+def parse_cursor_datetime(value: Any) -> datetime:
+    """Convierte el valor ISO guardado en un cursor a datetime (400 si no es válido)."""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def parse_cursor_date(value: Any) -> Optional[date]:
+    """Como parse_cursor_datetime para fechas; None se conserva (clave nula)."""
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
@@ -0,0 +1,104 @@
+import math
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de generación de teselas (compartidos con ST_AsMVTGeom)
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+MAX_ZOOM = 22
+
+Bounds = Tuple[float, float, float, float]
+
+def lonlat_to_tile_fraction(lon: float, lat: float, z: int) -> Tuple[float, float]:
+    """Convierte lon/lat (EPSG:4326) a coordenadas fraccionarias de tesela XYZ."""
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    n = 2 ** z
+    x = (lon + 180.0) / 360.0 * n
+    lat_rad = math.radians(lat)
+    y = (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n
+    return x, y
+
+def tiles_for_bounds(bounds: Bounds, z: int) -> Iterable[Tuple[int, int]]:
+    """
+    Devuelve las teselas (x, y) del nivel z que cubren un bbox lon/lat,
+    incluido el margen que ST_AsMVTGeom dibuja fuera de cada tesela.
+    """
+    minx, miny, maxx, maxy = bounds
+    margin = TILE_BUFFER / TILE_EXTENT
+    x0, y0 = lonlat_to_tile_fraction(minx, maxy, z)
+    x1, y1 = lonlat_to_tile_fraction(maxx, miny, z)
+    last = 2 ** z - 1
+    for x in range(max(int(x0 - margin), 0), min(int(x1 + margin), last) + 1):
+        for y in range(max(int(y0 - margin), 0), min(int(y1 + margin), last) + 1):
+            yield x, y
+
+class PlotTileCache:
+    """
+    Caché LRU en memoria de teselas vectoriales de parcelas.
+    Las entradas se indexan por (z, x, y) y por la combinación de filtros,
+    de modo que una edición solo invalida las teselas que toca su geometría.
+    Cada invalidación incrementa una generación: una tesela renderizada con
+    una instantánea anterior a la edición no se guarda si la generación
+    cambió mientras se generaba.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._tiles: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Generación actual; leerla antes de la consulta y pasarla a set()."""
+        with self._lock:
+            return self._generation
+
+    def get(self, z: int, x: int, y: int, filters: tuple) -> Optional[bytes]:
+        key = (z, x, y, filters)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+            return tile
+
+    def set(self, z: int, x: int, y: int, filters: tuple, tile: bytes, generation: Optional[int] = None) -> bool:
+        """Guarda la tesela salvo que se haya invalidado algo desde `generation`."""
+        key = (z, x, y, filters)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._tiles[key] = tile
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_entries:
+                self._tiles.popitem(last=False)
+            return True
+
+    def invalidate_bounds(self, *bounds_list: Optional[Bounds]) -> int:
+        """Elimina las teselas cacheadas que intersectan alguno de los bbox dados."""
+        bounds_list = [b for b in bounds_list if b is not None]
+        if not bounds_list:
+            return 0
+        with self._lock:
+            self._generation += 1
+            zooms = {key[0] for key in self._tiles}
+            affected = set()
+            for z in zooms:
+                for bounds in bounds_list:
+                    affected.update((z, x, y) for x, y in tiles_for_bounds(bounds, z))
+            stale = [key for key in self._tiles if key[:3] in affected]
+            for key in stale:
+                del self._tiles[key]
+        logger.debug(f"Teselas invalidadas: {len(stale)}")
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._tiles.clear()
+
+tile_cache = PlotTileCache()
@@ -0,0 +1,62 @@
+import asyncio
+from typing import List, Set
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Eventos pendientes de una sesión: se publican solo si la transacción hace
+# commit, así los clientes nunca ven una alerta que terminó en rollback.
+PENDING_KEY = "stock_alert_events"
+
+# Evento que pide al cliente recargar la lista completa (su cola se llenó)
+RESYNC = {"action": "resync"}
+
+class StockAlertBroker:
+    """
+    Reparte los cambios de alertas de stock a los clientes SSE conectados.
+    Cada suscriptor tiene una cola acotada; si se llena, se vacía y recibe
+    un evento resync para volver a pedir el estado completo. Vive en el
+    proceso (la app corre con un solo worker de uvicorn).
+    """
+
+    def __init__(self, max_queue: int = 1000):
+        self.max_queue = max_queue
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def publish(self, events: List[dict]) -> None:
+        for queue in list(self._subscribers):
+            for item in events:
+                try:
+                    queue.put_nowait(item)
+                except asyncio.QueueFull:
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(RESYNC)
+                    break
+
+alert_broker = StockAlertBroker()
+
+def queue_alert_events(session: Session, events: List[dict]) -> None:
+    """Deja eventos pendientes en la sesión; se publican en su próximo commit."""
+    if events:
+        session.info.setdefault(PENDING_KEY, []).extend(events)
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    events = session.info.pop(PENDING_KEY, None)
+    if events:
+        alert_broker.publish(events)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(PENDING_KEY, None)
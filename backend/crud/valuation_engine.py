@@ -0,0 +1,146 @@
+from collections import deque
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Motor de costes de la valoración de inventario. Solo depende de la
+# biblioteca estándar para que lo compartan crud_valuation y la migración
+# que carga las tablas de valoración con el historial.
+
+ZERO = Decimal(0)
+
+class CostLayer:
+    """Capa FIFO: una entrada con su costo unitario y la cantidad que queda."""
+    __slots__ = ("id", "movement_id", "received_at", "unit_cost", "original_quantity", "remaining_quantity")
+
+    def __init__(self, id, movement_id, received_at, unit_cost, original_quantity, remaining_quantity):
+        self.id = id
+        self.movement_id = movement_id
+        self.received_at = received_at
+        self.unit_cost = unit_cost
+        self.original_quantity = original_quantity
+        self.remaining_quantity = remaining_quantity
+
+class CostState:
+    """
+    Valoración de un par (input, warehouse) a costo promedio ponderado y FIFO.
+    Cada movimiento se aplica en O(1) amortizado: una entrada abre una capa y
+    una salida consume capas desde la más antigua, y cada capa se consume
+    una sola vez.
+    """
+
+    def __init__(self, quantity=ZERO, average_value=ZERO, fifo_value=ZERO, layers: Iterable[CostLayer] = ()):
+        self.quantity = Decimal(quantity)
+        self.average_value = Decimal(average_value)
+        self.fifo_value = Decimal(fifo_value)
+        self.layers = deque(layers)
+        self.new_layers: List[CostLayer] = []
+        self.touched_layers: Dict[int, CostLayer] = {}
+        self.last_movement_id: Optional[int] = None
+
+    @property
+    def average_cost(self) -> Decimal:
+        return self.average_value / self.quantity if self.quantity > 0 else ZERO
+
+    def receive(self, movement_id: Optional[int], received_at: Optional[datetime], quantity: Decimal, unit_cost: Decimal) -> None:
+        self.quantity += quantity
+        self.average_value += quantity * unit_cost
+        self.fifo_value += quantity * unit_cost
+        layer = CostLayer(None, movement_id, received_at, unit_cost, quantity, quantity)
+        self.layers.append(layer)
+        self.new_layers.append(layer)
+
+    def issue(self, quantity: Decimal) -> None:
+        average_cost = self.average_cost
+        self.quantity -= quantity
+        self.average_value -= quantity * average_cost
+
+        pending = quantity
+        fifo_cost = ZERO
+        while pending > 0 and self.layers:
+            layer = self.layers[0]
+            taken = min(layer.remaining_quantity, pending)
+            layer.remaining_quantity -= taken
+            pending -= taken
+            fifo_cost += taken * layer.unit_cost
+            if layer.id is not None:
+                self.touched_layers[layer.id] = layer
+            if layer.remaining_quantity <= 0:
+                self.layers.popleft()
+        # Salidas sin capas que las cubran (stock anterior a la valoración)
+        fifo_cost += pending * average_cost
+        self.fifo_value -= fifo_cost
+
+        if self.quantity <= 0:
+            self.average_value = ZERO
+            self.fifo_value = ZERO
+
+    def apply(self, movement, fallback_price: Optional[Decimal]) -> None:
+        """Aplica un movimiento (entry, exit o adjustment con signo) al estado."""
+        quantity = Decimal(str(movement.quantity))
+        delta = -quantity if movement.movement_type == "exit" else quantity
+        if delta > 0:
+            if movement.unit_price is not None:
+                unit_cost = Decimal(str(movement.unit_price))
+            elif self.quantity > 0:
+                unit_cost = self.average_cost
+            else:
+                unit_cost = fallback_price or ZERO
+            self.receive(movement.id, movement.movement_date, delta, unit_cost)
+        elif delta < 0:
+            self.issue(-delta)
+        self.last_movement_id = movement.id
+
+def valuation_row(key: Tuple[int, int], state: CostState) -> dict:
+    return {
+        "input_id": key[0],
+        "warehouse_id": key[1],
+        "quantity": state.quantity,
+        "average_value": state.average_value,
+        "fifo_value": state.fifo_value,
+        "last_movement_id": state.last_movement_id,
+        "updated_at": datetime.now(),
+    }
+
+def layer_row(key: Tuple[int, int], layer: CostLayer) -> dict:
+    return {
+        "input_id": key[0],
+        "warehouse_id": key[1],
+        "movement_id": layer.movement_id,
+        "received_at": layer.received_at,
+        "unit_cost": layer.unit_cost,
+        "original_quantity": layer.original_quantity,
+        "remaining_quantity": layer.remaining_quantity,
+    }
+
+class LedgerReplay:
+    """
+    Recorre movimientos ordenados por (input_id, warehouse_id, movement_date,
+    id) y acumula la fila de valoración y las capas abiertas de cada par.
+    Solo guarda el estado del par en curso; llamar a finish() al terminar.
+    """
+
+    def __init__(self, prices: Dict[int, Optional[Decimal]]):
+        self.prices = prices
+        self.valuations: List[dict] = []
+        self.layers: List[dict] = []
+        self.movements = 0
+        self._key: Optional[Tuple[int, int]] = None
+        self._state: Optional[CostState] = None
+
+    def apply(self, movement) -> None:
+        key = (movement.input_id, movement.warehouse_id)
+        if key != self._key:
+            self.finish()
+            self._key, self._state = key, CostState()
+        self._state.apply(movement, self.prices.get(movement.input_id))
+        self.movements += 1
+
+    def finish(self) -> None:
+        if self._state is None:
+            return
+        self.valuations.append(valuation_row(self._key, self._state))
+        self.layers.extend(
+            layer_row(self._key, layer) for layer in self._state.layers if layer.remaining_quantity > 0
+        )
+        self._key, self._state = None, None
@@ -0,0 +1,39 @@
+"""
+Importación masiva de parcelas desde la línea de comandos.
+
+Uso (desde la raíz del proyecto):
+    python -m backend.import_plots parcelas.geojson
+    python -m backend.import_plots finca.kml --format kml --batch-size 200
+"""
+import argparse
+import asyncio
+import json
+import sys
+from .database import SessionLocal
+from .crud.crud_plot_import import import_plots, detect_import_format, IMPORT_FORMATS, IMPORT_BATCH_SIZE
+
+async def run(path: str, import_format: str, batch_size: int) -> int:
+    with open(path, "rb") as source:
+        async with SessionLocal() as db:
+            report = await import_plots(db, source, import_format, batch_size=batch_size)
+
+    for item in report.results:
+        if item.status == "error":
+            print(f"[{item.index}] {item.plot_name or '-'}: {'; '.join(item.errors)}", file=sys.stderr)
+    print(json.dumps({"total": report.total, "created": report.created, "failed": report.failed}))
+    return 1 if report.failed else 0
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Importa parcelas desde GeoJSON, KML o Shapefile (.zip)")
+    parser.add_argument("path", help="Archivo a importar")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Formato; por defecto se deduce de la extensión")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Parcelas por INSERT/commit")
+    args = parser.parse_args()
+
+    import_format = args.format or detect_import_format(args.path)
+    if import_format is None:
+        parser.error("No se pudo deducir el formato; indique --format")
+    sys.exit(asyncio.run(run(args.path, import_format, args.batch_size)))
+
+if __name__ == "__main__":
+    main()
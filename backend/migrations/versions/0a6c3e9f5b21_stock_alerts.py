@@ -0,0 +1,48 @@
+"""stock alerts
+
+Revision ID: 0a6c3e9f5b21
+Revises: f3b8d62a4e17
+Create Date: 2026-10-17 15:20:03.118264
+
+Tabla de alertas de stock activas (available_quantity < input.minimum_stock),
+mantenida por crud_stock_alerts en cada cambio de stock. Se carga aquí con
+los pares que ya están por debajo del mínimo.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6c3e9f5b21'
+down_revision: Union[str, None] = 'f3b8d62a4e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stock_alerts',
+        sa.Column('input_id', sa.Integer(), nullable=False),
+        sa.Column('warehouse_id', sa.Integer(), nullable=False),
+        sa.Column('available_quantity', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('minimum_stock', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('raised_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['input_id'], ['input.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['warehouse_id'], ['warehouse.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('input_id', 'warehouse_id'),
+    )
+    op.execute("""
+        INSERT INTO stock_alerts (input_id, warehouse_id, available_quantity, minimum_stock)
+        SELECT s.input_id, s.warehouse_id, s.available_quantity, i.minimum_stock
+        FROM input_stock s
+        JOIN input i ON i.id = s.input_id
+        WHERE i.minimum_stock IS NOT NULL
+          AND s.available_quantity < i.minimum_stock
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('stock_alerts')
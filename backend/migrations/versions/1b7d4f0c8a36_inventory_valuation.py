@@ -0,0 +1,94 @@
+"""inventory valuation
+
+Revision ID: 1b7d4f0c8a36
+Revises: 0a6c3e9f5b21
+Create Date: 2026-10-17 16:02:45.770912
+
+Tablas de valoración de inventario: stock_valuations (estado por par a
+costo promedio y FIFO) y stock_cost_layers (capas FIFO). La migración las
+carga recorriendo el libro existente con el mismo motor de costes que
+python -m backend.rebuild_valuation (crud/valuation_engine.py); desde ahí
+se mantienen de forma incremental con cada movimiento.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b7d4f0c8a36'
+down_revision: Union[str, None] = '0a6c3e9f5b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEED_CHUNK_SIZE = 5000
+
+
+def _seed_valuation(valuations: sa.Table, layers: sa.Table) -> None:
+    """Valoración inicial desde el libro, en orden de fecha por par."""
+    from crud.valuation_engine import LedgerReplay
+
+    bind = op.get_bind()
+    prices = dict(bind.execute(sa.text("SELECT id, unit_price FROM input")).all())
+    replay = LedgerReplay(prices)
+    movements = bind.execute(
+        sa.text(
+            "SELECT id, input_id, warehouse_id, movement_type, quantity, unit_price, movement_date "
+            "FROM inventory_movements "
+            "WHERE input_id IS NOT NULL AND warehouse_id IS NOT NULL "
+            "ORDER BY input_id, warehouse_id, movement_date, id"
+        ).execution_options(yield_per=SEED_CHUNK_SIZE)
+    )
+    for movement in movements:
+        replay.apply(movement)
+    replay.finish()
+
+    for start in range(0, len(replay.valuations), SEED_CHUNK_SIZE):
+        op.bulk_insert(valuations, replay.valuations[start:start + SEED_CHUNK_SIZE])
+    for start in range(0, len(replay.layers), SEED_CHUNK_SIZE):
+        op.bulk_insert(layers, replay.layers[start:start + SEED_CHUNK_SIZE])
+
+
+def upgrade() -> None:
+    valuations = op.create_table(
+        'stock_valuations',
+        sa.Column('input_id', sa.Integer(), nullable=False),
+        sa.Column('warehouse_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Numeric(precision=14, scale=2), nullable=False, server_default='0'),
+        sa.Column('average_value', sa.Numeric(precision=16, scale=4), nullable=False, server_default='0'),
+        sa.Column('fifo_value', sa.Numeric(precision=16, scale=4), nullable=False, server_default='0'),
+        sa.Column('last_movement_id', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['input_id'], ['input.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['warehouse_id'], ['warehouse.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('input_id', 'warehouse_id'),
+    )
+    layers = op.create_table(
+        'stock_cost_layers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('input_id', sa.Integer(), nullable=False),
+        sa.Column('warehouse_id', sa.Integer(), nullable=False),
+        sa.Column('movement_id', sa.Integer(), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=True),
+        sa.Column('unit_cost', sa.Numeric(precision=14, scale=4), nullable=False),
+        sa.Column('original_quantity', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('remaining_quantity', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['input_id'], ['input.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['warehouse_id'], ['warehouse.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['movement_id'], ['inventory_movements.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_stock_cost_layers_open', 'stock_cost_layers',
+        ['input_id', 'warehouse_id', 'received_at', 'id'],
+        postgresql_where=sa.text('remaining_quantity > 0')
+    )
+    _seed_valuation(valuations, layers)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stock_cost_layers_open', table_name='stock_cost_layers')
+    op.drop_table('stock_cost_layers')
+    op.drop_table('stock_valuations')
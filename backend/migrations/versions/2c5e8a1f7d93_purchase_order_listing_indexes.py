@@ -0,0 +1,51 @@
+"""purchase order listing indexes
+
+Revision ID: 2c5e8a1f7d93
+Revises: 1b7d4f0c8a36
+Create Date: 2026-10-17 18:12:40.218337
+
+Listado de órdenes de compra paginado por cursor (GET /inventory/purchase-orders/):
+- order_date pasa a NOT NULL (las filas sin fecha toman created_at), ya que
+  la clave del cursor es (order_date, id).
+- Índices terminados en (order_date, id) para el listado sin filtro y por
+  proveedor o estado, y purchase_order_details(order_id, id) para cargar las
+  líneas de toda la página con un único order_id = ANY(...).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c5e8a1f7d93'
+down_revision: Union[str, None] = '1b7d4f0c8a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("ix_purchase_orders_date_id", "purchase_orders", "(order_date, id)"),
+    ("ix_purchase_orders_supplier_date_id", "purchase_orders", "(supplier_id, order_date, id)"),
+    ("ix_purchase_orders_status_date_id", "purchase_orders", "(status, order_date, id)"),
+    ("ix_purchase_order_details_order_id", "purchase_order_details", "(order_id, id)"),
+)
+
+
+def upgrade() -> None:
+    op.execute("""
+        UPDATE purchase_orders
+        SET order_date = coalesce(created_at, now())
+        WHERE order_date IS NULL
+    """)
+    op.alter_column('purchase_orders', 'order_date', nullable=False)
+
+    with op.get_context().autocommit_block():
+        for name, table, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    op.alter_column('purchase_orders', 'order_date', nullable=True)
@@ -0,0 +1,51 @@
+"""operaciones listing indexes
+
+Revision ID: 3d9f1b6e2a58
+Revises: 2c5e8a1f7d93
+Create Date: 2026-10-17 19:05:22.731904
+
+Listado de operaciones paginado por cursor (GET /operaciones/page y las
+variantes /vineyard/page y /winery/page). La clave de orden es
+(coalesce(fecha_inicio, '-infinity'), id) para que las operaciones sin
+fecha tengan un lugar fijo; cada filtro soportado tiene un índice que
+termina en esa clave, de modo que filtro + orden + cursor son un único
+recorrido de índice. task_inputs(operation_id) sirve la carga de insumos
+de una página con un solo IN (...).
+
+Los índices se crean CONCURRENTLY para no bloquear las escrituras.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d9f1b6e2a58'
+down_revision: Union[str, None] = '2c5e8a1f7d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FECHA_KEY = "coalesce(fecha_inicio, '-infinity'::date)"
+
+INDEXES = (
+    ("ix_operaciones_fecha_id", "operaciones", f"({FECHA_KEY}, id)"),
+    ("ix_operaciones_parcela_fecha_id", "operaciones", f"(parcela_id, {FECHA_KEY}, id)"),
+    ("ix_operaciones_tipo_fecha_id", "operaciones", f"(tipo_operacion, {FECHA_KEY}, id)"),
+    ("ix_operaciones_estado_fecha_id", "operaciones", f"(estado, {FECHA_KEY}, id)"),
+    ("ix_operaciones_responsable_fecha_id", "operaciones", f"(responsable_id, {FECHA_KEY}, id)"),
+    ("ix_task_inputs_operation_id", "task_inputs", "(operation_id)"),
+)
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+        op.execute("ANALYZE operaciones")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,71 @@
+"""operaciones task denormalization
+
+Revision ID: 4e2a7c9d1f64
+Revises: 3d9f1b6e2a58
+Create Date: 2026-10-17 19:48:37.409126
+
+operaciones.task_list_id y operaciones.task_type, copiados de task_list,
+para que los listados de viñedo/bodega filtren con un predicado indexado
+(task_type, fecha, id) en lugar de unir por task_name.
+
+El esquema se cambia sin reescribir la tabla:
+- columnas nulables sin valor por defecto y clave foránea NOT VALID: solo
+  catálogo, pero ADD COLUMN toma ACCESS EXCLUSIVE sobre operaciones hasta
+  el commit de esa primera transacción, que no lee filas y es breve;
+- VALIDATE CONSTRAINT va en su propia transacción (autocommit_block), ya
+  liberado ese bloqueo; toma SHARE UPDATE EXCLUSIVE, que no bloquea
+  lecturas ni escrituras mientras recorre la tabla;
+- índices CONCURRENTLY.
+
+Los datos NO se copian aquí. Tras el upgrade hay que ejecutar, por bloques
+con commit propio:
+
+    python -m backend.backfill_operaciones_task
+
+Hasta que termine, los listados por task_type también resuelven las filas
+con task_type NULL uniendo por task_name (task_type_condition).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e2a7c9d1f64'
+down_revision: Union[str, None] = '3d9f1b6e2a58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FECHA_KEY = "coalesce(fecha_inicio, '-infinity'::date)"
+
+INDEXES = (
+    ("ix_operaciones_task_type_fecha_id", f"(task_type, {FECHA_KEY}, id)"),
+    ("ix_operaciones_task_list_id", "(task_list_id)"),
+)
+
+
+def upgrade() -> None:
+    op.add_column('operaciones', sa.Column('task_list_id', sa.Integer(), nullable=True))
+    op.add_column('operaciones', sa.Column('task_type', sa.String(), nullable=True))
+    op.execute("""
+        ALTER TABLE operaciones
+        ADD CONSTRAINT operaciones_task_list_id_fkey
+        FOREIGN KEY (task_list_id) REFERENCES task_list (task_list_id) NOT VALID
+    """)
+
+    # autocommit_block confirma la transacción anterior (y su ACCESS
+    # EXCLUSIVE) antes de validar
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE operaciones VALIDATE CONSTRAINT operaciones_task_list_id_fkey")
+        for name, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON operaciones {definition}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    op.drop_constraint('operaciones_task_list_id_fkey', 'operaciones', type_='foreignkey')
+    op.drop_column('operaciones', 'task_type')
+    op.drop_column('operaciones', 'task_list_id')
@@ -0,0 +1,46 @@
+"""plot geom gist index
+
+Revision ID: 5c1e9a7d2f40
+Revises: b0040951e96e
+Create Date: 2026-10-17 09:12:31.402118
+
+Índice GiST sobre plot.plot_geom para las consultas por ventana visible
+(GET /plots/?bbox=...) y las teselas vectoriales. GeoAlchemy2 lo crea con
+create_all en bases nuevas; esta migración lo asegura en las existentes.
+
+Comprobación tras aplicar la migración:
+
+    EXPLAIN SELECT plot_id FROM plot
+    WHERE ST_Intersects(plot_geom, ST_MakeEnvelope(-68.9, -33.1, -68.7, -32.9, 4326));
+
+Forma esperada del plan (el índice filtra por && y ST_Intersects solo
+recheck sobre los candidatos):
+
+    Bitmap Heap Scan on plot
+      Filter: st_intersects(plot_geom, '0103000020E6...'::geometry)
+      ->  Bitmap Index Scan on idx_plot_plot_geom
+            Index Cond: (plot_geom && '0103000020E6...'::geometry)
+
+Si el plan muestra "Seq Scan on plot", el índice no existe o las
+estadísticas están desactualizadas (ejecutar ANALYZE plot).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e9a7d2f40'
+down_revision: Union[str, None] = 'b0040951e96e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS idx_plot_plot_geom ON plot USING gist (plot_geom)")
+    op.execute("ANALYZE plot")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_plot_plot_geom")
@@ -0,0 +1,48 @@
+"""operaciones periodo gist
+
+Revision ID: 5f8b3d0e6c72
+Revises: 4e2a7c9d1f64
+Create Date: 2026-10-17 20:21:09.554830
+
+Índice GiST sobre el periodo de cada operación para el calendario
+(GET /operaciones/calendar): daterange cerrado entre la menor y la mayor de
+fecha_inicio/fecha_fin (least/greatest ignoran NULL, así una operación con
+una sola fecha es un día, y un fin anterior al inicio no rompe el rango).
+Parcial: las operaciones sin ninguna fecha no están en el calendario.
+
+Comprobación:
+
+    EXPLAIN SELECT id FROM operaciones
+    WHERE (fecha_inicio IS NOT NULL OR fecha_fin IS NOT NULL)
+      AND daterange(least(fecha_inicio, fecha_fin), greatest(fecha_inicio, fecha_fin), '[]')
+          && daterange('2025-09-01', '2026-04-30', '[]');
+
+    Bitmap Heap Scan on operaciones
+      ->  Bitmap Index Scan on ix_operaciones_periodo
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f8b3d0e6c72'
+down_revision: Union[str, None] = '4e2a7c9d1f64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_operaciones_periodo ON operaciones
+            USING gist (daterange(least(fecha_inicio, fecha_fin), greatest(fecha_inicio, fecha_fin), '[]'))
+            WHERE fecha_inicio IS NOT NULL OR fecha_fin IS NOT NULL
+        """)
+        op.execute("ANALYZE operaciones")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_operaciones_periodo")
@@ -0,0 +1,42 @@
+"""plot simplified geometries
+
+Revision ID: 8f3b6d21c9e7
+Revises: 5c1e9a7d2f40
+Create Date: 2026-10-17 10:03:54.218640
+
+Columnas generadas con ST_SimplifyPreserveTopology a tres tolerancias.
+Al ser STORED, PostgreSQL las recalcula cada vez que cambia plot_geom.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from geoalchemy2 import Geometry
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3b6d21c9e7'
+down_revision: Union[str, None] = '5c1e9a7d2f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LEVELS = (
+    ('plot_geom_low', '0.001'),
+    ('plot_geom_medium', '0.0001'),
+    ('plot_geom_high', '0.00001'),
+)
+
+
+def upgrade() -> None:
+    for column, tolerance in LEVELS:
+        op.add_column('plot', sa.Column(
+            column,
+            Geometry(geometry_type='POLYGON', srid=4326, spatial_index=False),
+            sa.Computed(f'ST_SimplifyPreserveTopology(plot_geom, {tolerance})', persisted=True),
+            nullable=True
+        ))
+
+
+def downgrade() -> None:
+    for column, _ in reversed(LEVELS):
+        op.drop_column('plot', column)
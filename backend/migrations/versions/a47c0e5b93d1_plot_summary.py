@@ -0,0 +1,57 @@
+"""plot summary
+
+Revision ID: a47c0e5b93d1
+Revises: 8f3b6d21c9e7
+Create Date: 2026-10-17 11:20:07.551932
+
+Tabla plot_summary para GET /plots/statistics/summary. crud_plot la mantiene
+con deltas en cada alta, modificación, archivo o borrado de parcela; aquí
+solo se crea y se carga con las parcelas activas existentes.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a47c0e5b93d1'
+down_revision: Union[str, None] = '8f3b6d21c9e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS plot_summary (
+            dimension VARCHAR(30) NOT NULL,
+            value VARCHAR NOT NULL,
+            plot_count INTEGER NOT NULL DEFAULT 0,
+            total_area NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value)
+        )
+    """)
+    op.execute("DELETE FROM plot_summary")
+    op.execute("""
+        INSERT INTO plot_summary (dimension, value, plot_count, total_area)
+        SELECT dimension, value, count(*), sum(area)
+        FROM (
+            SELECT 'variety' AS dimension, coalesce(plot_var, '') AS value, coalesce(plot_area, 0) AS area FROM plot WHERE active
+            UNION ALL
+            SELECT 'rootstock', coalesce(plot_rootstock, ''), coalesce(plot_area, 0) FROM plot WHERE active
+            UNION ALL
+            SELECT 'conduction', coalesce(plot_conduction::varchar, ''), coalesce(plot_area, 0) FROM plot WHERE active
+            UNION ALL
+            SELECT 'management', coalesce(plot_management::varchar, ''), coalesce(plot_area, 0) FROM plot WHERE active
+            UNION ALL
+            SELECT 'implant_year', coalesce(plot_implant_year::varchar, ''), coalesce(plot_area, 0) FROM plot WHERE active
+            UNION ALL
+            SELECT 'total', '', coalesce(plot_area, 0) FROM plot WHERE active
+        ) AS contributions
+        GROUP BY dimension, value
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('plot_summary')
@@ -0,0 +1,65 @@
+"""atomic stock movements
+
+Revision ID: c2d8f4a61b05
+Revises: a47c0e5b93d1
+Create Date: 2026-10-17 12:41:18.907326
+
+- Una sola fila de input_stock por (input_id, warehouse_id), requisito del
+  upsert atómico de crud_inventory.apply_stock_delta. Los duplicados
+  existentes se fusionan sumando sus saldos.
+- check_single_reference pasa a "como máximo una referencia", de modo que
+  los movimientos sin operación ni actividad (recuentos, recepciones) sean
+  válidos, como ya indicaba el comentario del modelo.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2d8f4a61b05'
+down_revision: Union[str, None] = 'a47c0e5b93d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        UPDATE input_stock s
+        SET available_quantity = d.total, last_update = now()
+        FROM (
+            SELECT min(id) AS keep_id, sum(available_quantity) AS total
+            FROM input_stock
+            GROUP BY input_id, warehouse_id
+            HAVING count(*) > 1
+        ) d
+        WHERE s.id = d.keep_id
+    """)
+    op.execute("""
+        DELETE FROM input_stock s
+        USING input_stock k
+        WHERE s.input_id = k.input_id
+          AND s.warehouse_id = k.warehouse_id
+          AND s.id > k.id
+    """)
+    op.create_unique_constraint(
+        'uq_input_stock_input_warehouse', 'input_stock', ['input_id', 'warehouse_id']
+    )
+
+    op.drop_constraint('check_single_reference', 'inventory_movements', type_='check')
+    op.create_check_constraint(
+        'check_single_reference', 'inventory_movements',
+        'operation_id IS NULL OR vessel_activity_id IS NULL'
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('check_single_reference', 'inventory_movements', type_='check')
+    op.create_check_constraint(
+        'check_single_reference', 'inventory_movements',
+        '(operation_id IS NOT NULL AND vessel_activity_id IS NULL) OR '
+        '(operation_id IS NULL AND vessel_activity_id IS NOT NULL)'
+    )
+    op.drop_constraint('uq_input_stock_input_warehouse', 'input_stock', type_='unique')
@@ -0,0 +1,36 @@
+"""input catalog indexes
+
+Revision ID: d91e5a3c7b28
+Revises: c2d8f4a61b05
+Create Date: 2026-10-17 13:05:44.218390
+
+Índices del catálogo de insumos (GET /inventory/inputs/catalog):
+- (name, id): paginación por cursor WHERE (name, id) > (:name, :id).
+- (category_id, name, id): la misma paginación filtrada por categoría.
+- lower(name) text_pattern_ops: filtro por prefijo de nombre (LIKE 'abc%').
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd91e5a3c7b28'
+down_revision: Union[str, None] = 'c2d8f4a61b05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS ix_input_name_id ON input (name, id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_input_category_name_id ON input (category_id, name, id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_input_lower_name ON input (lower(name) text_pattern_ops)")
+    op.execute("ANALYZE input")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_input_lower_name")
+    op.execute("DROP INDEX IF EXISTS ix_input_category_name_id")
+    op.execute("DROP INDEX IF EXISTS ix_input_name_id")
@@ -0,0 +1,66 @@
+"""inventory movement history indexes
+
+Revision ID: e4a7c19d2f63
+Revises: d91e5a3c7b28
+Create Date: 2026-10-17 13:48:10.664105
+
+Historial de movimientos paginado por cursor (GET /inventory/movements/):
+- movement_date pasa a NOT NULL (las filas sin fecha toman created_at), ya
+  que la clave del cursor es (movement_date, id).
+- Un índice compuesto por filtro soportado, todos terminados en
+  (movement_date, id) para que filtro + orden + cursor sean un único
+  recorrido de índice.
+
+Los índices se crean CONCURRENTLY para no bloquear las escrituras en
+tablas grandes. Comprobación:
+
+    EXPLAIN SELECT * FROM inventory_movements
+    WHERE warehouse_id = 3 AND (movement_date, id) < ('2025-03-01', 120000)
+    ORDER BY movement_date DESC, id DESC LIMIT 101;
+
+    Limit
+      ->  Index Scan Backward using ix_inventory_movements_warehouse_date_id ...
+            Index Cond: ((warehouse_id = 3) AND (ROW(movement_date, id) < ROW(...)))
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a7c19d2f63'
+down_revision: Union[str, None] = 'd91e5a3c7b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("ix_inventory_movements_date_id", "(movement_date, id)"),
+    ("ix_inventory_movements_input_date_id", "(input_id, movement_date, id)"),
+    ("ix_inventory_movements_warehouse_date_id", "(warehouse_id, movement_date, id)"),
+    ("ix_inventory_movements_input_warehouse_date_id", "(input_id, warehouse_id, movement_date, id)"),
+    ("ix_inventory_movements_type_date_id", "(movement_type, movement_date, id)"),
+    ("ix_inventory_movements_operation_date_id", "(operation_id, movement_date, id) WHERE operation_id IS NOT NULL"),
+)
+
+
+def upgrade() -> None:
+    op.execute("""
+        UPDATE inventory_movements
+        SET movement_date = coalesce(created_at, now())
+        WHERE movement_date IS NULL
+    """)
+    op.alter_column('inventory_movements', 'movement_date', nullable=False)
+
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON inventory_movements {definition}")
+        op.execute("ANALYZE inventory_movements")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    op.alter_column('inventory_movements', 'movement_date', nullable=True)
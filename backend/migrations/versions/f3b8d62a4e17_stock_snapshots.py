@@ -0,0 +1,49 @@
+"""stock snapshots
+
+Revision ID: f3b8d62a4e17
+Revises: e4a7c19d2f63
+Create Date: 2026-10-17 14:32:57.031846
+
+Snapshots periódicos de stock por (input, warehouse) para consultar el
+saldo a una fecha pasada (GET /inventory/stocks/as-of). Las tablas se
+llenan con python -m backend.stock_snapshots o POST /inventory/stocks/snapshots.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d62a4e17'
+down_revision: Union[str, None] = 'e4a7c19d2f63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stock_snapshot_runs',
+        sa.Column('snapshot_at', sa.DateTime(), nullable=False),
+        sa.Column('period', sa.String(length=10), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.CheckConstraint("period IN ('daily', 'monthly', 'manual')", name='check_snapshot_period'),
+        sa.PrimaryKeyConstraint('snapshot_at'),
+    )
+    op.create_table(
+        'stock_snapshots',
+        sa.Column('snapshot_at', sa.DateTime(), nullable=False),
+        sa.Column('input_id', sa.Integer(), nullable=False),
+        sa.Column('warehouse_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['snapshot_at'], ['stock_snapshot_runs.snapshot_at'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['input_id'], ['input.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['warehouse_id'], ['warehouse.id']),
+        sa.PrimaryKeyConstraint('snapshot_at', 'input_id', 'warehouse_id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('stock_snapshots')
+    op.drop_table('stock_snapshot_runs')
@@ -1,6 +1,6 @@
 from geoalchemy2 import Geometry
 from .database import Base
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Numeric, Text, Boolean, CheckConstraint,DateTime
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Numeric, Text, Boolean, CheckConstraint,DateTime, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -17,11 +17,33 @@ class Operacion(Base):
     responsable_id = Column(Integer, ForeignKey("usuarios.id"))
     nota = Column(Text, nullable=True)
     comentario = Column(Text, nullable=True)
+    # Copia de task_list para filtrar por dominio sin unir por task_name
+    task_list_id = Column(Integer, ForeignKey("task_list.task_list_id"), nullable=True)
+    task_type = Column(String, nullable=True)
+
+    # Listado paginado por cursor sobre (coalesce(fecha_inicio, -infinity), id):
+    # las operaciones sin fecha quedan al final en orden descendente
+    __table_args__ = (
+        Index('ix_operaciones_fecha_id', text("coalesce(fecha_inicio, '-infinity'::date)"), 'id'),
+        Index('ix_operaciones_parcela_fecha_id', 'parcela_id', text("coalesce(fecha_inicio, '-infinity'::date)"), 'id'),
+        Index('ix_operaciones_tipo_fecha_id', 'tipo_operacion', text("coalesce(fecha_inicio, '-infinity'::date)"), 'id'),
+        Index('ix_operaciones_estado_fecha_id', 'estado', text("coalesce(fecha_inicio, '-infinity'::date)"), 'id'),
+        Index('ix_operaciones_responsable_fecha_id', 'responsable_id', text("coalesce(fecha_inicio, '-infinity'::date)"), 'id'),
+        Index('ix_operaciones_task_type_fecha_id', 'task_type', text("coalesce(fecha_inicio, '-infinity'::date)"), 'id'),
+        Index('ix_operaciones_task_list_id', 'task_list_id'),
+        # Calendario: solapamiento del periodo [inicio, fin] con una ventana
+        Index(
+            'ix_operaciones_periodo',
+            text("daterange(least(fecha_inicio, fecha_fin), greatest(fecha_inicio, fecha_fin), '[]')"),
+            postgresql_using='gist',
+            postgresql_where=text('fecha_inicio IS NOT NULL OR fecha_fin IS NOT NULL')
+        ),
+    )
 
     inputs = relationship("TaskInput", back_populates="operation")
     responsable = relationship("Usuario", back_populates="operaciones") # Relación con usuario
     plot = relationship("Plot", back_populates="operaciones")
-    task = relationship("TaskList")
+    task = relationship("TaskList", foreign_keys=[tipo_operacion])
     
 class TaskList(Base):
     __tablename__ = "task_list"
@@ -82,6 +104,11 @@ class Plot(Base):
     # Geometría y área
     plot_geom = Column(Geometry("POLYGON", srid=4326), nullable=True)
     plot_area = Column(Numeric(10, 2), Computed("ST_Area(ST_Transform(plot_geom, 3857))", persisted=True))
+
+    # Geometrías simplificadas por nivel de zoom (tolerancia en grados)
+    plot_geom_low = Column(Geometry("POLYGON", srid=4326, spatial_index=False), Computed("ST_SimplifyPreserveTopology(plot_geom, 0.001)", persisted=True))
+    plot_geom_medium = Column(Geometry("POLYGON", srid=4326, spatial_index=False), Computed("ST_SimplifyPreserveTopology(plot_geom, 0.0001)", persisted=True))
+    plot_geom_high = Column(Geometry("POLYGON", srid=4326, spatial_index=False), Computed("ST_SimplifyPreserveTopology(plot_geom, 0.00001)", persisted=True))
     
     # Propiedades calculadas
     @hybrid_property
@@ -97,6 +124,16 @@ class Plot(Base):
     #plot_management_relationship = relationship("Vineyard", foreign_keys=[plot_management], backref="plots_management")
     #plot_conduction_relationship = relationship("Vineyard", foreign_keys=[plot_conduction], backref="plots_conduction")
 
+class PlotSummary(Base):
+    __tablename__ = "plot_summary"
+
+    # Agregado de parcelas activas por dimensión (variety, rootstock, conduction,
+    # management, implant_year o total). value vacío = sin dato.
+    dimension = Column(String(30), primary_key=True)
+    value = Column(String, primary_key=True)
+    plot_count = Column(Integer, nullable=False, default=0)
+    total_area = Column(Numeric(14, 2), nullable=False, default=0)
+
 class Grapevine(Base):
     __tablename__ = "grapevines"
     
@@ -152,6 +189,13 @@ class Input(Base):
     purchase_order_details = relationship("PurchaseOrderDetail", back_populates="input")
     task_inputs = relationship("TaskInput", back_populates="inputs")
 
+    __table_args__ = (
+        # Paginación por cursor del catálogo y filtros por categoría / prefijo
+        Index('ix_input_name_id', 'name', 'id'),
+        Index('ix_input_category_name_id', 'category_id', 'name', 'id'),
+        Index('ix_input_lower_name', text('lower(name) text_pattern_ops')),
+    )
+
 class Warehouse(Base):
     __tablename__ = 'warehouse'
 
@@ -182,6 +226,7 @@ class InputStock(Base):
 
     __table_args__ = (
         CheckConstraint(available_quantity >= 0, name='check_quantity_not_negative'),
+        UniqueConstraint('input_id', 'warehouse_id', name='uq_input_stock_input_warehouse'),
     )
 
     input = relationship("Input", back_populates="stock")
@@ -191,7 +236,7 @@ class InventoryMovement(Base):
     __tablename__ = 'inventory_movements'
 
     id = Column(Integer, primary_key=True, index=True)
-    movement_date = Column(DateTime, default=func.now())
+    movement_date = Column(DateTime, default=func.now(), nullable=False)
     input_id = Column(Integer, ForeignKey('input.id', ondelete='CASCADE'))
     warehouse_id = Column(Integer, ForeignKey('warehouse.id'))
     movement_type = Column(String(50))
@@ -211,14 +256,85 @@ class InventoryMovement(Base):
     
     __table_args__ = (
         CheckConstraint(movement_type.in_(['entry', 'exit', 'adjustment']), name='check_movement_type'),
-        # Asegurar que solo uno de los dos campos esté lleno
+        # Asegurar que como máximo uno de los dos campos esté lleno
         CheckConstraint(
-            '(operation_id IS NOT NULL AND vessel_activity_id IS NULL) OR '
-            '(operation_id IS NULL AND vessel_activity_id IS NOT NULL)',
+            'operation_id IS NULL OR vessel_activity_id IS NULL',
             name='check_single_reference'
         ),
+        # Historial paginado por (movement_date, id) con cada filtro soportado
+        Index('ix_inventory_movements_date_id', 'movement_date', 'id'),
+        Index('ix_inventory_movements_input_date_id', 'input_id', 'movement_date', 'id'),
+        Index('ix_inventory_movements_warehouse_date_id', 'warehouse_id', 'movement_date', 'id'),
+        Index('ix_inventory_movements_input_warehouse_date_id', 'input_id', 'warehouse_id', 'movement_date', 'id'),
+        Index('ix_inventory_movements_type_date_id', 'movement_type', 'movement_date', 'id'),
+        Index(
+            'ix_inventory_movements_operation_date_id', 'operation_id', 'movement_date', 'id',
+            postgresql_where=text('operation_id IS NOT NULL')
+        ),
+    )
+
+class StockAlert(Base):
+    __tablename__ = 'stock_alerts'
+
+    # Alertas activas: available_quantity < minimum_stock del insumo
+    input_id = Column(Integer, ForeignKey('input.id', ondelete='CASCADE'), primary_key=True)
+    warehouse_id = Column(Integer, ForeignKey('warehouse.id', ondelete='CASCADE'), primary_key=True)
+    available_quantity = Column(Numeric(12, 2), nullable=False)
+    minimum_stock = Column(Numeric(12, 2), nullable=False)
+    raised_at = Column(DateTime, default=func.now(), nullable=False)
+
+class StockValuation(Base):
+    __tablename__ = 'stock_valuations'
+
+    # Valoración vigente por par: costo promedio ponderado y FIFO
+    input_id = Column(Integer, ForeignKey('input.id', ondelete='CASCADE'), primary_key=True)
+    warehouse_id = Column(Integer, ForeignKey('warehouse.id', ondelete='CASCADE'), primary_key=True)
+    quantity = Column(Numeric(14, 2), nullable=False, default=0)
+    average_value = Column(Numeric(16, 4), nullable=False, default=0)
+    fifo_value = Column(Numeric(16, 4), nullable=False, default=0)
+    last_movement_id = Column(Integer)
+    updated_at = Column(DateTime, default=func.now())
+
+class StockCostLayer(Base):
+    __tablename__ = 'stock_cost_layers'
+
+    # Capa FIFO abierta por una entrada; remaining_quantity baja con las salidas
+    id = Column(Integer, primary_key=True)
+    input_id = Column(Integer, ForeignKey('input.id', ondelete='CASCADE'), nullable=False)
+    warehouse_id = Column(Integer, ForeignKey('warehouse.id', ondelete='CASCADE'), nullable=False)
+    movement_id = Column(Integer, ForeignKey('inventory_movements.id', ondelete='SET NULL'))
+    received_at = Column(DateTime)
+    unit_cost = Column(Numeric(14, 4), nullable=False)
+    original_quantity = Column(Numeric(12, 2), nullable=False)
+    remaining_quantity = Column(Numeric(12, 2), nullable=False)
+
+    __table_args__ = (
+        Index(
+            'ix_stock_cost_layers_open', 'input_id', 'warehouse_id', 'received_at', 'id',
+            postgresql_where=text('remaining_quantity > 0')
+        ),
     )
 
+class StockSnapshotRun(Base):
+    __tablename__ = 'stock_snapshot_runs'
+
+    # Saldo de todos los pares (input, warehouse) con movement_date < snapshot_at
+    snapshot_at = Column(DateTime, primary_key=True)
+    period = Column(String(10), nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        CheckConstraint(period.in_(['daily', 'monthly', 'manual']), name='check_snapshot_period'),
+    )
+
+class StockSnapshot(Base):
+    __tablename__ = 'stock_snapshots'
+
+    snapshot_at = Column(DateTime, ForeignKey('stock_snapshot_runs.snapshot_at', ondelete='CASCADE'), primary_key=True)
+    input_id = Column(Integer, ForeignKey('input.id', ondelete='CASCADE'), primary_key=True)
+    warehouse_id = Column(Integer, ForeignKey('warehouse.id'), primary_key=True)
+    quantity = Column(Numeric(14, 2), nullable=False)
+
 class Supplier(Base):
     __tablename__ = 'suppliers'
 
@@ -238,7 +354,7 @@ class PurchaseOrder(Base):
     __tablename__ = 'purchase_orders'
 
     id = Column(Integer, primary_key=True, index=True)
-    order_date = Column(DateTime, default=func.now())
+    order_date = Column(DateTime, default=func.now(), nullable=False)
     supplier_id = Column(Integer, ForeignKey('suppliers.id'))
     status = Column(String(50), default='pending')
     reception_date = Column(DateTime)
@@ -249,6 +365,10 @@ class PurchaseOrder(Base):
 
     __table_args__ = (
         CheckConstraint(status.in_(['pending', 'partially_received', 'completed']), name='check_order_status'),
+        # Listado paginado por cursor (order_date, id), con y sin filtro
+        Index('ix_purchase_orders_date_id', 'order_date', 'id'),
+        Index('ix_purchase_orders_supplier_date_id', 'supplier_id', 'order_date', 'id'),
+        Index('ix_purchase_orders_status_date_id', 'status', 'order_date', 'id'),
     )
 
     supplier = relationship("Supplier", back_populates="purchase_orders")
@@ -267,6 +387,10 @@ class PurchaseOrderDetail(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index('ix_purchase_order_details_order_id', 'order_id', 'id'),
+    )
+
     order = relationship("PurchaseOrder", back_populates="details")
     input = relationship("Input", back_populates="purchase_order_details")
 
@@ -285,6 +409,7 @@ class TaskInput(Base):
 
     __table_args__ = (
         CheckConstraint(status.in_(['planned', 'used']), name='check_task_input_status'),
+        Index('ix_task_inputs_operation_id', 'operation_id'),
     )
 
     inputs = relationship("Input", back_populates="task_inputs")
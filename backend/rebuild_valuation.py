@@ -0,0 +1,24 @@
+"""
+Reconstrucción completa de la valoración de inventario (promedio y FIFO)
+desde el libro de movimientos. La migración ya carga la valoración y los
+movimientos con fecha pasada recalculan su par al registrarse; sirve para
+reparar la valoración si se editó el libro fuera de la aplicación.
+
+Uso (desde la raíz del proyecto):
+    python -m backend.rebuild_valuation
+"""
+import asyncio
+import json
+from .database import SessionLocal
+from .crud.crud_valuation import rebuild_valuation
+
+async def run() -> None:
+    async with SessionLocal() as db:
+        report = await rebuild_valuation(db)
+    print(json.dumps(report.dict()))
+
+def main() -> None:
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
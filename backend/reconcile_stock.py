@@ -0,0 +1,44 @@
+"""
+Reconciliación de input_stock contra el libro de movimientos.
+
+Uso (desde la raíz del proyecto):
+    python -m backend.reconcile_stock              # solo informe
+    python -m backend.reconcile_stock --correct    # registra ajustes
+    python -m backend.reconcile_stock --input-id 12 --warehouse-id 3
+"""
+import argparse
+import asyncio
+import json
+import sys
+from .database import SessionLocal
+from .crud.crud_stock_reconciliation import reconcile_stock
+
+async def run(correct: bool, input_id, warehouse_id) -> int:
+    async with SessionLocal() as db:
+        report = await reconcile_stock(db, correct, input_id, warehouse_id)
+
+    for item in report.items:
+        print(
+            f"input={item.input_id} warehouse={item.warehouse_id} stock={item.stock_quantity} "
+            f"libro={item.ledger_quantity} diferencia={item.drift}"
+            + (f" negativo_desde={item.first_negative_at.isoformat()}" if item.first_negative_at else ""),
+            file=sys.stderr
+        )
+    print(json.dumps({
+        "checked_pairs": report.checked_pairs,
+        "drifted_pairs": report.drifted_pairs,
+        "total_drift": str(report.total_drift),
+        "corrected": report.corrected,
+    }))
+    return 1 if report.drifted_pairs and not correct else 0
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recalcula el stock desde inventory_movements e informa diferencias")
+    parser.add_argument("--correct", action="store_true", help="Registra movimientos de ajuste por cada diferencia")
+    parser.add_argument("--input-id", type=int)
+    parser.add_argument("--warehouse-id", type=int)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.correct, args.input_id, args.warehouse_id)))
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 from sqlalchemy import select
 from ..database import get_db
-from ..schemas.operaciones_schemas import Operacion, OperacionCreate, OperacionInputsUpdate,OperacionUpdate, OperacionResponse
-from ..crud.operaciones_crud import update_operacion, update_operacion_inputs, get_operacion, get_operaciones, create_operacion, delete_operacion, create_operation_with_inputs, get_vineyard_operaciones, get_winery_operaciones 
+from ..schemas.operaciones_schemas import Operacion, OperacionCreate, OperacionInputsUpdate,OperacionUpdate, OperacionResponse, OperacionFilters, OperacionPage, OperacionCalendar, OperacionInputsUpdateResult, OperacionBulkCreate, OperacionBulkResult
+from ..crud.operaciones_crud import update_operacion, update_operacion_inputs, get_operacion, get_operaciones, create_operacion, delete_operacion, create_operation_with_inputs, get_vineyard_operaciones, get_winery_operaciones, get_operaciones_page, get_operaciones_calendar, create_operaciones_bulk
 from ..models import Operacion as OperacionModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from datetime import date
 
 router = APIRouter()
 
@@ -17,22 +18,94 @@ async def create_operacion_with_inputs_endpoint(
 ):
     return await create_operation_with_inputs(db, operacion, operacion.inputs)
 
+def operacion_filters(
+    start_date: Optional[date] = Query(None, description="Fecha de inicio desde (incluida)"),
+    end_date: Optional[date] = Query(None, description="Fecha de inicio hasta (incluida)"),
+    parcela_id: Optional[int] = None,
+    tipo_operacion: Optional[str] = None,
+    estado: Optional[str] = None,
+    responsable_id: Optional[int] = None
+) -> OperacionFilters:
+    """Filtros comunes de los listados de operaciones."""
+    return OperacionFilters(
+        start_date=start_date,
+        end_date=end_date,
+        parcela_id=parcela_id,
+        tipo_operacion=tipo_operacion,
+        estado=estado,
+        responsable_id=responsable_id
+    )
+
+@router.post("/bulk", response_model=OperacionBulkResult)
+async def create_operaciones_bulk_endpoint(
+    bulk: OperacionBulkCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Crea la misma operación en varias parcelas, repartiendo las cantidades de
+    insumos a partes iguales o según la superficie, en una transacción.
+    """
+    return await create_operaciones_bulk(db, bulk)
+
 @router.get("/")
-async def read_operaciones(db: AsyncSession = Depends(get_db)):
-    return await get_operaciones(db)
+async def read_operaciones(filters: OperacionFilters = Depends(operacion_filters), db: AsyncSession = Depends(get_db)):
+    return await get_operaciones(db, filters)
+
+@router.get("/page", response_model=OperacionPage)
+async def read_operaciones_page(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    filters: OperacionFilters = Depends(operacion_filters),
+    db: AsyncSession = Depends(get_db)
+):
+    """Operaciones paginadas por cursor, de la fecha de inicio más reciente a la más antigua."""
+    return await get_operaciones_page(db, limit, cursor, filters)
+
+@router.get("/calendar", response_model=OperacionCalendar)
+async def read_operaciones_calendar(
+    start_date: date,
+    end_date: date,
+    group_by: str = Query("plot", pattern="^(plot|responsable)$"),
+    task_type: Optional[str] = Query(None, pattern="^(vineyard|winery)$"),
+    estado: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Operaciones que se solapan con [start_date, end_date] para el calendario
+    / Gantt, agrupadas por parcela o responsable, en formato columnar.
+    """
+    return await get_operaciones_calendar(db, start_date, end_date, group_by, task_type, estado)
 
 @router.get("/vineyard", response_model=List[Operacion])
-async def read_vineyard_operaciones(db: AsyncSession = Depends(get_db)):
+async def read_vineyard_operaciones(filters: OperacionFilters = Depends(operacion_filters), db: AsyncSession = Depends(get_db)):
     """Obtiene la lista de todas las operaciones de tipo viñedo."""
-    vineyard_operaciones = await get_vineyard_operaciones(db)
+    vineyard_operaciones = await get_vineyard_operaciones(db, filters)
     return vineyard_operaciones
 
+@router.get("/vineyard/page", response_model=OperacionPage)
+async def read_vineyard_operaciones_page(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    filters: OperacionFilters = Depends(operacion_filters),
+    db: AsyncSession = Depends(get_db)
+):
+    return await get_operaciones_page(db, limit, cursor, filters, task_type="vineyard")
+
 @router.get("/winery", response_model=List[Operacion])
-async def read_winery_operaciones(db: AsyncSession = Depends(get_db)):
+async def read_winery_operaciones(filters: OperacionFilters = Depends(operacion_filters), db: AsyncSession = Depends(get_db)):
     """Obtiene la lista de todas las operaciones de tipo bodega."""
-    winery_operaciones = await get_winery_operaciones(db)
+    winery_operaciones = await get_winery_operaciones(db, filters)
     return winery_operaciones
 
+@router.get("/winery/page", response_model=OperacionPage)
+async def read_winery_operaciones_page(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    filters: OperacionFilters = Depends(operacion_filters),
+    db: AsyncSession = Depends(get_db)
+):
+    return await get_operaciones_page(db, limit, cursor, filters, task_type="winery")
+
 @router.get("/{operacion_id}", response_model=Operacion)
 async def read_operacion(operacion_id: int, db: AsyncSession = Depends(get_db)):
     operacion_db = await get_operacion(db, operacion_id)
@@ -61,18 +134,17 @@ async def update_operacion_endpoint(
 
     return updated_operacion_with_inputs
 
-@router.put("/{operacion_id}/inputs", status_code=status.HTTP_200_OK)
+@router.put("/{operacion_id}/inputs", status_code=status.HTTP_200_OK, response_model=OperacionInputsUpdateResult)
 async def update_operacion_inputs_endpoint(
     operacion_id: int,
     inputs_update: OperacionInputsUpdate,
     db: AsyncSession = Depends(get_db)
 ):
-    operacion = await get_operacion(db, operacion_id)
-    if operacion is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Operacion not found")
-
-    await update_operacion_inputs(db, operacion_id, inputs_update.inputs)
-    return {"message": "Inputs updated successfully"}
+    """
+    Reemplaza los insumos de la operación aplicando solo las diferencias y
+    compensando el stock de las cantidades usadas que cambian.
+    """
+    return await update_operacion_inputs(db, operacion_id, inputs_update.inputs)
 
 @router.delete("/{operacion_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_operacion_endpoint(operacion_id: int, db: AsyncSession = Depends(get_db)):
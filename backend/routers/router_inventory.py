@@ -1,10 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict
 from datetime import datetime
-from ..database import get_db
+import asyncio
+import json
+from ..database import get_db, SessionLocal
+from ..crud.crud_stock_alerts import get_active_stock_alerts, rebuild_stock_alerts
+from ..crud.stock_alert_broker import alert_broker, RESYNC
+from ..crud.crud_stock_reconciliation import reconcile_stock
+from ..crud.crud_valuation import get_valuation, rebuild_valuation
+from ..crud.crud_consumption_forecast import get_consumption_forecast
+from ..crud.crud_stock_snapshots import create_stock_snapshot, get_stock_snapshot_runs, get_stock_as_of, snapshot_boundary
 from ..crud.crud_inventory import (
     create_inventory_movement,
+    create_inventory_movements_batch,
+    transfer_stock,
+    receive_purchase_order,
+    get_purchase_orders,
+    get_purchase_order_with_details,
+    get_inventory_movements,
     get_input_stocks_with_details,
     get_input_stocks,
     get_input_stock_by_input_warehouse,
@@ -18,6 +33,7 @@ from ..crud.crud_inventory import (
     delete_input,
     update_input,
     get_inputs,
+    get_input_catalog,
     get_input,
     create_input as crud_create_input,  # ✅ Alias para evitar conflicto
     delete_input_category,
@@ -28,6 +44,22 @@ from ..crud.crud_inventory import (
 from ..schemas.schemas_inventory import (
     InventoryMovementCreate,
     InventoryMovement,
+    InventoryMovementBatchCreate,
+    InventoryMovementBatchResult,
+    InventoryMovementPage,
+    StockSnapshotRun,
+    StockAsOfResponse,
+    StockReconciliationReport,
+    StockAlert,
+    ValuationReport,
+    ConsumptionForecastReport,
+    PurchaseOrderReceive,
+    StockTransferCreate,
+    StockTransferResult,
+    PurchaseOrderPage,
+    PurchaseOrderWithDetails,
+    PurchaseOrderReceiveResult,
+    ValuationRebuildResult,
     InputStock,
     InputStockCreate,
     WarehouseUpdate,
@@ -35,6 +67,7 @@ from ..schemas.schemas_inventory import (
     WarehouseCreate,
     InputUpdate,
     Input,
+    InputPage,
     InputCreate,
     InputCategoryUpdate,
     InputCategory,
@@ -93,6 +126,19 @@ async def create_input_endpoint(input_item: InputCreate, db: AsyncSession = Depe
         print(f"Exception type: {type(generic_exception)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(generic_exception)}")
 
+@router.get("/inputs/catalog", response_model=InputPage)
+async def read_input_catalog(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    category_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    brand: Optional[str] = None,
+    name_prefix: Optional[str] = Query(None, min_length=1),
+    db: AsyncSession = Depends(get_db)
+):
+    """Catálogo de insumos paginado por cursor sobre (name, id)."""
+    return await get_input_catalog(db, limit, cursor, category_id, is_active, brand, name_prefix)
+
 @router.get("/inputs/{input_id}", response_model=Optional[Input])
 async def read_input(input_id: int, db: AsyncSession = Depends(get_db)):
     db_input = await get_input(db, input_id)
@@ -159,6 +205,47 @@ async def delete_warehouse_endpoint(warehouse_id: int, db: AsyncSession = Depend
 async def create_stock(stock: InputStockCreate, db: AsyncSession = Depends(get_db)):
     return await create_input_stock(db, stock)
 
+@router.get("/stocks/as-of", response_model=StockAsOfResponse)
+async def read_stock_as_of(
+    as_of: datetime,
+    input_id: Optional[int] = Query(None),
+    warehouse_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stock por insumo y almacén en una fecha pasada (snapshot más cercano + movimientos)."""
+    return await get_stock_as_of(db, as_of, input_id, warehouse_id)
+
+@router.get("/stocks/snapshots", response_model=List[StockSnapshotRun])
+async def read_stock_snapshots(limit: int = Query(100, ge=1, le=1000), db: AsyncSession = Depends(get_db)):
+    return await get_stock_snapshot_runs(db, limit)
+
+@router.post("/stocks/snapshots", response_model=StockSnapshotRun)
+async def create_stock_snapshot_endpoint(
+    period: str = Query("daily", pattern="^(daily|monthly|manual)$"),
+    snapshot_at: Optional[datetime] = Query(None, description="Solo para period=manual; por defecto, ahora"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Crea el snapshot del periodo actual (inicio del día o del mes) o, con
+    period=manual, en la fecha indicada.
+    """
+    if period == "manual":
+        moment = snapshot_at or datetime.now()
+    else:
+        moment = snapshot_boundary(period)
+    return await create_stock_snapshot(db, moment, period)
+
+@router.post("/stocks/reconcile", response_model=StockReconciliationReport)
+async def reconcile_stock_endpoint(
+    correct: bool = Query(False, description="Registrar ajustes para las diferencias encontradas"),
+    input_id: Optional[int] = Query(None),
+    warehouse_id: Optional[int] = Query(None),
+    user_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """Compara input_stock con el saldo del libro de movimientos y, opcionalmente, corrige."""
+    return await reconcile_stock(db, correct, input_id, warehouse_id, user_id)
+
 @router.get("/stocks/{stock_id}", response_model=Optional[InputStock])
 async def read_stock(stock_id: int, db: AsyncSession = Depends(get_db)):
     db_stock = await get_input_stock(db, stock_id)
@@ -181,9 +268,172 @@ async def read_stocks(skip: int = 0, limit: int = 100, input_id: Optional[int] =
 async def read_stocks_with_details(skip: int = 0, limit: int = 100, input_id: Optional[int] = Query(None), warehouse_id: Optional[int] = Query(None), db: AsyncSession = Depends(get_db)):
     return await get_input_stocks_with_details(db, skip, limit, input_id, warehouse_id)
 
+@router.get("/movements/", response_model=InventoryMovementPage)
+async def read_inventory_movements(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    input_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    movement_type: Optional[str] = Query(None, pattern="^(entry|exit|adjustment)$"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    operation_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Historial de movimientos paginado por cursor, del más reciente al más antiguo."""
+    return await get_inventory_movements(
+        db, limit, cursor, input_id, warehouse_id, movement_type, start_date, end_date, operation_id
+    )
+
 @router.post("/movements/", response_model=InventoryMovement)
 async def create_inventory_movement_endpoint(
     movement: InventoryMovementCreate,
     db: AsyncSession = Depends(get_db)
 ):
-    return await create_inventory_movement(db=db, movement=movement)
\ No newline at end of file
+    return await create_inventory_movement(db=db, movement=movement)
+
+@router.post("/movements/batch", response_model=InventoryMovementBatchResult)
+async def create_inventory_movements_batch_endpoint(
+    batch: InventoryMovementBatchCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Registra varios movimientos en una sola transacción. La respuesta indica
+    por ítem si se creó o por qué se descartó.
+    """
+    return await create_inventory_movements_batch(db=db, movements=batch.movements)
+
+@router.post("/transfers/", response_model=StockTransferResult)
+async def create_stock_transfer(
+    transfer: StockTransferCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Traslado atómico de uno o varios insumos entre almacenes (p. ej. de
+    viñedo a bodega): salidas y entradas en una sola transacción.
+    """
+    return await transfer_stock(db, transfer)
+
+# ==================== Purchase Orders Routes ====================
+
+@router.get("/purchase-orders/", response_model=PurchaseOrderPage)
+async def read_purchase_orders(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    supplier_id: Optional[int] = None,
+    status: Optional[str] = Query(None, pattern="^(pending|partially_received|completed)$"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Órdenes de compra con proveedor y líneas, paginadas por cursor."""
+    return await get_purchase_orders(db, limit, cursor, supplier_id, status, start_date, end_date)
+
+@router.get("/purchase-orders/{order_id}", response_model=PurchaseOrderWithDetails)
+async def read_purchase_order(order_id: int, db: AsyncSession = Depends(get_db)):
+    order = await get_purchase_order_with_details(db, order_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Orden de compra no encontrada")
+    return order
+
+@router.post("/purchase-orders/{order_id}/receive", response_model=PurchaseOrderReceiveResult)
+async def receive_purchase_order_endpoint(
+    order_id: int,
+    receipt: PurchaseOrderReceive,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Recibe una entrega completa: cantidades recibidas acumuladas por línea.
+    Stock, movimientos de entrada y estado de la orden en una transacción.
+    """
+    return await receive_purchase_order(db, order_id, receipt)
+
+# ==================== Valuation Routes ====================
+
+@router.get("/valuation/", response_model=ValuationReport)
+async def read_valuation(
+    group_by: str = Query("input", pattern="^(input|warehouse|category|pair)$"),
+    input_id: Optional[int] = Query(None),
+    warehouse_id: Optional[int] = Query(None),
+    category_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """Valor del inventario a costo promedio ponderado y FIFO."""
+    return await get_valuation(db, group_by, input_id, warehouse_id, category_id)
+
+@router.post("/valuation/rebuild", response_model=ValuationRebuildResult)
+async def rebuild_valuation_endpoint(db: AsyncSession = Depends(get_db)):
+    """Recalcula la valoración completa desde el libro de movimientos."""
+    return await rebuild_valuation(db)
+
+# ==================== Consumption Forecast Routes ====================
+
+@router.get("/forecast/", response_model=ConsumptionForecastReport)
+async def read_consumption_forecast(
+    input_id: Optional[int] = Query(None),
+    history_days: int = Query(730, ge=28, le=3650),
+    horizon_days: int = Query(180, ge=7, le=730),
+    lead_time_days: int = Query(14, ge=0, le=365),
+    coverage_days: int = Query(30, ge=0, le=365),
+    only_at_risk: bool = Query(False, description="Solo insumos que caen bajo el mínimo en el horizonte"),
+    include_profile: bool = Query(False, description="Incluir el perfil semanal de consumo"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Previsión de consumo, fecha de rotura del mínimo y punto de pedido por insumo."""
+    return await get_consumption_forecast(
+        db, input_id, history_days, horizon_days, lead_time_days, coverage_days, only_at_risk, include_profile
+    )
+
+# ==================== Stock Alerts Routes ====================
+
+# Intervalo de comentarios keep-alive para que proxies no corten la conexión
+ALERT_STREAM_KEEPALIVE = 15
+
+def _sse(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+
+@router.get("/alerts/", response_model=List[StockAlert])
+async def read_stock_alerts(db: AsyncSession = Depends(get_db)):
+    """Alertas activas: stock por debajo del mínimo del insumo."""
+    return await get_active_stock_alerts(db)
+
+@router.post("/alerts/rebuild", response_model=List[StockAlert])
+async def rebuild_stock_alerts_endpoint(db: AsyncSession = Depends(get_db)):
+    """Reevalúa todas las alertas (carga inicial o tras cambios masivos)."""
+    return await rebuild_stock_alerts(db)
+
+@router.get("/alerts/stream", response_class=StreamingResponse)
+async def stream_stock_alerts(request: Request):
+    """
+    Server-sent events: primero un evento `snapshot` con las alertas activas y
+    luego un evento `alert` (raised, updated o resolved) por cada cambio.
+    Tras un `resync` se vuelve a enviar el snapshot.
+    """
+    queue = alert_broker.subscribe()
+
+    async def send_snapshot() -> bytes:
+        async with SessionLocal() as db:
+            alerts = await get_active_stock_alerts(db)
+        return _sse("snapshot", [alert.dict() for alert in alerts])
+
+    async def body():
+        try:
+            yield await send_snapshot()
+            while not await request.is_disconnected():
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=ALERT_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if item is RESYNC:
+                    yield await send_snapshot()
+                else:
+                    yield _sse("alert", item)
+        finally:
+            alert_broker.unsubscribe(queue)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
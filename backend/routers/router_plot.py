@@ -1,14 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from ..database import get_db
-from ..schemas.schemas_plot import PlotCreate, PlotUpdate, PlotResponse
-from ..crud.crud_plot import create_plot, get_plots, get_plot, update_plot, delete_plot_permanent, archive_plot
+from typing import List, Optional, Tuple
+from ..database import get_db, SessionLocal
+from ..schemas.schemas_plot import PlotCreate, PlotUpdate, PlotResponse, PlotStatisticsResponse, PlotImportResult
+from ..crud.crud_plot import create_plot, get_plots, get_plot, update_plot, delete_plot_permanent, archive_plot, get_plot_tile
+from ..crud.plot_tile_cache import MAX_ZOOM
+from ..crud.crud_plot_statistics import get_plot_summary, rebuild_plot_summary
+from ..crud.crud_plot_import import import_plots, detect_import_format
+from ..crud.crud_plot_export import stream_plots_export, EXPORT_FORMATS
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+def parse_bbox(bbox: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """Convierte 'minx,miny,maxx,maxy' (EPSG:4326) en una tupla validada."""
+    if bbox is None:
+        return None
+    try:
+        minx, miny, maxx, maxy = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox debe tener el formato minx,miny,maxx,maxy"
+        )
+    if minx > maxx or miny > maxy:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox inválido: el mínimo supera al máximo"
+        )
+    return minx, miny, maxx, maxy
+
 @router.post("/", response_model=PlotResponse, status_code=status.HTTP_201_CREATED, description="Crea una nueva parcela vitícola")
 async def create_new_plot(
     plot: PlotCreate,
@@ -22,15 +45,55 @@ async def create_new_plot(
         logger.error(f"Error al crear parcela: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error al crear la parcela")
     
+@router.post("/import",
+    response_model=PlotImportResult,
+    description="Importa parcelas en lote desde GeoJSON, KML o Shapefile (.zip) con informe por feature")
+async def import_plots_endpoint(
+    file: UploadFile = File(..., description="Archivo GeoJSON, secuencia GeoJSON, KML o Shapefile en .zip"),
+    import_format: Optional[str] = Query(None, pattern="^(geojson|kml|shapefile)$", description="Formato; si se omite se deduce de la extensión"),
+    db: AsyncSession = Depends(get_db)
+):
+    import_format = import_format or detect_import_format(file.filename)
+    if import_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No se pudo deducir el formato del archivo"
+        )
+    try:
+        return await import_plots(db, file.file, import_format)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error al importar parcelas: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al importar las parcelas"
+        )
+
 @router.get("/", 
     response_model=List[PlotResponse],
     description="Obtiene todas las parcelas vitícolas")
 async def read_plots(
     active_only: bool = Query(True, description="Solo mostrar parcelas activas"),
+    geometry_format: str = Query("wkt", pattern="^(wkt|geojson)$", description="Formato de la geometría: wkt o geojson"),
+    plot_var: Optional[str] = Query(None, description="Filtrar por variedad"),
+    plot_management: Optional[str] = Query(None, description="Filtrar por tipo de manejo"),
+    bbox: Optional[str] = Query(None, description="Ventana visible minx,miny,maxx,maxy (EPSG:4326)"),
+    zoom: Optional[int] = Query(None, ge=0, le=MAX_ZOOM, description="Nivel de zoom del mapa"),
+    tolerance: Optional[float] = Query(None, gt=0, description="Tolerancia de simplificación en grados"),
     db: AsyncSession = Depends(get_db)
 ):
     try:
-        return await get_plots(db, active_only=active_only)
+        return await get_plots(
+            db,
+            active_only=active_only,
+            geometry_format=geometry_format,
+            plot_var=plot_var,
+            plot_management=plot_management,
+            bbox=parse_bbox(bbox),
+            zoom=zoom,
+            tolerance=tolerance
+        )
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -40,15 +103,90 @@ async def read_plots(
             detail="Error al obtener las parcelas"
         )
 
+@router.get("/export",
+    response_class=StreamingResponse,
+    description="Exporta parcelas como secuencia GeoJSON, CSV con WKT o FlatGeobuf")
+async def export_plots(
+    export_format: str = Query("geojsonseq", pattern="^(geojsonseq|csv|flatgeobuf)$", description="geojsonseq, csv o flatgeobuf"),
+    active_only: bool = Query(True, description="Solo exportar parcelas activas"),
+    plot_var: Optional[str] = Query(None, description="Filtrar por variedad"),
+    plot_management: Optional[str] = Query(None, description="Filtrar por tipo de manejo"),
+    bbox: Optional[str] = Query(None, description="Ventana minx,miny,maxx,maxy (EPSG:4326)"),
+    zoom: Optional[int] = Query(None, ge=0, le=MAX_ZOOM, description="Nivel de zoom del mapa"),
+    tolerance: Optional[float] = Query(None, gt=0, description="Tolerancia de simplificación en grados")
+):
+    bbox_values = parse_bbox(bbox)
+    media_type, extension = EXPORT_FORMATS[export_format]
+
+    async def body():
+        # La sesión vive mientras dura la respuesta, no la dependencia get_db
+        async with SessionLocal() as db:
+            chunks = stream_plots_export(
+                db, export_format,
+                active_only=active_only,
+                plot_var=plot_var,
+                plot_management=plot_management,
+                bbox=bbox_values,
+                zoom=zoom,
+                tolerance=tolerance
+            )
+            async for chunk in chunks:
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="parcelas.{extension}"'}
+    )
+
+@router.get("/tiles/{z}/{x}/{y}.pbf",
+    response_class=Response,
+    description="Tesela vectorial (Mapbox Vector Tile) con las parcelas de la tesela z/x/y")
+async def read_plot_tile(
+    z: int,
+    x: int,
+    y: int,
+    active_only: bool = Query(True, description="Solo mostrar parcelas activas"),
+    plot_var: Optional[str] = Query(None, description="Filtrar por variedad"),
+    plot_management: Optional[str] = Query(None, description="Filtrar por tipo de manejo"),
+    db: AsyncSession = Depends(get_db)
+):
+    if not 0 <= z <= MAX_ZOOM or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Coordenadas de tesela inválidas"
+        )
+    try:
+        tile = await get_plot_tile(
+            db, z, x, y,
+            active_only=active_only,
+            plot_var=plot_var,
+            plot_management=plot_management
+        )
+        return Response(
+            content=tile,
+            media_type="application/vnd.mapbox-vector-tile",
+            headers={"Cache-Control": "no-cache"}
+        )
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error al obtener tesela {z}/{x}/{y}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al obtener la tesela"
+        )
+
 @router.get("/{plot_id}", 
     response_model=PlotResponse,
     description="Obtiene una parcela específica por ID")
 async def read_plot(
     plot_id: int, 
+    geometry_format: str = Query("wkt", pattern="^(wkt|geojson)$", description="Formato de la geometría: wkt o geojson"),
     db: AsyncSession = Depends(get_db)
 ):
     try:
-        plot = await get_plot(db, plot_id)
+        plot = await get_plot(db, plot_id, geometry_format=geometry_format)
         if plot is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -163,17 +301,36 @@ async def activate_plot(
         )
 
 @router.get("/statistics/summary",
+    response_model=PlotStatisticsResponse,
     description="Obtiene estadísticas generales de las parcelas")
 async def get_plot_statistics(
     db: AsyncSession = Depends(get_db)
 ):
     try:
-        # Implementar lógica para obtener estadísticas
-        # Por ejemplo: total de área, cantidad por variedad, etc.
-        pass
+        return await get_plot_summary(db)
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Error al obtener estadísticas: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al obtener estadísticas"
         )
+
+@router.post("/statistics/rebuild",
+    response_model=PlotStatisticsResponse,
+    description="Recalcula desde cero el resumen de estadísticas de parcelas")
+async def rebuild_plot_statistics(
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        await rebuild_plot_summary(db)
+        return await get_plot_summary(db)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error al recalcular estadísticas: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al recalcular estadísticas"
+        )
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
 from typing import Optional, List
 from datetime import date
+from decimal import Decimal
 from geoalchemy2.shape import to_shape
 from geoalchemy2.types import WKBElement
 from geoalchemy2.shape import to_shape
@@ -27,6 +28,8 @@ class OperacionBase(BaseModel):
     responsable_id: int
     nota: Optional[str] = None
     comentario: Optional[str] = None
+    task_list_id: Optional[int] = None
+    task_type: Optional[str] = None
     inputs: Optional[List[TaskInput]] = None
 
     class Config:
@@ -43,6 +46,24 @@ class OperacionCreate(BaseModel):
     comentario: Optional[str]
     inputs: Optional[List[TaskInputCreate]]
 
+class OperacionBulkCreate(BaseModel):
+    parcela_ids: List[int] = Field(..., min_length=1, max_length=1000)
+    tipo_operacion: str
+    fecha_inicio: Optional[date] = None
+    fecha_fin: Optional[date] = None
+    estado: Optional[str] = None
+    responsable_id: int
+    nota: Optional[str] = None
+    comentario: Optional[str] = None
+    inputs: List[TaskInputCreate] = Field(default_factory=list, description="Cantidades totales para todas las parcelas")
+    split: str = Field("equal", pattern="^(equal|area)$", description="Reparto: a partes iguales o proporcional a plot_area")
+
+class OperacionBulkResult(BaseModel):
+    operation_ids: List[int]
+    parcela_ids: List[int]
+    task_inputs: int = 0
+    movements: int = 0
+
 class OperacionUpdate(BaseModel):
     parcela_id: Optional[int]
     tipo_operacion: Optional[str]
@@ -57,6 +78,41 @@ class OperacionUpdate(BaseModel):
 class Operacion(OperacionBase):
     pass 
 
+class OperacionPage(BaseModel):
+    items: List[Operacion]
+    next_cursor: Optional[str] = Field(None, description="Cursor de la página siguiente; null en la última")
+
+class OperacionCalendarGroup(BaseModel):
+    key: Optional[int] = Field(None, description="plot_id o id del responsable")
+    label: Optional[str] = None
+    offset: int = Field(..., description="Posición de la primera operación del grupo en columns")
+    count: int
+
+class OperacionCalendarColumns(BaseModel):
+    id: List[int] = []
+    parcela_id: List[Optional[int]] = []
+    responsable_id: List[Optional[int]] = []
+    task: List[int] = Field(default_factory=list, description="Índice en OperacionCalendar.tasks")
+    estado: List[Optional[str]] = []
+    start_day: List[int] = Field(default_factory=list, description="Días desde start_date (negativo si empieza antes)")
+    end_day: List[int] = []
+
+class OperacionCalendar(BaseModel):
+    start_date: date
+    end_date: date
+    group_by: str
+    tasks: List[str] = []
+    groups: List[OperacionCalendarGroup] = []
+    columns: OperacionCalendarColumns = Field(default_factory=OperacionCalendarColumns)
+
+class OperacionFilters(BaseModel):
+    start_date: Optional[date] = Field(None, description="Fecha de inicio desde (incluida)")
+    end_date: Optional[date] = Field(None, description="Fecha de inicio hasta (incluida)")
+    parcela_id: Optional[int] = None
+    tipo_operacion: Optional[str] = None
+    estado: Optional[str] = None
+    responsable_id: Optional[int] = None
+
 class OperacionResponse(BaseModel):
     id: Optional[int] = None
     parcela_id: int
@@ -71,7 +127,16 @@ class OperacionResponse(BaseModel):
 
 class TaskInputUpdate(BaseModel):
     input_id: int
-    used_quantity: int
+    used_quantity: Decimal = Field(..., ge=0)
+    warehouse_id: Optional[int] = Field(None, description="Por defecto, el almacén con el que el insumo ya figura en la operación")
+    planned_quantity: Optional[Decimal] = None
 
 class OperacionInputsUpdate(BaseModel):
-    inputs: List[TaskInputUpdate]
\ No newline at end of file
+    inputs: List[TaskInputUpdate]
+
+class OperacionInputsUpdateResult(BaseModel):
+    message: str = "Inputs updated successfully"
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    movements: int = Field(0, description="Movimientos de stock compensatorios registrados")
\ No newline at end of file
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, validator
 from typing import Optional, List, Union
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 
 # Input Category Schemas
@@ -58,12 +58,17 @@ class InputUpdate(BaseModel):
 
 class Input(InputBase):
     id: int
+    category_name: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     
     class Config:
         orm_mode = True
 
+class InputPage(BaseModel):
+    items: List[Input]
+    next_cursor: Optional[str] = Field(None, description="Cursor de la página siguiente; null en la última")
+
 # Warehouse Schemas
 class WarehouseBase(BaseModel):
     name: str
@@ -253,11 +258,63 @@ class PurchaseOrder(PurchaseOrderBase):
 
 class PurchaseOrderWithDetails(PurchaseOrder):
     order_details: List[PurchaseOrderDetailWithInput]
-    supplier: Supplier
+    supplier: Optional[Supplier] = None
     
     class Config:
         orm_mode = True
 
+class PurchaseOrderPage(BaseModel):
+    items: List[PurchaseOrderWithDetails]
+    next_cursor: Optional[str] = Field(None, description="Cursor de la página siguiente; null en la última")
+
+class PurchaseOrderReceiveLine(BaseModel):
+    detail_id: int
+    received_quantity: Decimal = Field(..., ge=0, description="Total recibido acumulado de la línea")
+
+class PurchaseOrderReceive(BaseModel):
+    lines: List[PurchaseOrderReceiveLine] = Field(..., min_length=1)
+    warehouse_id: Optional[int] = Field(None, description="Por defecto, el primer almacén de bodega")
+    reception_date: Optional[datetime] = None
+    user_id: Optional[int] = None
+
+class PurchaseOrderReceiveLineResult(BaseModel):
+    detail_id: int
+    input_id: int
+    received_delta: Decimal
+    movement_id: Optional[int] = None
+
+class PurchaseOrderReceiveResult(BaseModel):
+    order_id: int
+    status: str
+    warehouse_id: int
+    lines: List[PurchaseOrderReceiveLineResult]
+
+# Stock Transfer Schemas
+class StockTransferLine(BaseModel):
+    input_id: int
+    quantity: Decimal = Field(..., gt=0)
+
+class StockTransferCreate(BaseModel):
+    source_warehouse_id: int
+    destination_warehouse_id: int
+    lines: List[StockTransferLine] = Field(..., min_length=1, max_length=1000)
+    user_id: Optional[int] = None
+    comments: Optional[str] = None
+
+class StockTransferLineResult(BaseModel):
+    input_id: int
+    quantity: Decimal
+    exit_movement_id: int
+    entry_movement_id: int
+    source_quantity: Decimal = Field(..., description="Saldo del origen tras el traslado")
+    destination_quantity: Decimal = Field(..., description="Saldo del destino tras el traslado")
+
+class StockTransferResult(BaseModel):
+    source_warehouse_id: int
+    destination_warehouse_id: int
+    movement_date: datetime
+    lines: List[StockTransferLineResult]
+
 # Task Input Schemas
 class TaskInputBase(BaseModel):
     operation_id: Optional[int]
@@ -327,8 +384,122 @@ class InventoryMovement(BaseModel):
     quantity: float
     unit_price: Optional[float] = None
     operation_id: Optional[int] = None
+    vessel_activity_id: Optional[int] = None
     user_id: Optional[int] = None
     comments: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class InventoryMovementPage(BaseModel):
+    items: List[InventoryMovement]
+    next_cursor: Optional[str] = Field(None, description="Cursor de la página siguiente; null en la última")
+
+class InventoryMovementBatchCreate(BaseModel):
+    movements: List[InventoryMovementCreate] = Field(..., min_length=1, max_length=5000)
+
+class InventoryMovementBatchItemResult(BaseModel):
+    index: int = Field(..., description="Posición del movimiento en el lote")
+    status: str = Field("pending", description="created o error")
+    movement_id: Optional[int] = None
+    errors: List[str] = Field(default_factory=list)
+
+class InventoryMovementBatchResult(BaseModel):
+    total: int = 0
+    created: int = 0
+    failed: int = 0
+    results: List[InventoryMovementBatchItemResult] = Field(default_factory=list)
+
+# Stock Snapshot Schemas
+class StockSnapshotRun(BaseModel):
+    snapshot_at: datetime
+    period: str
+    pairs: int = Field(0, description="Pares (input, warehouse) guardados en el snapshot")
+
+class StockBalanceAsOf(BaseModel):
+    input_id: int
+    input_name: Optional[str] = None
+    warehouse_id: int
+    warehouse_name: Optional[str] = None
+    quantity: Decimal
+
+class StockAsOfResponse(BaseModel):
+    as_of: datetime
+    snapshot_at: Optional[datetime] = Field(None, description="Snapshot de partida; null si no había ninguno anterior")
+    items: List[StockBalanceAsOf]
+
+# Stock Reconciliation Schemas
+class StockDriftItem(BaseModel):
+    input_id: int
+    warehouse_id: int
+    stock_quantity: Decimal = Field(..., description="input_stock.available_quantity")
+    ledger_quantity: Decimal = Field(..., description="Saldo recalculado desde inventory_movements")
+    drift: Decimal = Field(..., description="stock_quantity - ledger_quantity")
+    min_running_balance: Optional[Decimal] = None
+    first_negative_at: Optional[datetime] = None
+
+class StockReconciliationReport(BaseModel):
+    checked_pairs: int = 0
+    drifted_pairs: int = 0
+    total_drift: Decimal = Decimal(0)
+    corrected: int = 0
+    items: List[StockDriftItem] = Field(default_factory=list)
+
+# Stock Alert Schemas
+class StockAlert(BaseModel):
+    input_id: int
+    input_name: Optional[str] = None
+    warehouse_id: int
+    warehouse_name: Optional[str] = None
+    available_quantity: Decimal
+    minimum_stock: Decimal
+    raised_at: datetime
+
+# Valuation Schemas
+class ValuationItem(BaseModel):
+    input_id: Optional[int] = None
+    input_name: Optional[str] = None
+    warehouse_id: Optional[int] = None
+    warehouse_name: Optional[str] = None
+    category_id: Optional[int] = None
+    category_name: Optional[str] = None
+    quantity: Decimal
+    average_value: Decimal = Field(..., description="Valor a costo promedio ponderado")
+    fifo_value: Decimal = Field(..., description="Valor según capas FIFO")
+
+class ValuationReport(BaseModel):
+    group_by: str
+    total_average_value: Decimal = Decimal(0)
+    total_fifo_value: Decimal = Decimal(0)
+    items: List[ValuationItem] = Field(default_factory=list)
+
+class ConsumptionForecastItem(BaseModel):
+    input_id: int
+    input_name: str
+    unit_of_measure: Optional[str] = None
+    available_quantity: Decimal
+    minimum_stock: Optional[Decimal] = None
+    rate_30d: Decimal = Field(..., description="Consumo medio diario de los últimos 30 días")
+    rate_90d: Decimal
+    rate_365d: Decimal
+    trend: float = Field(..., description="Consumo reciente frente al perfil estacional")
+    peak_iso_week: Optional[int] = Field(None, description="Semana ISO de mayor consumo medio")
+    projected_demand: Decimal = Field(..., description="Demanda prevista en todo el horizonte")
+    below_minimum_on: Optional[date] = Field(None, description="Fecha prevista en que el stock cae por debajo del mínimo")
+    reorder_point: Decimal
+    suggested_order_date: Optional[date] = None
+    suggested_order_quantity: Decimal
+    weekly_profile: Optional[List[float]] = Field(None, description="Consumo medio diario por semana ISO 1..53")
+
+class ConsumptionForecastReport(BaseModel):
+    generated_at: datetime
+    history_days: int
+    horizon_days: int
+    lead_time_days: int
+    coverage_days: int
+    items: List[ConsumptionForecastItem] = Field(default_factory=list)
+
+class ValuationRebuildResult(BaseModel):
+    movements: int = 0
+    pairs: int = 0
+    open_layers: int = 0
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, validator, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import date
 from enum import Enum
 
@@ -83,8 +83,10 @@ class PlotResponse(BaseModel):
     plot_management: Optional[ManagementType] = Field(None, description="Tipo de manejo")
     plot_description: Optional[str] = Field(None, description="Descripción de la parcela")
     active: bool = Field(True, description="Estado activo de la parcela")
-    plot_geom: Optional[str] = Field(None, description="Geometría en formato WKT")
+    plot_geom: Optional[str] = Field(None, description="Geometría en formato WKT (o GeoJSON si se solicita)")
     plot_area: float = Field(..., description="Área de la parcela en metros cuadrados")
+    variety_name: Optional[str] = Field(None, description="Nombre de la variedad")
+    rootstock_name: Optional[str] = Field(None, description="Nombre del portainjerto")
     
     class Config:
         from_attributes = True
@@ -109,4 +111,32 @@ class PlotResponse(BaseModel):
     #plot_rootstock_details: Optional[GrapevineResponse] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PlotSummaryItem(BaseModel):
+    value: Optional[str] = Field(None, description="Valor de la dimensión (None = sin dato)")
+    name: Optional[str] = Field(None, description="Nombre de la variedad/portainjerto, si aplica")
+    plot_count: int = Field(..., description="Cantidad de parcelas activas")
+    total_area: float = Field(..., description="Área total en metros cuadrados")
+
+class PlotStatisticsResponse(BaseModel):
+    total_plots: int = 0
+    total_area: float = 0
+    by_variety: List[PlotSummaryItem] = Field(default_factory=list)
+    by_rootstock: List[PlotSummaryItem] = Field(default_factory=list)
+    by_conduction: List[PlotSummaryItem] = Field(default_factory=list)
+    by_management: List[PlotSummaryItem] = Field(default_factory=list)
+    by_implant_year: List[PlotSummaryItem] = Field(default_factory=list)
+
+class PlotImportFeatureResult(BaseModel):
+    index: int = Field(..., description="Posición del feature en el archivo")
+    plot_name: Optional[str] = None
+    status: str = Field("pending", description="created o error")
+    plot_id: Optional[int] = None
+    errors: List[str] = Field(default_factory=list)
+
+class PlotImportResult(BaseModel):
+    total: int = 0
+    created: int = 0
+    failed: int = 0
+    results: List[PlotImportFeatureResult] = Field(default_factory=list)
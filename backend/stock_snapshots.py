@@ -0,0 +1,33 @@
+"""
+Snapshot periódico de stock por insumo y almacén, pensado para cron.
+
+Uso (desde la raíz del proyecto):
+    python -m backend.stock_snapshots                  # inicio del día actual
+    python -m backend.stock_snapshots --period monthly # inicio del mes actual
+    python -m backend.stock_snapshots --at 2025-06-30T23:59:59
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime
+from .database import SessionLocal
+from .crud.crud_stock_snapshots import create_stock_snapshot, snapshot_boundary
+
+async def run(period: str, at: datetime) -> None:
+    async with SessionLocal() as db:
+        snapshot = await create_stock_snapshot(db, at, period)
+    print(json.dumps({"snapshot_at": snapshot.snapshot_at.isoformat(), "period": snapshot.period, "pairs": snapshot.pairs}))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Crea un snapshot de stock por insumo y almacén")
+    parser.add_argument("--period", choices=("daily", "monthly"), default="daily")
+    parser.add_argument("--at", type=datetime.fromisoformat, help="Fecha exacta del snapshot (periodo manual)")
+    args = parser.parse_args()
+
+    if args.at is not None:
+        asyncio.run(run("manual", args.at))
+    else:
+        asyncio.run(run(args.period, snapshot_boundary(args.period)))
+
+if __name__ == "__main__":
+    main()